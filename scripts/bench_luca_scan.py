@@ -0,0 +1,119 @@
+"""Micro-benchmark: luca_log.scan_chunk vs the old per-script find/regex extraction.
+
+Loads up to --limit chunks from a captured luca-raw.log into memory, checks
+both implementations agree on every chunk, then times each over --repeat runs.
+
+Usage:
+    python scripts/bench_luca_scan.py [--log path/to/luca-raw.log] [--limit 20000]
+"""
+import argparse
+import re
+import time
+from itertools import islice
+from pathlib import Path
+
+from luca_log import LOG_PATH, iter_chunks, scan_chunk
+
+
+def legacy_extract(chunk):
+    # The extraction parse_luca_logs.py / list_last_send_kategori.py used before scan_chunk
+    req_match = re.search(r"Request:\s*(\[|\{)", chunk)
+    if not req_match:
+        return None
+    start = req_match.start(1)
+    resp_status_idx = chunk.find("ResponseStatus:")
+    if resp_status_idx == -1:
+        resp_status_idx = chunk.find("Response:")
+    request_json_text = chunk[start:resp_status_idx].strip()
+    resp_idx = chunk.find("Response:")
+    response_text = ""
+    if resp_idx != -1:
+        response_text = chunk[resp_idx + len("Response:"):].strip()
+    return request_json_text.rstrip('-\n '), response_text.rstrip('-\n ')
+
+
+def legacy_pass(chunks):
+    found = 0
+    for c in chunks:
+        if 'SEND_STOCK_CARD' in c or 'SEND_STOCK_CARDS' in c:
+            pass
+        elif 'SEND_STOCK_MOVEMENT' in c or 'EkleStkWsDshBaslik' in c or 'OtherStockMovement' in c:
+            pass
+        else:
+            continue
+        if legacy_extract(c):
+            found += 1
+    return found
+
+
+def scan_pass(chunks):
+    found = 0
+    for c in chunks:
+        tok = scan_chunk(c)
+        if not ('SEND_STOCK_CARD' in tok.tag or 'SEND_STOCK_MOVEMENT' in tok.tag
+                or 'EkleStkWsDshBaslik' in tok.url or 'OtherStockMovement' in tok.tag
+                or 'OtherStockMovement' in tok.url):
+            continue
+        if c[tok.req_start:tok.req_start + 1] in ('[', '{'):
+            found += 1
+    return found
+
+
+def mismatches(chunks):
+    bad = 0
+    for c in chunks:
+        old = legacy_extract(c)
+        if old is None:
+            continue
+        tok = scan_chunk(c)
+        new_req = c[tok.req_start:tok.req_end]
+        new_resp = c[tok.resp_start:tok.resp_end] if tok.resp_start != -1 else ''
+        if (old[0].rstrip(), old[1].rstrip()) != (new_req, new_resp):
+            bad += 1
+    return bad
+
+
+def best_of(fn, chunks, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(chunks)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--log", type=Path, default=LOG_PATH)
+    ap.add_argument("--limit", type=int, default=20000, help="max chunks to load")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--large", type=int, default=4096, help="size threshold for the large-chunk run")
+    args = ap.parse_args()
+
+    if not args.log.exists():
+        print(f"Log file not found: {args.log}")
+        return 1
+    chunks = list(islice(iter_chunks(args.log), args.limit))
+    size_mb = sum(len(c) for c in chunks) / 1e6
+    print(f"Loaded {len(chunks)} chunks ({size_mb:.1f} M chars) from {args.log}")
+    print(f"Span mismatches vs legacy extraction: {mismatches(chunks)}")
+
+    # Small chunks are dominated by per-call overhead, large ones (HTML login
+    # pages, batch payloads) by the repeated scans and copies, so report both
+    large = [c for c in chunks if len(c) >= args.large]
+    for label, sample in (("all chunks", chunks), (f"chunks >= {args.large} chars", large)):
+        if not sample:
+            continue
+        mb = sum(len(c) for c in sample) / 1e6
+        legacy = best_of(legacy_pass, sample, args.repeat)
+        scan = best_of(scan_pass, sample, args.repeat)
+        print(f"{label} ({len(sample)}):")
+        for name, t in (("legacy find/regex", legacy), ("scan_chunk", scan)):
+            print(f"  {name:<18} {t * 1000:8.1f} ms  {len(sample) / t:10.0f} chunks/s  {mb / t:7.1f} M chars/s")
+        print(f"  speedup: {legacy / scan:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
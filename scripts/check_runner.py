@@ -0,0 +1,181 @@
+"""Run independent checks concurrently, respecting declared dependencies.
+
+A Check names a blocking probe (a function returning a bool or a
+(bool, message) tuple) and the checks that must pass before it starts, e.g.
+a purchase-order create after the login.  run_checks() starts every check
+whose dependencies have passed, at most `concurrency` probes at a time, so the
+whole run takes about as long as the slowest dependency chain instead of the
+sum of all probes.  A check whose dependency failed is not run and fails with
+an "atlandı" message.
+
+Each probe runs in its own daemon thread and has a deadline; a probe past it
+fails with a timeout and is abandoned (its thread keeps running but no longer
+holds the run or a concurrency slot).  Whatever a probe prints is captured and
+replayed with its result, in declaration order, so the output reads the same
+as a sequential run.
+
+write_results() saves results in the katana-test-results.json format.
+"""
+import asyncio
+import io
+import json
+import sys
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_DEADLINE = 30
+
+
+class Check:
+    def __init__(self, name, probe, after=(), deadline=DEFAULT_DEADLINE):
+        self.name = name
+        self.probe = probe
+        self.after = tuple(after)
+        self.deadline = deadline
+
+
+class CheckResult:
+    def __init__(self, name, success, message="", seconds=0.0, output="", completed=False):
+        self.name = name
+        self.success = success
+        self.message = message
+        self.seconds = seconds
+        self.output = output
+        self.completed = completed  # False when skipped, timed out or raised
+
+
+class _ThreadStdout:
+    # Routes writes from probe threads to their own buffer, the rest through
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.local, 'buffer', None)
+        return (self.stream if buffer is None else buffer).write(text)
+
+    def flush(self):
+        if getattr(self.local, 'buffer', None) is None:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def _outcome(value):
+    if isinstance(value, tuple):
+        success, message = value
+        return bool(success), message or ""
+    return bool(value), ""
+
+
+def _settle(future, value, exc):
+    if future.done():
+        return
+    if exc is not None:
+        future.set_exception(exc)
+    else:
+        future.set_result(value)
+
+
+def _in_thread(probe, stdout):
+    # Like asyncio.to_thread, but on a daemon thread nobody joins, so a hung probe cannot hold up exit
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    buffer = io.StringIO()
+
+    def target():
+        stdout.local.buffer = buffer
+        value = exc = None
+        try:
+            value = probe()
+        except BaseException as e:
+            exc = e
+        try:
+            loop.call_soon_threadsafe(_settle, future, value, exc)
+        except RuntimeError:
+            pass  # the run is over (loop closed)
+
+    threading.Thread(target=target, daemon=True).start()
+    return future, buffer
+
+
+async def _run(checks, concurrency, stdout, report):
+    names = set()
+    for check in checks:
+        missing = [dep for dep in check.after if dep not in names]
+        if missing:
+            raise ValueError(f"{check.name}: dependencies must be declared before it: {', '.join(missing)}")
+        names.add(check.name)
+
+    slots = asyncio.Semaphore(concurrency)
+    tasks = {}
+
+    async def run_one(check):
+        for dep in check.after:
+            if not (await tasks[dep]).success:
+                return CheckResult(check.name, False, f"atlandı: {dep} başarısız")
+        async with slots:
+            start = time.perf_counter()
+            future, buffer = _in_thread(check.probe, stdout)
+            completed = False
+            try:
+                success, message = _outcome(await asyncio.wait_for(future, check.deadline))
+                completed = True
+            except asyncio.TimeoutError:
+                success, message = False, f"{check.deadline}s içinde tamamlanmadı"
+            except Exception as e:
+                success, message = False, str(e)
+            return CheckResult(check.name, success, message, time.perf_counter() - start, buffer.getvalue(),
+                               completed)
+
+    for check in checks:
+        tasks[check.name] = asyncio.ensure_future(run_one(check))
+    results = []
+    for check in checks:
+        result = await tasks[check.name]
+        report(result)
+        results.append(result)
+    return results
+
+
+def print_result(result):
+    sys.stdout.write(result.output)
+    status = "✓" if result.success else "✗"
+    print(f"{status} {result.name} ({result.seconds:.2f}s){': ' + result.message if result.message else ''}")
+
+
+def run_checks(checks, concurrency=DEFAULT_CONCURRENCY, report=print_result):
+    """Run the checks and return their results in declaration order.
+
+    report(result) is called for each result in declaration order as soon as
+    it and every check before it have finished.
+    """
+    real = sys.stdout
+    stdout = sys.stdout = _ThreadStdout(real)
+    try:
+        return asyncio.run(_run(checks, max(1, concurrency), stdout, report))
+    finally:
+        sys.stdout = real
+
+
+def write_results(results, filename):
+    passed = sum(1 for r in results if r.success)
+    total = len(results)
+    data = {
+        "timestamp": datetime.now().isoformat(),
+        "summary": {
+            "total": total,
+            "passed": passed,
+            "failed": total - passed,
+            "success_rate": (passed / total * 100) if total > 0 else 0
+        },
+        "results": [
+            {"test": r.name, "status": "PASSED" if r.success else "FAILED", "message": r.message}
+            for r in results
+        ]
+    }
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
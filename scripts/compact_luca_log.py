@@ -0,0 +1,120 @@
+"""Content-addressed compaction of rotated luca-raw.log segments.
+
+The raw log repeats the same bodies over and over: the Luca login page after
+every session expiry, the same card payload for SEND_STOCK_CARD and each of
+its retries.  Compaction rewrites a segment (plain, .gz or .zst) as
+``<segment>.cas``: chunk headers and small bodies stay inline, and every
+request/response body of at least --min-chars characters becomes a
+``@blob:<digest>`` line whose text is stored once, zlib-compressed, in the
+``<segment>.cas.blobs`` SQLite sidecar.  The chunks themselves are written as
+zlib frames with a seek table, so the chunk index still seeks straight to one
+chunk.
+
+The log tools read .cas segments natively: luca_log.iter_chunks expands the
+references, and parse_luca_logs.py parses each distinct body only once.  The
+sidecar also records the original head, size and chunk ends, so an
+--incremental checkpoint that still points into the segment resumes in it.
+
+Usage:
+    python scripts/compact_luca_log.py [--keep] [--min-chars 128] [segment ...]
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+from luca_log import (
+    HEAD_BYTES, LOG_PATH, BlobStore, blob_store_path, decode_chunk, is_compacted, is_compressed, is_rotated,
+    iter_chunk_spans, log_segments, open_log, scan_chunk, write_compacted,
+)
+from luca_log_index import index_path
+
+MIN_CHARS = 128
+
+
+def compacted_path(segment):
+    base = segment.with_suffix("") if is_compressed(segment) else segment
+    return base.with_name(base.name + ".cas")
+
+
+def _own_line(chunk, start, end):
+    # A reference must be a whole line so readers can recognise it
+    return start > 0 and chunk[start - 1] == "\n" and (end == len(chunk) or chunk[end] in "\r\n")
+
+
+def compact_chunk(chunk, store, min_chars=MIN_CHARS):
+    tok = scan_chunk(chunk)
+    parts = []
+    pos = 0
+    for start, end in ((tok.req_start, tok.req_end), (tok.resp_start, tok.resp_end)):
+        if start == -1 or end - start < min_chars or not _own_line(chunk, start, end):
+            continue
+        parts.append(chunk[pos:start])
+        parts.append("@blob:" + store.put(chunk[start:end]))
+        pos = end
+    if not parts:
+        return chunk
+    parts.append(chunk[pos:])
+    return "".join(parts)
+
+
+def compacted_chunks(segment, store, min_chars=MIN_CHARS):
+    # The compacted chunks of `segment` for write_compacted, the same ones
+    # iter_chunks reads; once exhausted, the store holds the segment's origin
+    cas_offset = 0
+    with open_log(segment) as fh:
+        head = fh.read(HEAD_BYTES)
+        for chunk_off, length, raw, _ in iter_chunk_spans(fh, 0):
+            chunk = decode_chunk(raw)
+            if not chunk:
+                continue
+            text = compact_chunk(chunk, store, min_chars)
+            # write_compacted frames each chunk as "----\n<chunk>\n----\n"
+            cas_offset += len(text.encode("utf-8")) + len("----\n\n----\n")
+            store.add_chunk_end(chunk_off + length, cas_offset)
+            yield text
+        store.set_origin(head, fh.tell())
+
+
+def compact(segment, min_chars=MIN_CHARS, keep=False):
+    target = compacted_path(segment)
+    tmp = target.with_name(target.name + ".tmp")
+    blobs_tmp = blob_store_path(tmp)
+    blobs_tmp.unlink(missing_ok=True)
+    store = BlobStore(tmp, create=True)
+    try:
+        with tmp.open("wb") as dst:
+            write_compacted(compacted_chunks(segment, store, min_chars), dst)
+    finally:
+        store.close()
+    os.replace(blobs_tmp, blob_store_path(target))
+    os.replace(tmp, target)
+    index_path(target).unlink(missing_ok=True)
+    if not keep:
+        index_path(segment).unlink(missing_ok=True)
+        segment.unlink()
+    return target
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compact rotated luca-raw.log segments into a content-addressed form.")
+    ap.add_argument("segments", nargs="*", type=Path,
+                    help=f"rotated segments to compact (default: every rotated segment of {LOG_PATH} not yet compacted)")
+    ap.add_argument("--min-chars", type=int, default=MIN_CHARS, help="bodies at least this long go to the blob store")
+    ap.add_argument("--keep", action="store_true", help="keep the original segment")
+    args = ap.parse_args()
+
+    segments = args.segments or [s for s in log_segments(LOG_PATH) if is_rotated(s) and not is_compacted(s)]
+    for segment in segments:
+        if not is_rotated(segment) or is_compacted(segment):
+            print(f"Skipping {segment}: not a rotated, uncompacted segment")
+            continue
+        before = segment.stat().st_size
+        target = compact(segment, args.min_chars, args.keep)
+        after = target.stat().st_size + blob_store_path(target).stat().st_size
+        print(f"{segment} -> {target} + {blob_store_path(target).name} ({before} -> {after} bytes, {before / max(after, 1):.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
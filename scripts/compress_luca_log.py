@@ -0,0 +1,68 @@
+"""Compress rotated luca-raw.log segments in place (.N -> .N.zst or .N.gz).
+
+.zst output uses the zstd seekable format (independent frames plus a seek
+table, see luca_log.write_seekable_zst) so the chunk index can still jump to a
+single chunk; it needs the optional ``zstandard`` package.  .gz output can be
+read by every log tool but is only scanned sequentially.  The live log is
+never touched, and neither are segments compacted by compact_luca_log.py
+(.N.cas).
+
+Usage:
+    python scripts/compress_luca_log.py [--format zst|gz] [--keep] [segment ...]
+"""
+import argparse
+import gzip
+import os
+import shutil
+import sys
+from pathlib import Path
+
+from luca_log import LOG_PATH, is_compacted, is_compressed, is_rotated, log_segments, write_seekable_zst
+from luca_log_index import index_path
+
+
+def compress(segment, fmt, keep=False):
+    target = segment.with_name(f"{segment.name}.{fmt}")
+    tmp = target.with_name(target.name + ".tmp")
+    with segment.open("rb") as src, tmp.open("wb") as dst:
+        if fmt == "zst":
+            write_seekable_zst(src, dst)
+        else:
+            with gzip.GzipFile(filename=segment.name, mode="wb", fileobj=dst, mtime=0) as gz:
+                shutil.copyfileobj(src, gz, 1 << 20)
+    shutil.copystat(segment, tmp)
+    os.replace(tmp, target)
+    # Offsets in the old sidecar are still valid, but its file identity is not
+    index_path(segment).unlink(missing_ok=True)
+    if not keep:
+        segment.unlink()
+    return target
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compress rotated luca-raw.log segments.")
+    ap.add_argument("segments", nargs="*", type=Path,
+                    help=f"rotated segments to compress (default: every uncompressed rotated segment of {LOG_PATH})")
+    ap.add_argument("--format", choices=("zst", "gz"), default="zst")
+    ap.add_argument("--keep", action="store_true", help="keep the uncompressed segment")
+    args = ap.parse_args()
+
+    segments = args.segments or [s for s in log_segments(LOG_PATH)
+                                 if is_rotated(s) and not is_compressed(s) and not is_compacted(s)]
+    for segment in segments:
+        if is_compacted(segment):
+            # The log tools do not read a .cas.gz; the blob store is already deduplicated
+            print(f"Skipping {segment}: compacted segment (compact_luca_log.py output)")
+            continue
+        if not is_rotated(segment) or is_compressed(segment):
+            print(f"Skipping {segment}: not an uncompressed rotated segment")
+            continue
+        before = segment.stat().st_size
+        target = compress(segment, args.format, args.keep)
+        after = target.stat().st_size
+        print(f"{segment} -> {target} ({before} -> {after} bytes, {before / max(after, 1):.1f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""Small HDR-style (log-linear) histogram for latency and size distributions.
+
+Values are non-negative integers (microseconds, bytes).  Each power-of-two
+range is split into 2**(SUB_BUCKET_BITS - 1) equal buckets, so any recorded
+value is reported back within 1 / 2**(SUB_BUCKET_BITS - 1) of itself (under
+1% with the default 8 bits) while memory stays proportional to the number of
+distinct buckets actually hit.  Histograms with the same precision merge by
+adding bucket counts, so partial results from workers combine exactly.
+"""
+
+SUB_BUCKET_BITS = 8
+
+
+class Histogram:
+    def __init__(self, sub_bucket_bits=SUB_BUCKET_BITS):
+        self.sub_bucket_bits = sub_bucket_bits
+        self._half = 1 << (sub_bucket_bits - 1)
+        self.counts = {}
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def _index(self, value):
+        shift = value.bit_length() - self.sub_bucket_bits
+        if shift <= 0:
+            return value
+        return shift * self._half + (value >> shift)
+
+    def _highest_equivalent(self, index):
+        if index < 2 * self._half:
+            return index
+        shift = index // self._half - 1
+        sub = index - shift * self._half
+        return ((sub + 1) << shift) - 1
+
+    def record(self, value, count=1):
+        value = max(int(value), 0)
+        i = self._index(value)
+        self.counts[i] = self.counts.get(i, 0) + count
+        self.total += count
+        self.sum += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        if other.sub_bucket_bits != self.sub_bucket_bits:
+            raise ValueError("cannot merge histograms with different precision")
+        for i, c in other.counts.items():
+            self.counts[i] = self.counts.get(i, 0) + c
+        self.total += other.total
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def percentiles(self, *ps):
+        # Value at each percentile (0-100), in the order given; None when empty
+        if not self.total:
+            return [None] * len(ps)
+        targets = sorted((max(1, -(-p * self.total // 100)), n) for n, p in enumerate(ps))
+        out = [None] * len(ps)
+        seen = 0
+        t = 0
+        for i in sorted(self.counts):
+            seen += self.counts[i]
+            while t < len(targets) and seen >= targets[t][0]:
+                out[targets[t][1]] = min(self._highest_equivalent(i), self.max)
+                t += 1
+            if t == len(targets):
+                break
+        return out
+
+    def mean(self):
+        return self.sum / self.total if self.total else None
+
+    def to_dict(self):
+        return {
+            'sub_bucket_bits': self.sub_bucket_bits,
+            'counts': sorted(self.counts.items()),
+            'total': self.total,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        h = cls(d['sub_bucket_bits'])
+        h.counts = {int(i): c for i, c in d['counts']}
+        h.total, h.sum, h.min, h.max = d['total'], d['sum'], d['min'], d['max']
+        return h
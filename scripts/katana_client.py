@@ -0,0 +1,244 @@
+"""Shared HTTP client for the Python test scripts against Katana.API.
+
+One KatanaClient keeps a requests.Session with a pooled keep-alive adapter,
+so consecutive calls reuse the TCP connection instead of opening a new one per
+request.  Connection errors, 429 and 502-504 are retried with exponential
+backoff (status retries only for idempotent methods; a POST is never sent
+twice).  With credentials, the JWT from /api/auth/login is cached per
+(base URL, user) until shortly before its `exp` and sent with every call; a
+401 drops it and logs in again once.
+
+The helpers return the requests.Response unchanged, so callers keep their own
+status handling and messages.  poll() waits for a background job (a batch
+push) with adaptive backoff instead of a fixed sleep.
+"""
+import base64
+import json
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_BASE_URL = os.environ.get("KATANA_API_URL", "http://localhost:8080")
+DEFAULT_TIMEOUT = 10
+RETRIES = 3
+BACKOFF = 0.5
+RETRY_STATUSES = (429, 502, 503, 504)
+POOL_SIZE = 10
+# A cached token is renewed this many seconds before its exp claim
+TOKEN_SKEW = 30
+# Job polling: the interval starts here and grows by POLL_GROWTH while the job makes no progress
+POLL_INITIAL = 0.5
+POLL_GROWTH = 1.5
+POLL_MAX = 10
+# BatchJobStatus, serialised by its number
+BATCH_STATUSES = ("Pending", "InProgress", "Completed", "Failed", "PartiallyCompleted", "Cancelled")
+BATCH_TERMINAL = {"Completed", "Failed", "PartiallyCompleted", "Cancelled"}
+
+# (base_url, username) -> (token, expires at epoch seconds or None)
+_TOKENS = {}
+
+
+class ApiError(Exception):
+    def __init__(self, message, response=None):
+        super().__init__(message)
+        self.response = response
+        self.status_code = response.status_code if response is not None else None
+
+
+def token_expiry(token):
+    """The exp claim of a JWT (epoch seconds) or None; the signature is not checked."""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def batch_state(status):
+    """State name of a /api/luca/batch-status body."""
+    value = status.get("status")
+    if isinstance(value, int) and 0 <= value < len(BATCH_STATUSES):
+        return BATCH_STATUSES[value]
+    return value
+
+
+def batch_finished(status):
+    return batch_state(status) in BATCH_TERMINAL
+
+
+def poll(fetch, done, timeout, progress=None, interval=POLL_INITIAL, max_interval=POLL_MAX):
+    """Call fetch() until done(state) and return (state, polls); raises TimeoutError.
+
+    The wait between polls grows by POLL_GROWTH up to max_interval and stays
+    put while progress(state) keeps changing, so a job that advances is
+    watched closely and a stalled or long one is not hammered.
+    """
+    deadline = time.monotonic() + timeout
+    polls = 0
+    mark = None
+    while True:
+        state = fetch()
+        polls += 1
+        if done(state):
+            return state, polls
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise TimeoutError(f"not finished after {timeout}s ({polls} polls)")
+        last, mark = mark, progress(state) if progress else None
+        if polls > 1 and (mark is None or mark == last):
+            interval = min(interval * POLL_GROWTH, max_interval)
+        time.sleep(min(interval, left))
+
+
+def new_session(retries=RETRIES, backoff=BACKOFF, pool_size=POOL_SIZE):
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class KatanaClient:
+    def __init__(self, base_url=DEFAULT_BASE_URL, username=None, password=None, timeout=DEFAULT_TIMEOUT,
+                 session=None):
+        self.base_url = base_url.rstrip("/")
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.session = session or new_session()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def url(self, path):
+        return path if path.startswith(("http://", "https://")) else f"{self.base_url}{path}"
+
+    # --- Authentication ---------------------------------------------------
+
+    def login(self):
+        """Log in with the client's credentials and cache the token; raises ApiError."""
+        response = self.session.post(self.url("/api/auth/login"),
+                                     json={"username": self.username, "password": self.password},
+                                     timeout=self.timeout)
+        if response.status_code not in (200, 201):
+            raise ApiError(f"Status: {response.status_code}", response)
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        token = data.get("token") or data.get("accessToken") if isinstance(data, dict) else None
+        if not token:
+            raise ApiError("no token in the login response", response)
+        _TOKENS[(self.base_url, self.username)] = (token, token_expiry(token))
+        return token
+
+    def token(self):
+        """The cached token while it is valid, else a fresh one."""
+        cached = _TOKENS.get((self.base_url, self.username))
+        if cached is not None:
+            token, expires = cached
+            if expires is None or time.time() < expires - TOKEN_SKEW:
+                return token
+        return self.login()
+
+    def forget_token(self):
+        _TOKENS.pop((self.base_url, self.username), None)
+
+    # --- Requests ---------------------------------------------------------
+
+    def request(self, method, path, auth=True, **kwargs):
+        """Send a request; with credentials and `auth`, the bearer token is added unless headers carry one."""
+        kwargs.setdefault("timeout", self.timeout)
+        headers = dict(kwargs.pop("headers", None) or {})
+        use_token = auth and self.username is not None and "Authorization" not in headers
+        if use_token:
+            headers["Authorization"] = f"Bearer {self.token()}"
+        response = self.session.request(method, self.url(path), headers=headers, **kwargs)
+        if use_token and response.status_code == 401:
+            # Revoked or expired early: one fresh login
+            self.forget_token()
+            headers["Authorization"] = f"Bearer {self.token()}"
+            response = self.session.request(method, self.url(path), headers=headers, **kwargs)
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, json=None, **kwargs):
+        return self.request("POST", path, json=json, **kwargs)
+
+    def put(self, path, json=None, **kwargs):
+        return self.request("PUT", path, json=json, **kwargs)
+
+    def patch(self, path, json=None, **kwargs):
+        return self.request("PATCH", path, json=json, **kwargs)
+
+    # --- Endpoints --------------------------------------------------------
+
+    def health(self, **kwargs):
+        return self.get("/api/health", **kwargs)
+
+    def list_products(self, **kwargs):
+        return self.get("/api/products", **kwargs)
+
+    def list_suppliers(self, **kwargs):
+        return self.get("/api/suppliers", **kwargs)
+
+    def create_supplier(self, supplier, **kwargs):
+        return self.post("/api/suppliers", json=supplier, **kwargs)
+
+    def list_purchase_orders(self, **kwargs):
+        return self.get("/api/purchase-orders", **kwargs)
+
+    def get_purchase_order(self, order_id, **kwargs):
+        return self.get(f"/api/purchase-orders/{order_id}", **kwargs)
+
+    def create_purchase_order(self, order, **kwargs):
+        return self.post("/api/purchase-orders", json=order, **kwargs)
+
+    def update_purchase_order(self, order_id, changes, **kwargs):
+        """PATCH the Luca fields of an order (UpdatePurchaseOrderLucaFieldsRequest: description, referenceCode,
+        projectCode, documentSeries, ...); the controller has no PUT for the whole order."""
+        return self.patch(f"/api/purchase-orders/{order_id}/luca-fields", json=changes, **kwargs)
+
+    def sync_status(self, **kwargs):
+        return self.get("/api/sync/status", **kwargs)
+
+    def sync_to_luca_stock_cards(self, options=None, **kwargs):
+        return self.post("/api/sync/to-luca/stock-cards", json=options or {}, **kwargs)
+
+    def push_products_batch(self, request=None, **kwargs):
+        return self.post("/api/luca/push-products-batch", json=request or {}, **kwargs)
+
+    def batch_status(self, job_id, **kwargs):
+        return self.get(f"/api/luca/batch-status/{job_id}", **kwargs)
+
+    def sync_stock_cards(self, products, dry_run=False, **kwargs):
+        return self.post("/api/sync/stock-cards", json={"products": products, "dryRun": dry_run}, **kwargs)
+
+    def sync_logs(self, **kwargs):
+        return self.get("/api/adminpanel/sync-logs-anon", **kwargs)
+
+    def failed_records(self, **kwargs):
+        return self.get("/api/adminpanel/failed-records-anon", **kwargs)
@@ -0,0 +1,351 @@
+"""Open-model load generator for the Katana.API sync and write endpoints.
+
+Unlike the k6 scripts in tests/load (closed-loop GETs with sleep(1)), every
+scenario here is a constant arrival rate: request i is due at start + i / rate
+whether or not earlier requests have come back.  Latency is measured from that
+due time, not from when the request was actually sent, so a stalled API shows
+up in the percentiles instead of silently lowering the request rate
+(coordinated omission).  A request that would exceed --max-in-flight is not
+sent and counted as 'dropped', like k6's dropped_iterations.
+
+The rate of each scenario is split over --workers processes (arrivals are
+interleaved, worker k takes every k-th slot), each sending from a thread pool
+over one keep-alive session without retries.  Workers return an HDR histogram
+(see hdr_histogram.py) and error-class counts per scenario; the parent merges
+them exactly.
+
+Scenarios:
+  stock-cards    POST /api/sync/to-luca/stock-cards (dryRun unless --live-sync)
+  webhook        POST /api/webhook/katana/stock-change (needs --webhook-secret)
+  po-create      POST /api/purchase-orders
+  po-update      PATCH /api/purchase-orders/{id}/luca-fields (an order created during setup)
+  sales-orders   POST /api/sync/from-katana/sales-orders?days=N
+
+The write scenarios create real records (pending adjustments, purchase
+orders); point the driver at a test environment.
+
+Usage:
+    python scripts/katana_load.py --scenario webhook=50 --scenario po-create=5 [--duration 60] [--workers 4]
+"""
+import argparse
+import heapq
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+
+import katana_client
+from hdr_histogram import Histogram
+from katana_client import DEFAULT_BASE_URL, ApiError, KatanaClient, new_session
+
+PERCENTILES = (50, 90, 99, 99.9)
+# Workers start together this long after the parent's setup, once their processes are up
+START_DELAY = 2.0
+AUTH_SCENARIOS = ('stock-cards', 'po-create', 'po-update', 'sales-orders')
+
+
+# --- Scenarios ---
+
+def stock_cards(client, ctx, seq):
+    return client.sync_to_luca_stock_cards({'dryRun': not ctx['live_sync'], 'limit': ctx['stock_card_limit']})
+
+
+def webhook(client, ctx, seq):
+    body = {
+        'event': 'stock.updated',
+        'orderId': f"LOAD-{ctx['run_id']}-{ctx['worker']}-{seq}",
+        'productId': ctx.get('product_id') or 0,
+        'sku': ctx.get('product_sku'),
+        'quantityChange': 1,
+        'timestamp': datetime.utcnow().isoformat() + 'Z',
+    }
+    return client.post('/api/webhook/katana/stock-change', json=body, auth=False,
+                       headers={'X-Katana-Signature': ctx['webhook_secret']})
+
+
+def purchase_order(ctx, seq):
+    today = datetime.now()
+    return {
+        'supplierId': ctx['supplier_id'],
+        'orderDate': today.strftime('%Y-%m-%d'),
+        'expectedDate': (today + timedelta(days=7)).strftime('%Y-%m-%d'),
+        'documentSeries': 'SIP',
+        'documentTypeDetailId': 1,
+        'vatIncluded': True,
+        'projectCode': 'LOAD',
+        'description': f"Load {ctx['run_id']}-{ctx['worker']}-{seq}",
+        'items': [{
+            'productId': ctx['product_id'],
+            'lucaStockCode': ctx.get('product_sku') or 'LOAD001',
+            'quantity': 1,
+            'unitPrice': 1.0,
+            'vatRate': 20,
+            'warehouseCode': 'MAIN',
+            'unitCode': 'PC',
+            'discountAmount': 0,
+        }],
+    }
+
+
+def po_create(client, ctx, seq):
+    return client.create_purchase_order(purchase_order(ctx, seq))
+
+
+def po_update(client, ctx, seq):
+    changes = {'description': f"Load update {ctx['run_id']}-{ctx['worker']}-{seq}"}
+    return client.update_purchase_order(ctx['po_id'], changes)
+
+
+def sales_orders(client, ctx, seq):
+    return client.post('/api/sync/from-katana/sales-orders', params={'days': ctx['sales_order_days']})
+
+
+SCENARIOS = {
+    'stock-cards': stock_cards,
+    'webhook': webhook,
+    'po-create': po_create,
+    'po-update': po_update,
+    'sales-orders': sales_orders,
+}
+
+
+def error_class(response=None, exc=None):
+    if exc is None:
+        return 'ok' if 200 <= response.status_code < 300 else f"http_{response.status_code}"
+    if isinstance(exc, requests.exceptions.Timeout):
+        return 'timeout'
+    if isinstance(exc, requests.exceptions.ConnectionError):
+        return 'connection'
+    return type(exc).__name__
+
+
+# --- Worker ---
+
+class ScenarioStats:
+    def __init__(self):
+        self.latency_us = Histogram()
+        self.errors = {}
+        self.lock = threading.Lock()
+
+    def add(self, latency_us, cls):
+        with self.lock:
+            if latency_us is not None:
+                self.latency_us.record(latency_us)
+            self.errors[cls] = self.errors.get(cls, 0) + 1
+
+    def to_dict(self):
+        return {'latency_us': self.latency_us.to_dict(), 'errors': self.errors}
+
+
+def schedule(rates, duration, worker, workers):
+    # (due offset, scenario, seq) in time order; worker k takes arrivals k, k + workers, ...
+    heads = []
+    for name, rate in rates.items():
+        if rate > 0:
+            heads.append((worker / rate, name, worker))
+    heapq.heapify(heads)
+    while heads:
+        due, name, seq = heapq.heappop(heads)
+        if due >= duration:
+            continue
+        yield due, name, seq
+        nxt = seq + workers
+        heapq.heappush(heads, (nxt / rates[name], name, nxt))
+
+
+def run_worker(worker, config):
+    """Send this worker's share of every scenario; returns per-scenario stats as dicts."""
+    ctx = dict(config['ctx'], worker=worker)
+    if config.get('token'):
+        katana_client._TOKENS[(config['url'].rstrip('/'), config['username'])] = (config['token'], None)
+    client = KatanaClient(config['url'], username=config['username'], password=config['password'],
+                          timeout=config['timeout'], session=new_session(retries=0, pool_size=config['connections']))
+    stats = {name: ScenarioStats() for name in config['rates']}
+    in_flight = threading.Semaphore(config['max_in_flight'])
+    late = Histogram()
+
+    def send(name, seq, due_at):
+        try:
+            try:
+                response = SCENARIOS[name](client, ctx, seq)
+            except Exception as e:
+                stats[name].add((time.perf_counter() - due_at) * 1e6, error_class(exc=e))
+            else:
+                stats[name].add((time.perf_counter() - due_at) * 1e6, error_class(response))
+        finally:
+            in_flight.release()
+
+    pool = ThreadPoolExecutor(config['connections'])
+    start = time.perf_counter() + max(config['start_at'] - time.time(), 0.0)
+    for due, name, seq in schedule(config['rates'], config['duration'], worker, config['workers']):
+        due_at = start + due
+        wait = due_at - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+        else:
+            late.record(-wait * 1e6)
+        if not in_flight.acquire(blocking=False):
+            stats[name].add(None, 'dropped')
+            continue
+        pool.submit(send, name, seq, due_at)
+    pool.shutdown(wait=True)
+    client.close()
+    return {'scenarios': {name: s.to_dict() for name, s in stats.items()}, 'dispatch_late_us': late.to_dict()}
+
+
+# --- Setup and report ---
+
+def parse_scenario(text):
+    name, sep, rate = text.partition('=')
+    if not sep or name not in SCENARIOS:
+        raise argparse.ArgumentTypeError(f"expected NAME=RATE with NAME one of {', '.join(SCENARIOS)}")
+    try:
+        value = float(rate)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"rate must be a number: {rate}") from None
+    if value <= 0:
+        raise argparse.ArgumentTypeError(f"rate must be positive: {rate}")
+    return name, value
+
+
+def first_id(response, what):
+    if response.status_code != 200:
+        raise ApiError(f"{what}: Status {response.status_code}", response)
+    items = response.json()
+    if isinstance(items, dict):
+        items = items.get('items') or items.get('data') or []
+    if not items:
+        raise ApiError(f"{what}: none found", response)
+    return items[0]
+
+
+def prepare(client, rates, ctx):
+    """Log in and look up the records the write scenarios need; returns the token or None."""
+    token = client.login() if any(name in AUTH_SCENARIOS for name in rates) else None
+    orders = 'po-create' in rates or 'po-update' in rates
+    if orders or (token and 'webhook' in rates):
+        # The webhook itself is anonymous; without a login it names no product
+        product = first_id(client.list_products(), 'products')
+        ctx['product_id'], ctx['product_sku'] = product.get('id'), product.get('sku')
+    if orders:
+        ctx['supplier_id'] = first_id(client.list_suppliers(), 'suppliers').get('id')
+    if 'po-update' in rates:
+        response = client.create_purchase_order(purchase_order(dict(ctx, worker='setup'), 0))
+        if response.status_code not in (200, 201):
+            raise ApiError(f"purchase order for po-update: Status {response.status_code}", response)
+        ctx['po_id'] = response.json().get('id')
+    return token
+
+
+def merge_results(parts, names):
+    merged = {name: {'latency_us': Histogram(), 'errors': {}} for name in names}
+    late = Histogram()
+    for part in parts:
+        late.merge(Histogram.from_dict(part['dispatch_late_us']))
+        for name, s in part['scenarios'].items():
+            merged[name]['latency_us'].merge(Histogram.from_dict(s['latency_us']))
+            errors = merged[name]['errors']
+            for cls, count in s['errors'].items():
+                errors[cls] = errors.get(cls, 0) + count
+    return merged, late
+
+
+def _ms(value_us):
+    return '-' if value_us is None else f"{value_us / 1000:.1f}"
+
+
+def print_report(merged, late, rates, duration):
+    print(f"{'scenario':<14}{'target/s':>9}{'done/s':>9}{'sent':>8}{'ok%':>7}  "
+          + ''.join(f"{'p' + format(p, 'g'):>9}" for p in PERCENTILES) + f"{'max':>9}  (ms)")
+    for name, m in merged.items():
+        h = m['latency_us']
+        scheduled = sum(m['errors'].values())
+        ok = m['errors'].get('ok', 0)
+        pct = f"{ok / scheduled * 100:.1f}" if scheduled else '-'
+        print(f"{name:<14}{rates[name]:>9g}{h.total / duration:>9.1f}{h.total:>8}{pct:>7}  "
+              + ''.join(f"{_ms(v):>9}" for v in h.percentiles(*PERCENTILES)) + f"{_ms(h.max):>9}")
+        for cls, count in sorted(m['errors'].items(), key=lambda kv: -kv[1]):
+            if cls != 'ok':
+                print(f"    {cls:<20}{count:>8}")
+    p99, worst = late.percentiles(99, 100)
+    if late.total:
+        print(f"Dispatch behind schedule: {late.total} arrivals, p99 {_ms(p99)} ms, max {_ms(worst)} ms"
+              " (load host saturated if large; add --workers)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Constant-arrival-rate load against the Katana sync and write endpoints.")
+    ap.add_argument('--url', default=DEFAULT_BASE_URL, help="API base URL (default: %(default)s)")
+    ap.add_argument('--scenario', dest='scenarios', action='append', type=parse_scenario, required=True,
+                    metavar='NAME=RATE', help=f"requests per second over all workers; NAME: {', '.join(SCENARIOS)}")
+    ap.add_argument('--duration', type=float, default=60, help="seconds of load (default: %(default)s)")
+    ap.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes (default: %(default)s)")
+    ap.add_argument('--connections', type=int, default=32, help="sending threads per worker (default: %(default)s)")
+    ap.add_argument('--max-in-flight', type=int, help="per worker; more outstanding requests are dropped (default: 4 x connections)")
+    ap.add_argument('--timeout', type=float, default=30, help="request timeout in seconds (default: %(default)s)")
+    ap.add_argument('--username', default=os.environ.get('KATANA_USERNAME', 'admin'))
+    ap.add_argument('--password', default=os.environ.get('KATANA_PASSWORD', 'Admin@123'))
+    ap.add_argument('--webhook-secret', default=os.environ.get('KATANA_WEBHOOK_SECRET', ''),
+                    help="KatanaApi:WebhookSecret, sent as X-Katana-Signature (default: $KATANA_WEBHOOK_SECRET)")
+    ap.add_argument('--stock-card-limit', type=int, default=10, help="limit per stock-cards sync (default: %(default)s)")
+    ap.add_argument('--live-sync', action='store_true', help="stock-cards sends to Luca instead of a dry run")
+    ap.add_argument('--sales-order-days', type=int, default=1, help="days for sales-orders (default: %(default)s)")
+    ap.add_argument('--json', type=str, help="also write the merged histograms and error counts here")
+    args = ap.parse_args()
+
+    rates = {}
+    for name, rate in args.scenarios:
+        rates[name] = rates.get(name, 0) + rate
+    if 'webhook' in rates and not args.webhook_secret:
+        print("webhook needs --webhook-secret or KATANA_WEBHOOK_SECRET")
+        return 1
+    workers = max(1, args.workers)
+    ctx = {
+        'run_id': datetime.now().strftime('%H%M%S'),
+        'webhook_secret': args.webhook_secret,
+        'stock_card_limit': args.stock_card_limit,
+        'live_sync': args.live_sync,
+        'sales_order_days': args.sales_order_days,
+    }
+    try:
+        with KatanaClient(args.url, username=args.username, password=args.password, timeout=args.timeout) as client:
+            token = prepare(client, rates, ctx)
+    except (ApiError, requests.exceptions.RequestException) as e:
+        print(f"Setup failed: {e}")
+        return 1
+
+    config = {
+        'url': args.url, 'username': args.username, 'password': args.password, 'token': token,
+        'timeout': args.timeout, 'connections': args.connections,
+        'max_in_flight': args.max_in_flight or 4 * args.connections,
+        'rates': rates, 'duration': args.duration, 'workers': workers, 'ctx': ctx,
+        'start_at': time.time() + START_DELAY,
+    }
+    print(f"{sum(rates.values()):g} req/s for {args.duration:g}s over {workers} workers: "
+          + ', '.join(f"{name}={rate:g}/s" for name, rate in rates.items()))
+    with ProcessPoolExecutor(workers) as pool:
+        parts = list(pool.map(run_worker, range(workers), [config] * workers))
+
+    merged, late = merge_results(parts, rates)
+    print_report(merged, late, rates, args.duration)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': datetime.now().isoformat(),
+                'duration': args.duration,
+                'workers': workers,
+                'rates': rates,
+                'scenarios': {name: {'latency_us': m['latency_us'].to_dict(), 'errors': m['errors']}
+                              for name, m in merged.items()},
+                'dispatch_late_us': late.to_dict(),
+            }, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,36 +1,28 @@
-import re
+from collections import deque
 from pathlib import Path
+
+from luca_log import iter_json_items, iter_segment_chunks, scan_chunk
+
 p=Path('src/Katana.API/logs/luca-raw.log')
-text=p.read_text(encoding='utf-8',errors='replace')
-parts=[p.strip() for p in re.split(r"\n-+\n", text) if p.strip()]
-rows=[]
-for part in parts:
-    if 'SEND_STOCK_CARD' not in part and 'SEND_STOCK_CARDS' not in part:
+# Only the last 50 rows are printed, so keep a bounded window instead of every row
+rows=deque(maxlen=50)
+total=0
+# Rotated (.1, .2.gz, .3.zst) segments are read first, oldest to newest
+for part in iter_segment_chunks(p):
+    tok=scan_chunk(part)
+    if 'SEND_STOCK_CARD' not in tok.tag:
         continue
     # find Request JSON
-    m=re.search(r"Request:\s*(\[|\{)", part)
-    if not m:
+    if part[tok.req_start:tok.req_start+1] not in ('[','{'):
         continue
-    start=m.start(1)
-    resp_idx=part.find('ResponseStatus:')
-    if resp_idx==-1:
-        resp_idx=part.find('Response:')
-    req_text=part[start:resp_idx].strip()
-    try:
-        import json
-        req_json=json.loads(req_text)
-    except Exception:
-        try:
-            first = min((req_text.find('[') if '[' in req_text else 1e9),(req_text.find('{') if '{' in req_text else 1e9))
-            req_json=json.loads(req_text[first:])
-        except Exception:
+    for it in iter_json_items(part,tok.req_start,tok.req_end):
+        if not isinstance(it,dict):
             continue
-    items=req_json if isinstance(req_json,list) else [req_json]
-    for it in items:
         kart=it.get('kartKodu') or it.get('kartKod') or ''
         kategori=it.get('kategoriAgacKod') or ''
         rows.append((kart,kategori))
+        total+=1
 
-for kart,kategori in rows[-50:]:
+for kart,kategori in rows:
     print(f"{kart} -> {kategori}")
-print(f"Total send entries parsed: {len(rows)}")
+print(f"Total send entries parsed: {total}")
@@ -0,0 +1,416 @@
+"""Follow luca-raw.log and keep a Prometheus textfile of live stock card send metrics.
+
+Every new chunk goes through the same parser as parse_luca_logs.py (chunk_rows)
+plus the response classification used by luca_retry_chains.py.  Counters are
+kept since start; rates are computed over a rolling window made of fixed
+buckets, so memory stays constant however long the follower runs:
+
+  * sends per second (every SEND_STOCK_CARD attempt, retries included)
+  * share of calls answered with the login page (expired session)
+  * share of sent cards whose kategoriAgacKod is numeric only
+  * share of calls that are retries
+  * interval between consecutive sends and ingest lag (p50/p95/p99)
+
+New data is detected with inotify on the log directory (Linux, through ctypes)
+and falls back to polling the file size elsewhere.  Rotation and truncation
+are handled: the rest of the old file is read through the still open handle
+before the new log is opened from byte 0.  A copytruncate is recognised by the
+file shrinking below the read offset or, if it has grown back past it in the
+meantime, by its first bytes changing.  The textfile is rewritten
+atomically (temp file + rename) every --interval seconds.
+
+Usage:
+    python scripts/luca_follow.py [--log luca-raw.log] [--textfile /var/lib/node_exporter/luca.prom]
+"""
+import argparse
+import ctypes
+import ctypes.util
+import hashlib
+import os
+import select
+import struct
+import sys
+import time
+from collections import deque
+from pathlib import Path
+
+from hdr_histogram import Histogram
+from luca_log import (HEAD_BYTES, LOG_PATH, decode_chunk, is_separator, iter_chunk_spans, parse_ts, response_outcome,
+                      scan_chunk, span_text)
+from luca_retry_chains import ATTEMPT_KINDS
+from parse_luca_logs import chunk_rows
+
+OUT_PROM = Path("src/Katana.API/logs/luca_follow.prom")
+BUCKET_SECONDS = 10
+PERCENTILES = (50, 95, 99)
+
+# inotify(7)
+_IN_MODIFY = 0x002
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_NONBLOCK = os.O_NONBLOCK
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Wakes up when the log file in a watched directory changes (Linux only)."""
+
+    def __init__(self, path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(_IN_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # Watch the directory, not the file, so a rotated-in log is seen too
+        mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+        if libc.inotify_add_watch(self.fd, os.fsencode(path.parent), mask) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+        self.name = os.fsencode(path.name)
+
+    def wait(self, timeout):
+        # True if the log changed before `timeout` seconds passed.  Other files
+        # in the directory (traffic dumps) wake the loop but are ignored.
+        deadline = time.monotonic() + timeout
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0 or not select.select([self.fd], [], [], left)[0]:
+                return False
+            if self._drain():
+                return True
+
+    def _drain(self):
+        hit = False
+        while True:
+            try:
+                buf = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return hit
+            pos = 0
+            while pos + _EVENT_HEADER.size <= len(buf):
+                _, _, _, length = _EVENT_HEADER.unpack_from(buf, pos)
+                name = buf[pos + _EVENT_HEADER.size:pos + _EVENT_HEADER.size + length].rstrip(b"\0")
+                hit = hit or name == self.name
+                pos += _EVENT_HEADER.size + length
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback: checks the log's size and inode every `poll` seconds."""
+
+    def __init__(self, path, poll):
+        self.path = path
+        self.poll = poll
+        self._last = self._stat()
+
+    def _stat(self):
+        try:
+            st = self.path.stat()
+        except OSError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def wait(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return False
+            time.sleep(min(self.poll, left))
+            now = self._stat()
+            if now != self._last:
+                self._last = now
+                return True
+
+    def close(self):
+        pass
+
+
+class RollingWindow:
+    """Counters and histograms over the last `seconds`, in fixed-size buckets."""
+
+    def __init__(self, seconds, bucket=BUCKET_SECONDS):
+        self.seconds = seconds
+        self.bucket = bucket
+        self.slots = deque()  # (bucket start, counts, {name: Histogram})
+
+    def _slot(self, now):
+        start = int(now // self.bucket) * self.bucket
+        if not self.slots or self.slots[-1][0] != start:
+            self.slots.append((start, {}, {}))
+        self._expire(now)
+        return self.slots[-1]
+
+    def _expire(self, now):
+        while self.slots and self.slots[0][0] <= now - self.seconds - self.bucket:
+            self.slots.popleft()
+
+    def add(self, now, name, count=1):
+        counts = self._slot(now)[1]
+        counts[name] = counts.get(name, 0) + count
+
+    def observe(self, now, name, value):
+        hists = self._slot(now)[2]
+        h = hists.get(name)
+        if h is None:
+            h = hists[name] = Histogram()
+        h.record(value)
+
+    def totals(self, now):
+        self._expire(now)
+        counts, hists = {}, {}
+        for _, c, hs in self.slots:
+            for k, v in c.items():
+                counts[k] = counts.get(k, 0) + v
+            for k, h in hs.items():
+                hists.setdefault(k, Histogram()).merge(h)
+        # The oldest bucket may reach back further than the window
+        span = min(self.seconds, now - self.slots[0][0]) if self.slots else self.seconds
+        return counts, hists, max(span, 1)
+
+
+class SendMetrics:
+    def __init__(self, window):
+        self.window = RollingWindow(window)
+        self.totals = {}
+        self.last_send_ts = None
+        self.last_chunk_ts = None
+
+    def count(self, now, name, n=1):
+        self.totals[name] = self.totals.get(name, 0) + n
+        self.window.add(now, name, n)
+
+    def feed(self, chunk, now):
+        tok = scan_chunk(chunk)
+        base = tok.tag.partition(':')[0]
+        ts = parse_ts(tok.ts)
+        if ts is not None:
+            self.last_chunk_ts = ts.timestamp()
+            self.window.observe(now, 'ingest_lag_us', max(now - self.last_chunk_ts, 0) * 1e6)
+        self.count(now, 'chunks')
+        # SEND_STOCK_CARD_HTML re-logs the response of the call before it and is not a call itself
+        kind = ATTEMPT_KINDS.get(base)
+        if kind is None:
+            return
+        self.count(now, 'calls')
+        if kind != 'INITIAL':
+            self.count(now, 'retries')
+        if response_outcome(tok.status, span_text(chunk, tok.resp_start, tok.resp_end)) in ('html', 'session'):
+            self.count(now, 'session_expired')
+        if ts is not None:
+            if self.last_send_ts is not None and ts.timestamp() >= self.last_send_ts:
+                self.window.observe(now, 'send_interval_us', (ts.timestamp() - self.last_send_ts) * 1e6)
+            self.last_send_ts = ts.timestamp()
+        for r in chunk_rows(chunk):
+            self.count(now, 'cards')
+            if r['IsNumericOnly'] == 'Y':
+                self.count(now, 'numeric_kategori')
+
+    def prometheus(self, now, offset):
+        counts, hists, span = self.window.totals(now)
+        w = f'window="{self.window.seconds}s"'
+        calls = counts.get('calls', 0)
+        cards = counts.get('cards', 0)
+
+        def ratio(n, d):
+            return n / d if d else 0.0
+
+        lines = []
+        for name, help_text in (
+            ('chunks', "log records read, whatever their tag"),
+            ('calls', "SEND_STOCK_CARD attempts seen in the log, retries included"),
+            ('retries', "SEND_STOCK_CARD retry calls"),
+            ('session_expired', "calls answered with the login page or code 1003"),
+            ('cards', "stock cards sent (batch items counted one by one)"),
+            ('numeric_kategori', "sent cards whose kategoriAgacKod is numeric only"),
+        ):
+            lines.append(f"# HELP luca_follow_{name}_total Luca {help_text}")
+            lines.append(f"# TYPE luca_follow_{name}_total counter")
+            lines.append(f"luca_follow_{name}_total {self.totals.get(name, 0)}")
+        for name, value, help_text in (
+            ('sends_per_second', calls / span, "SEND_STOCK_CARD attempts per second"),
+            ('session_expiry_ratio', ratio(counts.get('session_expired', 0), calls), "share of calls hitting an expired session"),
+            ('numeric_kategori_ratio', ratio(counts.get('numeric_kategori', 0), cards), "share of cards with numeric-only kategoriAgacKod"),
+            ('retry_share', ratio(counts.get('retries', 0), calls), "share of calls that are retries"),
+        ):
+            lines.append(f"# HELP luca_follow_{name} Luca {help_text} over the rolling window")
+            lines.append(f"# TYPE luca_follow_{name} gauge")
+            lines.append(f"luca_follow_{name}{{{w}}} {value:g}")
+        for name, help_text in (
+            ('send_interval', "time between consecutive SEND_STOCK_CARD attempts"),
+            ('ingest_lag', "delay between a record's timestamp and the follower reading it"),
+        ):
+            h = hists.get(name + '_us')
+            if h is None:
+                continue
+            prom = f"luca_follow_{name}_seconds"
+            lines.append(f"# HELP {prom} Luca {help_text} over the rolling window")
+            lines.append(f"# TYPE {prom} summary")
+            for p, v in zip(PERCENTILES, h.percentiles(*PERCENTILES)):
+                lines.append(f'{prom}{{{w},quantile="{p / 100:g}"}} {v / 1e6:g}')
+            lines.append(f"{prom}_sum{{{w}}} {h.sum / 1e6:g}")
+            lines.append(f"{prom}_count{{{w}}} {h.total}")
+        if self.last_chunk_ts is not None:
+            lines.append("# TYPE luca_follow_last_record_timestamp_seconds gauge")
+            lines.append(f"luca_follow_last_record_timestamp_seconds {self.last_chunk_ts:.3f}")
+        lines.append("# TYPE luca_follow_offset_bytes gauge")
+        lines.append(f"luca_follow_offset_bytes {offset}")
+        return lines
+
+
+def write_textfile(path, lines):
+    # node_exporter may read at any moment: write aside, then rename over the old file
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    os.replace(tmp, path)
+
+
+class Follower:
+    def __init__(self, path, metrics, from_start=False):
+        self.path = path
+        self.metrics = metrics
+        self.fh = None
+        self.inode = None
+        self.offset = 0
+        self.skip_partial = False
+        self.head_len = 0
+        self.head = None
+        self.stamp = None  # (inode, size, mtime) of the log at the last poll
+        self._open(0 if from_start else None)
+
+    def _open(self, offset):
+        try:
+            fh = self.path.open('rb')
+        except OSError:
+            return
+        st = os.fstat(fh.fileno())
+        self.fh, self.inode = fh, st.st_ino
+        self.head_len, self.head, self.stamp = 0, None, None
+        # Start at the end unless asked otherwise.  If that is inside a chunk,
+        # its rest is dropped up to the closing separator instead of being
+        # parsed as if it were a whole chunk.
+        self.offset = st.st_size if offset is None else offset
+        self.skip_partial = not self._at_boundary(self.offset)
+
+    def _at_boundary(self, offset):
+        # True if `offset` is 0 or right after a separator line
+        if offset == 0:
+            return True
+        back = min(offset, HEAD_BYTES)
+        self.fh.seek(offset - back)
+        tail = self.fh.read(back)
+        if not tail.endswith(b"\n"):
+            return False
+        return is_separator(tail[tail.rfind(b"\n", 0, -1) + 1:])
+
+    def _head_digest(self, length):
+        # Through a fresh handle: the open one may still buffer the bytes from before a truncation
+        with self.path.open('rb') as fh:
+            return hashlib.sha1(fh.read(length)).hexdigest()
+
+    def _head_matches(self):
+        # False once the bytes already read from the start of the file changed (truncated and rewritten)
+        return not self.head_len or self._head_digest(self.head_len) == self.head
+
+    def _read(self):
+        for chunk_off, length, raw, complete in iter_chunk_spans(self.fh, self.offset):
+            if not complete:
+                break
+            if self.skip_partial:
+                self.skip_partial = False
+            else:
+                chunk = decode_chunk(raw)
+                if chunk:
+                    self.metrics.feed(chunk, time.time())
+            self.offset = chunk_off + length
+        head_len = min(self.offset, HEAD_BYTES)
+        if head_len > self.head_len:
+            self.head_len, self.head = head_len, self._head_digest(head_len)
+
+    def poll(self):
+        if self.fh is None:
+            self._open(0)
+            if self.fh is None:
+                return
+        try:
+            st = self.path.stat()
+        except OSError:
+            st = None
+        stamp = None if st is None else (st.st_ino, st.st_size, st.st_mtime_ns)
+        if stamp is not None and stamp == self.stamp:
+            # Not written, rotated or truncated since the last poll: no need to read or hash the head
+            return
+        if st is not None and st.st_ino == self.inode and st.st_size >= self.offset and self._head_matches():
+            self._read()
+        elif st is not None and st.st_ino == self.inode:
+            # Truncated in place (copytruncate), possibly already grown back past the old offset;
+            # reopened so nothing stale is served from the old handle's buffer
+            self.fh.close()
+            self._open(0)
+            if self.fh is not None:
+                self._read()
+        else:
+            # Rotated away: finish the old file through the open handle, then switch
+            self._read()
+            self.fh.close()
+            self.fh = None
+            if st is not None:
+                self._open(0)
+                self._read()
+        self.stamp = stamp
+
+    def close(self):
+        if self.fh is not None:
+            self.fh.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Follow luca-raw.log and export live send metrics to a Prometheus textfile.")
+    ap.add_argument('--log', type=Path, default=LOG_PATH, help=f"log file to follow (default: {LOG_PATH})")
+    ap.add_argument('--textfile', type=Path, default=OUT_PROM, help="Prometheus textfile to write (default: %(default)s)")
+    ap.add_argument('--interval', type=float, default=5.0, help="seconds between textfile rewrites (default: %(default)s)")
+    ap.add_argument('--window', type=int, default=300, help="rolling window for rates, seconds (default: %(default)s)")
+    ap.add_argument('--poll', type=float, default=1.0, help="polling period when inotify is unavailable (default: %(default)s)")
+    ap.add_argument('--from-start', action='store_true', help="read the existing log first instead of starting at its end")
+    ap.add_argument('--once', action='store_true', help="process what is there, write the textfile once and exit")
+    args = ap.parse_args()
+
+    metrics = SendMetrics(args.window)
+    follower = Follower(args.log, metrics, from_start=args.from_start)
+    if args.once:
+        follower.poll()
+        write_textfile(args.textfile, metrics.prometheus(time.time(), follower.offset))
+        follower.close()
+        return 0
+
+    try:
+        watcher = InotifyWatcher(args.log)
+        mode = 'inotify'
+    except (OSError, AttributeError):
+        watcher = PollingWatcher(args.log, args.poll)
+        mode = f'polling every {args.poll:g}s'
+    print(f"Following {args.log} ({mode}); writing {args.textfile} every {args.interval:g}s")
+
+    next_export = time.monotonic()
+    try:
+        while True:
+            follower.poll()
+            now = time.monotonic()
+            if now >= next_export:
+                write_textfile(args.textfile, metrics.prometheus(time.time(), follower.offset))
+                next_export = now + args.interval
+            watcher.wait(max(next_export - time.monotonic(), 0.05))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        follower.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,845 @@
+"""Shared helpers for reading src/Katana.API/logs/luca-raw.log.
+
+LucaService.AppendRawLogAsync writes every call as a block framed by ``----``
+lines (timestamp + tag, URL, Request, ResponseStatus, Response).  The log can
+grow to several GB between rotations, so readers here never load the whole
+file: chunks are produced one at a time and memory use is bounded by the
+largest single chunk.
+"""
+import bisect
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import sqlite3
+import struct
+import zlib
+from collections import namedtuple
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # optional: only needed for .zst segments
+    zstandard = None
+
+
+LOG_PATH = Path("src/Katana.API/logs/luca-raw.log")
+# Bytes hashed from the start of the log to recognise it again after a rotation
+HEAD_BYTES = 4096
+# Rotated segments: luca-raw.log.1, luca-raw.log.2.gz, luca-raw.log.3.zst, ...
+_SEGMENT_RE = re.compile(r"\.(\d+)(\.gz|\.zst|\.cas)?$")
+COMPRESSED_SUFFIXES = (".gz", ".zst")
+# Compacted segments (see compact_luca_log.py) keep large bodies in a blob store
+COMPACTED_SUFFIX = ".cas"
+_SEGMENT_FORMS = (None, ".gz", ".zst", ".cas")
+# Uncompressed bytes per frame when writing seekable .zst segments
+ZST_FRAME_BYTES = 1 << 20
+# Zstandard seekable format: the seek table is a skippable frame at the end of the file
+_SKIPPABLE_SEEK_TABLE_MAGIC = 0x184D2A5E
+_SEEKABLE_MAGIC = 0x8F92EAB1
+
+
+def is_compressed(path):
+    return Path(path).suffix in COMPRESSED_SUFFIXES
+
+
+def is_compacted(path):
+    return Path(path).suffix == COMPACTED_SUFFIX
+
+
+def is_rotated(path):
+    return _SEGMENT_RE.search(Path(path).name) is not None
+
+
+def log_segments(path=LOG_PATH):
+    """Return the rotated segments of `path` oldest first, then `path` itself.
+
+    A higher rotation number is older (logrotate numbering), so luca-raw.log.3.zst
+    comes before luca-raw.log.2.gz, luca-raw.log.1 and the live luca-raw.log.
+    Compacted .cas segments are included the same way.
+    """
+    path = Path(path)
+    rotated = {}
+    for sibling in path.parent.glob(path.name + ".*"):
+        m = _SEGMENT_RE.fullmatch(sibling.name[len(path.name):])
+        if m:
+            # The same segment kept in several forms (compress/compact --keep)
+            # is read once, preferring the original
+            n, form = int(m.group(1)), _SEGMENT_FORMS.index(m.group(2))
+            if n not in rotated or form < rotated[n][0]:
+                rotated[n] = (form, sibling)
+    segments = [rotated[n][1] for n in sorted(rotated, reverse=True)]
+    if path.exists():
+        segments.append(path)
+    return segments
+
+
+def open_log(path):
+    """Open a log segment for binary reading; .gz, .zst and .cas are decompressed on the fly.
+
+    The result supports line iteration, read, tell and seek on uncompressed
+    offsets.  Seeking is cheap for plain files, for .cas segments and for .zst
+    files written in the seekable format (see write_seekable_zst), where only
+    the frame holding the target offset is decompressed; gzip and plain zstd
+    streams seek by decompressing forward.  A .cas segment is returned with
+    its ``@blob:`` references unexpanded (see BlobStore.expand).
+    """
+    path = Path(path)
+    if path.suffix == COMPACTED_SUFFIX:
+        fh = path.open("rb")
+        frames = _read_seek_table(fh)
+        if frames is None:
+            fh.close()
+            raise ValueError(f"{path}: not a compacted log segment (no seek table)")
+        return io.BufferedReader(_SeekableFramesRaw(fh, frames, zlib.decompress), buffer_size=1 << 16)
+    if path.suffix == ".gz":
+        return gzip.open(path, "rb")
+    if path.suffix == ".zst":
+        if zstandard is None:
+            raise RuntimeError(f"{path}: reading .zst segments needs the zstandard package (pip install zstandard)")
+        fh = path.open("rb")
+        frames = _read_seek_table(fh)
+        if frames is None:
+            fh.seek(0)
+            raw = _ForwardRaw(zstandard.ZstdDecompressor().stream_reader(fh, read_across_frames=True))
+        else:
+            raw = _SeekableFramesRaw(fh, frames, _zstd_decompress)
+        return io.BufferedReader(raw, buffer_size=1 << 16)
+    return path.open("rb")
+
+
+def _read_seek_table(fh):
+    # (compressed_offset, compressed_size, offset, size) per frame, or None
+    # when the file carries no seek table
+    fh.seek(0, io.SEEK_END)
+    size = fh.tell()
+    if size < 17:
+        return None
+    fh.seek(size - 9)
+    n_frames, descriptor, magic = struct.unpack("<IBI", fh.read(9))
+    if magic != _SEEKABLE_MAGIC:
+        return None
+    entry = 12 if descriptor & 0x80 else 8
+    table_len = n_frames * entry + 9
+    if table_len + 8 > size:
+        return None
+    fh.seek(size - table_len - 8)
+    skip_magic, frame_len = struct.unpack("<II", fh.read(8))
+    if skip_magic != _SKIPPABLE_SEEK_TABLE_MAGIC or frame_len != table_len:
+        return None
+    table = fh.read(n_frames * entry)
+    frames = []
+    c_off = d_off = 0
+    for k in range(n_frames):
+        c_size, d_size = struct.unpack_from("<II", table, k * entry)
+        if d_size:
+            frames.append((c_off, c_size, d_off, d_size))
+        c_off += c_size
+        d_off += d_size
+    return frames
+
+
+def _zstd_decompress(data):
+    return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+
+
+class _SeekableFramesRaw(io.RawIOBase):
+    # Random access over independently compressed frames listed in a seek
+    # table: decompress only the frame holding the current position (the last
+    # one is kept for sequential reads)
+
+    def __init__(self, fh, frames, decompress):
+        self._fh = fh
+        self._frames = frames
+        self._decompress = decompress
+        self._starts = [f[2] for f in frames]
+        self._size = frames[-1][2] + frames[-1][3] if frames else 0
+        self._pos = 0
+        self._cached = (-1, b"")
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._pos = max(offset, 0)
+        return self._pos
+
+    def _frame(self, i):
+        if self._cached[0] != i:
+            c_off, c_size, _, _ = self._frames[i]
+            self._fh.seek(c_off)
+            self._cached = (i, self._decompress(self._fh.read(c_size)))
+        return self._cached[1]
+
+    def readinto(self, b):
+        if self._pos >= self._size:
+            return 0
+        i = bisect.bisect_right(self._starts, self._pos) - 1
+        data = self._frame(i)
+        at = self._pos - self._frames[i][2]
+        n = min(len(b), len(data) - at)
+        b[:n] = data[at:at + n]
+        self._pos += n
+        return n
+
+    def close(self):
+        self._fh.close()
+        super().close()
+
+
+class _ForwardRaw(io.RawIOBase):
+    # Stream reader that can only seek forward (by reading and discarding)
+
+    def __init__(self, reader):
+        self._reader = reader
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence != io.SEEK_SET or offset < self._pos:
+            raise io.UnsupportedOperation("zstd stream without a seek table can only seek forward")
+        while self._pos < offset:
+            data = self._reader.read(min(offset - self._pos, 1 << 20))
+            if not data:
+                break
+            self._pos += len(data)
+        return self._pos
+
+    def readinto(self, b):
+        data = self._reader.read(len(b))
+        b[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def close(self):
+        self._reader.close()
+        super().close()
+
+
+def write_seekable_zst(src, dst, level=10, frame_bytes=ZST_FRAME_BYTES):
+    """Compress binary file `src` into `dst` in the zstd seekable format.
+
+    Every `frame_bytes` of input becomes an independent frame and a seek table
+    is appended as a skippable frame, so plain ``zstd -d`` still decompresses
+    the file while open_log can jump to any offset.
+    """
+    if zstandard is None:
+        raise RuntimeError("writing .zst segments needs the zstandard package (pip install zstandard)")
+    write_frames(iter(lambda: src.read(frame_bytes), b""), dst, zstandard.ZstdCompressor(level=level).compress)
+
+
+def write_frames(blocks, dst, compress):
+    # Write each block as one independently compressed frame, then the seek table
+    entries = []
+    for block in blocks:
+        frame = compress(block)
+        dst.write(frame)
+        entries.append(struct.pack("<II", len(frame), len(block)))
+    table = b"".join(entries) + struct.pack("<IBI", len(entries), 0, _SEEKABLE_MAGIC)
+    dst.write(struct.pack("<II", _SKIPPABLE_SEEK_TABLE_MAGIC, len(table)))
+    dst.write(table)
+
+
+# A compacted (.cas) segment is the log's chunks with "@blob:<digest>" in place
+# of each large request or response body, written as zlib frames of whole
+# chunks plus a seek table (the same layout as seekable .zst).  Each body is
+# stored once per segment, zlib-compressed, in the SQLite sidecar <segment>.blobs
+# That sidecar also keeps the original segment's head and size and, per chunk,
+# where it ended in the original and in the .cas stream, so a checkpoint taken
+# on the live log still finds its place after rotation and compaction.
+CAS_FRAME_BYTES = 256 * 1024
+BLOB_REF_PREFIX = "@blob:"
+_BLOB_REF_RE = re.compile(r"^@blob:([0-9a-f]{32})$", re.M)
+# Enough for every body referenced from one frame
+BLOB_CACHE_SIZE = 4096
+# SQLite's default limit on host parameters is 999
+_PREFETCH_BATCH = 900
+
+
+def blob_digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def blob_store_path(path):
+    path = Path(path)
+    return path.with_name(path.name + ".blobs")
+
+
+def blob_ref(chunk, start, end):
+    # Digest referenced by the body at chunk[start:end], or None for an inline body
+    if start == -1 or not chunk.startswith(BLOB_REF_PREFIX, start):
+        return None
+    m = _BLOB_REF_RE.fullmatch(chunk, start, end)
+    return m.group(1) if m else None
+
+
+class BlobStore:
+    """Bodies of one compacted segment, keyed by digest."""
+
+    def __init__(self, path, create=False):
+        self.path = blob_store_path(path)
+        if not create and not self.path.exists():
+            raise FileNotFoundError(f"blob store not found: {self.path}")
+        self.conn = sqlite3.connect(self.path)
+        if create:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS blobs (digest BLOB PRIMARY KEY, data BLOB NOT NULL) WITHOUT ROWID"
+            )
+            self.conn.execute("CREATE TABLE IF NOT EXISTS origin (head BLOB NOT NULL, size INTEGER NOT NULL)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunk_ends (offset INTEGER PRIMARY KEY, cas_offset INTEGER NOT NULL) WITHOUT ROWID"
+            )
+        self._known = set()
+        self._cache = {}
+
+    def put(self, text):
+        data = text.encode("utf-8")
+        digest = blob_digest(data)
+        if digest not in self._known:
+            self._known.add(digest)
+            self.conn.execute(
+                "INSERT OR IGNORE INTO blobs (digest, data) VALUES (?, ?)", (bytes.fromhex(digest), zlib.compress(data, 9))
+            )
+        return digest
+
+    def _remember(self, digest, data):
+        if len(self._cache) >= BLOB_CACHE_SIZE:
+            # Retries repeat the body they follow, so recent blobs are the ones asked for again
+            self._cache.pop(next(iter(self._cache)))
+        text = self._cache[digest] = zlib.decompress(data).decode("utf-8")
+        return text
+
+    def get(self, digest):
+        text = self._cache.get(digest)
+        if text is None:
+            row = self.conn.execute("SELECT data FROM blobs WHERE digest = ?", (bytes.fromhex(digest),)).fetchone()
+            if row is None:
+                raise KeyError(f"blob {digest} missing from {self.path}")
+            text = self._remember(digest, row[0])
+        return text
+
+    def prefetch(self, digests):
+        # Load the bodies a sequential reader is about to ask for in a few queries
+        missing = list({d: None for d in digests if d not in self._cache})
+        for i in range(0, len(missing), _PREFETCH_BATCH):
+            batch = [bytes.fromhex(d) for d in missing[i:i + _PREFETCH_BATCH]]
+            sql = "SELECT digest, data FROM blobs WHERE digest IN (%s)" % ",".join("?" * len(batch))
+            for digest, data in self.conn.execute(sql, batch):
+                self._remember(digest.hex(), data)
+
+    def add_chunk_end(self, offset, cas_offset):
+        # A chunk of the original segment ends at `offset`; its record in the .cas stream at `cas_offset`
+        self.conn.execute("INSERT OR REPLACE INTO chunk_ends (offset, cas_offset) VALUES (?, ?)", (offset, cas_offset))
+
+    def set_origin(self, head, size):
+        # head: the first HEAD_BYTES of the original segment
+        self.conn.execute("DELETE FROM origin")
+        self.conn.execute("INSERT INTO origin (head, size) VALUES (?, ?)", (head, size))
+
+    def origin(self):
+        # (head, size) of the original segment, or None if the segment was compacted without them
+        try:
+            return self.conn.execute("SELECT head, size FROM origin").fetchone()
+        except sqlite3.OperationalError:
+            return None
+
+    def cas_offset(self, offset):
+        # Where to read the .cas stream from to continue after original byte `offset` (a chunk end)
+        row = self.conn.execute(
+            "SELECT cas_offset FROM chunk_ends WHERE offset <= ? ORDER BY offset DESC LIMIT 1", (offset,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def expand(self, chunk):
+        # The chunk exactly as it was written before compaction
+        if BLOB_REF_PREFIX not in chunk:
+            return chunk
+        return _BLOB_REF_RE.sub(lambda m: self.get(m.group(1)), chunk)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+def is_separator(line):
+    # A separator is a line made only of dashes (the "----" written by AppendRawLogAsync)
+    stripped = line.rstrip(b"\r\n")
+    return bool(stripped) and stripped.strip(b"-") == b""
+
+
+def iter_chunk_spans(fh, start=0, end=None):
+    # Yield (offset, length, raw, complete) for each chunk from byte `start`.
+    # `complete` is True once the chunk's closing separator line has been fully
+    # written; only the last chunk of a file that is still being appended to
+    # can be incomplete.  With `end` (a chunk boundary, see split_ranges) reading
+    # stops at the first chunk starting at or after it.  fh must be opened in
+    # binary mode.
+    fh.seek(start)
+    pos = start
+    chunk_start = pos
+    lines = []
+    for line in fh:
+        if end is not None and pos >= end and not lines:
+            return
+        if is_separator(line) and line.endswith(b"\n"):
+            if lines:
+                raw = b"".join(lines)
+                yield chunk_start, len(raw), raw, True
+                lines = []
+            pos += len(line)
+            chunk_start = pos
+            continue
+        lines.append(line)
+        pos += len(line)
+    if lines:
+        raw = b"".join(lines)
+        yield chunk_start, len(raw), raw, False
+
+
+def split_ranges(path, parts):
+    """Split `path` into at most `parts` (start, end) byte ranges on chunk boundaries.
+
+    Every boundary falls right after a separator line, so reading each range
+    with iter_chunk_spans(fh, start, end) yields exactly the chunks a single
+    pass over the whole file would, in the same order.  Compressed segments
+    and compacted segments are not split: they come back as the single range
+    (0, None).
+    """
+    if is_compressed(path) or is_compacted(path):
+        return [(0, None)]
+    size = Path(path).stat().st_size
+    bounds = [0]
+    with Path(path).open("rb") as fh:
+        for i in range(1, parts):
+            target = max(size * i // parts, bounds[-1])
+            fh.seek(target)
+            if target:
+                fh.readline()  # skip the partial line we landed in
+            while True:
+                line = fh.readline()
+                if not line:
+                    break
+                if is_separator(line) and line.endswith(b"\n"):
+                    break
+            pos = fh.tell()
+            if pos >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def iter_raw_chunks(fh):
+    # Yield the raw bytes of each chunk between separator lines.
+    # fh must be opened in binary mode; empty chunks are skipped.
+    for _, _, raw, _ in iter_chunk_spans(fh, fh.tell()):
+        yield raw
+
+
+def decode_chunk(raw):
+    return raw.decode("utf-8", errors="replace").strip()
+
+
+def iter_chunks(path=LOG_PATH):
+    # Yield each chunk of one log segment as stripped text, reading line by line.
+    # Bodies of a compacted segment are expanded from its blob store.
+    if is_compacted(path):
+        store = BlobStore(path)
+        try:
+            for chunk in iter_compacted_chunks(path, store):
+                yield store.expand(chunk)
+        finally:
+            store.close()
+        return
+    with open_log(path) as fh:
+        for raw in iter_raw_chunks(fh):
+            chunk = decode_chunk(raw)
+            if chunk:
+                yield chunk
+
+
+_CAS_RECORD_SEP = "\n----\n----\n"
+
+
+def iter_compacted_chunks(path, store=None):
+    # Yield the chunks of a .cas segment with their @blob: references in place.
+    # Frames hold whole "----\n<chunk>\n----\n" records, so each frame is split
+    # in one call instead of being read line by line; with `store`, the bodies
+    # a frame refers to are prefetched before its chunks are yielded.
+    with Path(path).open("rb") as fh:
+        frames = _read_seek_table(fh)
+        if frames is None:
+            raise ValueError(f"{path}: not a compacted log segment (no seek table)")
+        for c_off, c_size, _, _ in frames:
+            fh.seek(c_off)
+            text = zlib.decompress(fh.read(c_size)).decode("utf-8", errors="replace")
+            if store is not None:
+                store.prefetch(_BLOB_REF_RE.findall(text))
+            yield from text[len("----\n"):-len("\n----\n")].split(_CAS_RECORD_SEP)
+
+
+def write_compacted(chunks, dst, frame_bytes=CAS_FRAME_BYTES):
+    # Write already-compacted chunk texts to `dst` as a .cas segment
+    def blocks():
+        buf, size = [], 0
+        for chunk in chunks:
+            record = ("----\n" + chunk + "\n----\n").encode("utf-8")
+            buf.append(record)
+            size += len(record)
+            if size >= frame_bytes:
+                yield b"".join(buf)
+                buf, size = [], 0
+        if buf:
+            yield b"".join(buf)
+    write_frames(blocks(), dst, lambda block: zlib.compress(block, 9))
+
+
+def iter_segment_chunks(path=LOG_PATH):
+    # Like iter_chunks, across every rotated segment of `path` in chronological order
+    for segment in log_segments(path):
+        yield from iter_chunks(segment)
+
+
+# Offsets into a chunk as returned by scan_chunk; a span is -1/-1 when missing.
+ChunkTokens = namedtuple(
+    'ChunkTokens', 'ts tag url status req_start req_end resp_start resp_end'
+)
+_TRAILING = " \t\r\n-"
+
+# The layout AppendRawLogAsync writes: "<ts> <tag>", "URL: <url>", "Request:",
+# body, "ResponseStatus: <status>", "Response:", body
+_PREFIX_RE = re.compile(r"(\S*) ?([^\n]*)\n(?:URL: ?([^\n]*)\n)?Request:[ \t\r\n]*+")
+_STATUS_RE = re.compile(r"ResponseStatus: ?([^\n]*)\nResponse:[ \t\r\n]*+")
+# Skip namedtuple's Python-level __new__ on this hot path
+_new_tokens = tuple.__new__
+
+
+def scan_chunk(chunk):
+    """Tokenize one decoded chunk in a single forward pass.
+
+    One anchored regex match reads the header, URL and start of the request;
+    a single find() then skips the request body to ResponseStatus:, where a
+    second anchored match reads the status and the start of the response.
+    The body is scanned once and nothing is copied: request/response come
+    back as offsets, trimmed of surrounding whitespace and trailing ``-``
+    like the old per-script extraction.
+    """
+    n = len(chunk)
+    m = _PREFIX_RE.match(chunk)
+    if m is not None:
+        req_start = m.end()
+        status_at = chunk.find("\nResponseStatus:", req_start)
+        t = _STATUS_RE.match(chunk, status_at + 1) if status_at != -1 else None
+        if t is not None:
+            ts, tag, url = m.group(1, 2, 3)
+            req_end = status_at
+            while req_end > req_start and chunk[req_end - 1] in _TRAILING:
+                req_end -= 1
+            resp_start = t.end()
+            resp_end = n
+            while resp_end > resp_start and chunk[resp_end - 1] in _TRAILING:
+                resp_end -= 1
+            return _new_tokens(ChunkTokens, (
+                ts, tag.strip(), url or '', t.group(1).strip(), req_start, req_end, resp_start, resp_end,
+            ))
+    return _scan_loose(chunk)
+
+
+def _scan_loose(chunk):
+    # Slow path for chunks that do not follow the usual layout (missing URL or
+    # Response lines, truncated writes): same result shape, marker by marker.
+    n = len(chunk)
+    nl = chunk.find("\n")
+    ts, _, tag = chunk[:nl if nl != -1 else n].partition(" ")
+    tag, url = tag.strip(), ''
+    pos = nl + 1 if nl != -1 else n
+    if chunk.startswith("URL:", pos):
+        nl = chunk.find("\n", pos)
+        url = chunk[pos + len("URL:"):nl if nl != -1 else n].strip()
+        pos = nl + 1 if nl != -1 else n
+    req = chunk.find("Request:", pos)
+    if req == -1:
+        return ChunkTokens(ts, tag, url, None, -1, -1, -1, -1)
+    req_start = req + len("Request:")
+    while req_start < n and chunk[req_start] in " \t\r\n":
+        req_start += 1
+
+    status = None
+    status_at = chunk.find("ResponseStatus:", req_start)
+    if status_at != -1:
+        line_end = chunk.find("\n", status_at)
+        if line_end == -1:
+            line_end = n
+        status = chunk[status_at + len("ResponseStatus:"):line_end].strip()
+        resp_at = chunk.find("Response:", line_end)
+        req_end = status_at
+    else:
+        resp_at = chunk.find("Response:", req_start)
+        req_end = resp_at if resp_at != -1 else n
+    while req_end > req_start and chunk[req_end - 1] in _TRAILING:
+        req_end -= 1
+
+    if resp_at == -1:
+        return ChunkTokens(ts, tag, url, status, req_start, req_end, -1, -1)
+    resp_start = resp_at + len("Response:")
+    while resp_start < n and chunk[resp_start] in " \t\r\n":
+        resp_start += 1
+    resp_end = n
+    while resp_end > resp_start and chunk[resp_end - 1] in _TRAILING:
+        resp_end -= 1
+    return ChunkTokens(ts, tag, url, status, req_start, req_end, resp_start, resp_end)
+
+
+_FRACTION_RE = re.compile(r"(\.\d{6})\d+")
+
+
+def parse_ts(ts):
+    # Chunk timestamps are .NET round-trip ("o") strings with 7 fractional digits
+    try:
+        return datetime.fromisoformat(_FRACTION_RE.sub(r"\1", ts).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+# Mirrors the duplicate / success checks in LucaService.SendStockCardsAsync
+_DUPLICATE_MARKERS = (
+    "daha önce kullanılmış", "daha once kullanilmis", "nce kullan", "already exists", "duplicate", "kart kodu daha",
+)
+_SUCCESS_STATUSES = {"OK", "Created", "Accepted", "NoContent", "200", "201", "202", "204"}
+SUCCESS_OUTCOMES = ("created", "duplicate")
+
+
+def response_outcome(status, body):
+    """Classify a Luca stock card response.
+
+    Returns 'html' (login page: the session expired), 'session' (code 1003),
+    'duplicate' (card already exists, treated as done), 'error' or 'created'.
+    """
+    head = body.lstrip()[:1]
+    if head == "<":
+        return "html"
+    obj = None
+    if head == "{":
+        try:
+            obj = json.loads(body)
+        except ValueError:
+            obj = None
+    if isinstance(obj, dict):
+        if obj.get("error") is True:
+            msg = str(obj.get("message") or "").lower()
+            return "duplicate" if any(m in msg for m in _DUPLICATE_MARKERS) else "error"
+        code = obj.get("code")
+        if isinstance(code, int) and not isinstance(code, bool):
+            if code == 1003:
+                return "session"
+            if code != 0:
+                return "error"
+    if status is not None and status not in _SUCCESS_STATUSES:
+        return "error"
+    # Unparseable bodies on HTTP OK are treated as success, as the service does
+    return "created"
+
+
+def span_text(chunk, start, end):
+    return chunk[start:end] if start != -1 else ''
+
+
+_json_decoder = json.JSONDecoder()
+_JSON_WS_RE = re.compile(r"[ \t\r\n]*")
+# Start of the next object in a batch array, used to resync after a corrupt item
+_NEXT_ITEM_RE = re.compile(r",[ \t\r\n]*(?=\{)")
+
+
+def iter_json_items(text, start=0, end=None):
+    """Yield the items of the JSON array (or the single object) at text[start:end].
+
+    Items are decoded one at a time straight out of `text` with raw_decode, so
+    neither a copy of the payload nor the whole decoded list is ever held; only
+    the current item is.  A corrupt or truncated item is skipped by resyncing
+    at the next ``,{`` boundary, so the intact items of a broken batch are
+    still returned.
+    """
+    end = len(text) if end is None else end
+    pos = _JSON_WS_RE.match(text, start).end()
+    if pos >= end:
+        return
+    if text[pos] != '[':
+        try:
+            obj, _ = _json_decoder.raw_decode(text, pos)
+        except ValueError:
+            return
+        yield obj
+        return
+
+    pos += 1
+    while True:
+        pos = _JSON_WS_RE.match(text, pos).end()
+        if pos >= end or text[pos] == ']':
+            return
+        try:
+            item, pos = _json_decoder.raw_decode(text, pos)
+        except ValueError:
+            m = _NEXT_ITEM_RE.search(text, pos + 1, end)
+            if m is None:
+                return
+            pos = m.end()
+            continue
+        yield item
+        pos = _JSON_WS_RE.match(text, pos).end()
+        if pos < end and text[pos] == ',':
+            pos += 1
+
+
+def head_digest(path, length):
+    # Hash of the first `length` uncompressed bytes, so a segment is still
+    # recognised after it has been rotated and compressed
+    with open_log(path) as fh:
+        return hashlib.sha1(fh.read(length)).hexdigest()
+
+
+def file_state(path, offset):
+    # Identity of `path` as seen when everything before `offset` has been consumed
+    st = Path(path).stat()
+    head_len = min(offset, HEAD_BYTES)
+    return {
+        'inode': st.st_ino,
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+        'offset': offset,
+        'head_len': head_len,
+        'head': head_digest(path, head_len),
+    }
+
+
+def _continues(path, state):
+    # True if `path` still holds the bytes the saved state was taken from.
+    # A .cas segment is compared through the original head and size it keeps.
+    try:
+        if is_compacted(path):
+            store = BlobStore(path)
+            try:
+                origin = store.origin()
+            finally:
+                store.close()
+            if origin is None:
+                return False
+            head, size = origin
+            return (size >= state['offset'] and state['head_len'] <= len(head)
+                    and hashlib.sha1(head[:state['head_len']]).hexdigest() == state['head'])
+        if not is_compressed(path) and path.stat().st_size < state['offset']:
+            return False
+        return head_digest(path, state['head_len']) == state['head']
+    except (OSError, EOFError, RuntimeError, sqlite3.Error):
+        return False
+
+
+def resume_offset(path, offset):
+    """Offset in `path` as read by open_log() to continue after the original byte `offset`.
+
+    Checkpoints count bytes of the plain log; a .cas segment maps them
+    through the chunk ends recorded when it was compacted.
+    """
+    if not is_compacted(path):
+        return offset
+    store = BlobStore(path)
+    try:
+        return store.cas_offset(offset)
+    finally:
+        store.close()
+
+
+def resume_segments(path, state):
+    """Return the (path, start_offset) pairs to read to catch up from `state`.
+
+    If the log was rotated (renamed away) or truncated since `state` was saved,
+    the rest of the previous file is read first when it can still be found next
+    to the log (possibly compressed or compacted by then), then the new log
+    from byte 0.  If it cannot be found, only [(path, 0)] is returned.
+    """
+    path = Path(path)
+    if not state:
+        return [(path, 0)]
+    if path.stat().st_ino == state['inode'] and _continues(path, state):
+        return [(path, state['offset'])]
+    for sibling in reversed(log_segments(path)[:-1]):
+        same_inode = sibling.stat().st_ino == state['inode']
+        # copytruncate leaves the old bytes under a new inode, so fall back to the head hash
+        if (same_inode or state['head_len']) and _continues(sibling, state):
+            return [(sibling, resume_offset(sibling, state['offset'])), (path, 0)]
+    return [(path, 0)]
+
+
+# SaveHttpTrafficAsync writes "<sanitized tag>-http-yyyyMMdd-HHmmss.txt" next to
+# luca-raw.log: the call's headers only, framed like a log chunk
+DUMP_NAME_RE = re.compile(r"^(.*)-http-(\d{8}-\d{6})\.txt$")
+
+
+def iter_dump_files(directory):
+    # Yield an os.DirEntry per traffic dump file in `directory` (not recursive)
+    with os.scandir(directory) as it:
+        for entry in it:
+            if DUMP_NAME_RE.match(entry.name) and entry.is_file():
+                yield entry
+
+
+def parse_dump(text):
+    """Parse the text of one SaveHttpTrafficAsync dump.
+
+    Returns a dict with ts, tag, uri, method, status and lower-cased
+    request_headers / response_headers; fields missing from the dump are ''.
+    """
+    dump = {
+        'ts': '', 'tag': '', 'uri': '', 'method': '', 'status': '',
+        'request_headers': {}, 'response_headers': {},
+    }
+    headers = None
+    for line in text.splitlines():
+        line = line.rstrip()
+        if not line or is_separator(line.encode()):
+            continue
+        if not dump['ts'] and not dump['tag']:
+            dump['ts'], _, tag = line.partition(" ")
+            dump['tag'] = tag.strip()
+            continue
+        if line == "Request Headers:":
+            headers = dump['request_headers']
+        elif line == "Response Headers:":
+            headers = dump['response_headers']
+        elif line.startswith("RequestUri: "):
+            dump['uri'] = line[len("RequestUri: "):]
+        elif line.startswith("RequestMethod: "):
+            dump['method'] = line[len("RequestMethod: "):]
+        elif line.startswith("Response Status: "):
+            dump['status'] = line[len("Response Status: "):]
+            headers = None
+        elif line == "Set-Cookie:" or line.startswith(("CookiesFile: ", "Cookie dump failed")):
+            headers = None
+        elif headers is not None:
+            name, sep, value = line.partition(": ")
+            if sep:
+                headers[name.lower()] = value
+    return dump
@@ -0,0 +1,223 @@
+"""Seek index over luca-raw.log by tag, kartKodu and timestamp.
+
+The index is a SQLite sidecar (``luca-raw.log.idx``) mapping every complete
+chunk to its byte offset and length in the log.  It is built once and then
+extended with only the chunks appended since the last run; if the log was
+rotated or truncated it is rebuilt from scratch.
+
+Rotated segments (``luca-raw.log.1``, ``.2.gz``, ``.3.zst``) get a sidecar of
+their own, built on first use and keyed on uncompressed offsets.  Lookups walk
+the segments newest first and stop once enough matches are found; for .zst
+segments in the seekable format a lookup only decompresses the frame holding
+the chunk.
+
+Usage:
+    python scripts/luca_log_index.py --kart 1-18447-KOVAN --last 5
+    python scripts/luca_log_index.py --tag SEND_STOCK_CARD_HTML --last 3 --list
+"""
+import argparse
+import json
+import re
+import sqlite3
+import sys
+from pathlib import Path
+
+from luca_log import (
+    LOG_PATH, BlobStore, file_state, is_compacted, is_rotated, iter_chunk_spans, log_segments, open_log, resume_segments,
+)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    ts TEXT NOT NULL,
+    tag TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS karts (kart TEXT NOT NULL, chunk_id INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS ix_chunks_tag ON chunks (tag);
+CREATE INDEX IF NOT EXISTS ix_chunks_ts ON chunks (ts);
+CREATE INDEX IF NOT EXISTS ix_karts_kart ON karts (kart, chunk_id);
+"""
+
+KART_RE = re.compile(rb'"kartKodu?"\s*:\s*"([^"]*)"')
+
+
+def index_path(log_path):
+    log_path = Path(log_path)
+    return log_path.with_name(log_path.name + '.idx')
+
+
+def chunk_header(raw):
+    # First line of a chunk is "<ISO timestamp> <TAG>"
+    first = raw.split(b"\n", 1)[0].decode("utf-8", errors="replace").strip()
+    ts, _, tag = first.partition(" ")
+    return ts, tag.strip()
+
+
+def chunk_karts(raw, tag):
+    # kartKodu values sent in this chunk: the tag suffix (SEND_STOCK_CARD_HTML:<kart>)
+    # plus every kartKodu in the request body (batches carry many)
+    karts = []
+    if tag.startswith("SEND_STOCK_CARD") and ":" in tag:
+        karts.append(tag.split(":", 1)[1])
+    req_end = raw.find(b"\nResponseStatus:")
+    for m in KART_RE.finditer(raw, 0, req_end if req_end != -1 else len(raw)):
+        kart = m.group(1).decode("utf-8", errors="replace")
+        if kart and kart not in karts:
+            karts.append(kart)
+    return karts
+
+
+def _load_state(conn):
+    row = conn.execute("SELECT value FROM meta WHERE key = 'state'").fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def _unchanged(log_path, state):
+    st = log_path.stat()
+    return (state['inode'], state['size'], state.get('mtime_ns')) == (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+def ensure_index(log_path=LOG_PATH):
+    """Open the index for `log_path`, bringing it up to date with the log first."""
+    log_path = Path(log_path)
+    conn = sqlite3.connect(index_path(log_path))
+    conn.executescript(SCHEMA)
+
+    state = _load_state(conn)
+    # Nothing to do when the file is untouched and no partial chunk was left behind
+    if state and _unchanged(log_path, state) and (state['offset'] == state['size'] or is_rotated(log_path)):
+        return conn
+    if is_rotated(log_path):
+        # Rotated segments are never appended to: a changed file is a different segment
+        start = 0
+    else:
+        # The live log is always the last segment; it starts at 0 after a rotation
+        start = resume_segments(log_path, state)[-1][1]
+    if state and start == 0:
+        # Rotated or truncated: the stored offsets no longer point into this file
+        conn.execute("DELETE FROM karts")
+        conn.execute("DELETE FROM chunks")
+
+    offset = start
+    # Request bodies of a compacted segment live in its blob store
+    store = BlobStore(log_path) if is_compacted(log_path) else None
+    with conn, open_log(log_path) as fh:
+        for chunk_off, length, raw, complete in iter_chunk_spans(fh, start):
+            if not complete:
+                break
+            ts, tag = chunk_header(raw)
+            cur = conn.execute(
+                "INSERT INTO chunks (offset, length, ts, tag) VALUES (?, ?, ?, ?)",
+                (chunk_off, length, ts, tag),
+            )
+            if store:
+                raw = store.expand(raw.decode("utf-8", errors="replace")).encode("utf-8")
+            karts = chunk_karts(raw, tag)
+            if karts:
+                conn.executemany(
+                    "INSERT INTO karts (kart, chunk_id) VALUES (?, ?)",
+                    [(k, cur.lastrowid) for k in karts],
+                )
+            offset = chunk_off + length
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('state', ?)",
+            (json.dumps(file_state(log_path, offset)),),
+        )
+    if store:
+        store.close()
+    return conn
+
+
+def lookup(conn, kart=None, tag=None, last=None):
+    # Return (offset, length, ts, tag) rows in log order; `tag` also matches "<tag>:<suffix>"
+    sql = "SELECT c.offset, c.length, c.ts, c.tag FROM chunks c"
+    where, params = [], []
+    if kart:
+        sql += " JOIN karts k ON k.chunk_id = c.id"
+        where.append("k.kart = ?")
+        params.append(kart)
+    if tag:
+        # Exact, case-sensitive prefix: LIKE would ignore case
+        where.append("(c.tag = ? OR substr(c.tag, 1, length(?)) = ?)")
+        params += [tag, tag + ":", tag + ":"]
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY c.id DESC"
+    if last:
+        sql += " LIMIT ?"
+        params.append(last)
+    return list(reversed(conn.execute(sql, params).fetchall()))
+
+
+def iter_segment_indexes(log_path=LOG_PATH):
+    # Yield (segment, conn) for the live log and then each rotated segment, newest first
+    for segment in reversed(log_segments(log_path)):
+        conn = ensure_index(segment)
+        try:
+            yield segment, conn
+        finally:
+            conn.close()
+
+
+def lookup_segments(log_path=LOG_PATH, kart=None, tag=None, last=None):
+    # Like lookup, across rotated segments: (segment, offset, length, ts, tag) rows in log order
+    found = []
+    for segment, conn in iter_segment_indexes(log_path):
+        want = last - len(found) if last else None
+        rows = lookup(conn, kart=kart, tag=tag, last=want)
+        found[:0] = [(segment,) + row for row in rows]
+        if last and len(found) >= last:
+            break
+    return found
+
+
+def read_chunk(log_path, offset, length):
+    with open_log(log_path) as fh:
+        fh.seek(offset)
+        text = fh.read(length).decode("utf-8", errors="replace")
+    if is_compacted(log_path):
+        store = BlobStore(log_path)
+        text = store.expand(text)
+        store.close()
+    return text
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Look up luca-raw.log chunks by kartKodu / tag via a seek index.")
+    ap.add_argument("--log", type=Path, default=LOG_PATH, help=f"log file (default: {LOG_PATH})")
+    ap.add_argument("--kart", help="kartKodu to look up")
+    ap.add_argument("--tag", help="chunk tag, e.g. SEND_STOCK_CARD_HTML or CHANGE_BRANCH")
+    ap.add_argument("--last", type=int, default=5, help="number of most recent chunks to show (0 = all)")
+    ap.add_argument("--list", action="store_true", help="only list offset/timestamp/tag, do not print chunks")
+    ap.add_argument("--rebuild", action="store_true", help="drop the index and build it again")
+    args = ap.parse_args()
+
+    segments = log_segments(args.log)
+    if not segments:
+        print(f"Log file not found: {args.log}")
+        return 1
+    if args.rebuild:
+        for segment in segments:
+            index_path(segment).unlink(missing_ok=True)
+
+    rows = lookup_segments(args.log, kart=args.kart, tag=args.tag, last=args.last or None)
+    if not rows:
+        print("no match")
+        return 0
+
+    for segment, offset, length, ts, tag in rows:
+        if args.list:
+            print(f"{segment.name}\t{offset}\t{length}\t{ts}\t{tag}")
+            continue
+        print(f"---- {ts} {tag} ({segment.name}, offset={offset}, length={length})")
+        sys.stdout.write(read_chunk(segment, offset, length))
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""Retry-chain reconstruction and request amplification report for stock card sends.
+
+LucaService.SendStockCardsAsync can send one card as SEND_STOCK_CARD and then
+SEND_STOCK_CARD_RETRY, _SESSION_RETRY:<kart>, _UTF8_RETRY:<kart>,
+_FORM_RETRY:<kart> ... .  This links every attempt for the same kartKodu into
+one chain and reports HTTP calls per successfully sent card (amplification),
+broken down by retry kind and by hour, plus the wall-clock time between a
+failed first attempt and the chain's final outcome.
+
+SEND_STOCK_CARD_HTML:<kart> records are not separate calls (they re-log the
+response of the attempt before them), so they only mark that attempt as an
+HTML / expired-session failure.
+
+Usage:
+    python scripts/luca_retry_chains.py [--log luca-raw.log.1 --log luca-raw.log] [--csv chains.csv]
+"""
+import argparse
+import csv
+import re
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+from luca_log import (
+    LOG_PATH, SUCCESS_OUTCOMES, iter_chunks, iter_json_items, log_segments, parse_ts, response_outcome, scan_chunk,
+    span_text,
+)
+
+
+ATTEMPT_KINDS = {
+    'SEND_STOCK_CARD': 'INITIAL',
+    'SEND_STOCK_CARD_RETRY': 'BRANCH_RETRY',
+    'SEND_STOCK_CARD_SESSION_RETRY': 'SESSION_RETRY',
+    'SEND_STOCK_CARD_UTF8_RETRY': 'UTF8_RETRY',
+    'SEND_STOCK_CARD_FORM_RETRY': 'FORM_RETRY',
+    'SEND_STOCK_CARD_WRAPPED': 'WRAPPED',
+    'SEND_STOCK_CARD_FORM_EMPTYERROR': 'FORM_EMPTYERROR',
+}
+HTML_TAG = 'SEND_STOCK_CARD_HTML'
+# A chain with no new attempt for this long is considered finished
+IDLE_CLOSE = timedelta(minutes=30)
+SWEEP_EVERY = 5000
+
+_FORM_KART_RE = re.compile(r'(?:^|&)kartKodu=([^&\s]+)')
+
+
+def attempt_kart(chunk, tok, suffix):
+    if suffix:
+        return suffix
+    for item in iter_json_items(chunk, tok.req_start, tok.req_end):
+        if isinstance(item, dict):
+            return item.get('kartKodu') or item.get('kartKod') or ''
+        break
+    m = _FORM_KART_RE.search(chunk, tok.req_start, tok.req_end)
+    return m.group(1) if m else ''
+
+
+class ChainStats:
+    def __init__(self):
+        self.calls = 0
+        self.cards_ok = 0
+        self.cards_failed = 0
+        self.orphans = 0
+        self.by_kind = {}       # kind -> [calls, successful calls]
+        self.by_hour = {}       # 'YYYY-MM-DDTHH' -> [calls, cards ok, cards failed]
+        self.by_length = {}     # attempts per chain -> chains
+        self.retry_seconds = 0.0
+        self.failed_first = 0
+
+    def add(self, chain):
+        attempts = chain['attempts']
+        ok_at = next((a for a in attempts if a['outcome'] in SUCCESS_OUTCOMES), None)
+        self.calls += len(attempts)
+        if ok_at is not None:
+            self.cards_ok += 1
+        else:
+            self.cards_failed += 1
+        if chain['orphan']:
+            self.orphans += 1
+        for a in attempts:
+            k = self.by_kind.setdefault(a['kind'], [0, 0])
+            k[0] += 1
+            if a['outcome'] in SUCCESS_OUTCOMES:
+                k[1] += 1
+        hour = attempts[0]['ts_text'][:13]
+        h = self.by_hour.setdefault(hour, [0, 0, 0])
+        h[0] += len(attempts)
+        h[1 if ok_at is not None else 2] += 1
+        self.by_length[len(attempts)] = self.by_length.get(len(attempts), 0) + 1
+
+        # Time lost to failures: from the failed first response to the chain's final outcome
+        first = attempts[0]
+        if first['outcome'] not in SUCCESS_OUTCOMES:
+            self.failed_first += 1
+            end = ok_at if ok_at is not None else attempts[-1]
+            if first['ts'] and end['ts']:
+                self.retry_seconds += (end['ts'] - first['ts']).total_seconds()
+
+
+def iter_chains(log_paths):
+    # Yield finished chains in the order they close
+    open_chains = {}
+    seen = 0
+    for path in log_paths:
+        for chunk in iter_chunks(path):
+            tok = scan_chunk(chunk)
+            if not tok.tag.startswith('SEND_STOCK_CARD') or tok.tag.startswith('SEND_STOCK_CARDS'):
+                continue
+            base, _, suffix = tok.tag.partition(':')
+            ts = parse_ts(tok.ts)
+
+            if base == HTML_TAG:
+                chain = open_chains.get(suffix)
+                if chain:
+                    chain['attempts'][-1]['outcome'] = 'html'
+                continue
+
+            kart = attempt_kart(chunk, tok, suffix)
+            if not kart:
+                continue
+            kind = ATTEMPT_KINDS.get(base, base)
+            attempt = {
+                'ts': ts,
+                'ts_text': tok.ts,
+                'kind': kind,
+                'outcome': response_outcome(tok.status, span_text(chunk, tok.resp_start, tok.resp_end)),
+            }
+            chain = open_chains.get(kart)
+            if chain is not None and kind == 'INITIAL':
+                yield open_chains.pop(kart)
+                chain = None
+            if chain is None:
+                chain = {'kart': kart, 'attempts': [], 'orphan': kind != 'INITIAL'}
+                open_chains[kart] = chain
+            chain['attempts'].append(attempt)
+
+            seen += 1
+            if ts and seen % SWEEP_EVERY == 0:
+                # Bound memory on long logs: chains idle for a while are done
+                for k in [k for k, c in open_chains.items() if c['attempts'][-1]['ts'] and ts - c['attempts'][-1]['ts'] > IDLE_CLOSE]:
+                    yield open_chains.pop(k)
+    yield from open_chains.values()
+
+
+def print_report(stats):
+    print(f"Chains: {stats.cards_ok + stats.cards_failed} (succeeded={stats.cards_ok}, failed={stats.cards_failed}, "
+          f"started without SEND_STOCK_CARD={stats.orphans})")
+    print(f"HTTP calls: {stats.calls}")
+    amp = stats.calls / stats.cards_ok if stats.cards_ok else float('nan')
+    print(f"Amplification: {amp:.3f} calls per successfully sent card")
+    print(f"Retry wall-clock: {stats.retry_seconds:.1f}s over {stats.failed_first} chains whose first attempt failed")
+
+    print("ByAttemptKind (calls, successful, share of calls):")
+    for kind, (calls, ok) in sorted(stats.by_kind.items(), key=lambda x: -x[1][0]):
+        print(f"  {kind:<16} {calls:>8} {ok:>8}  {calls / stats.calls:6.1%}")
+
+    print("ByChainLength (attempts -> chains):")
+    for n, count in sorted(stats.by_length.items()):
+        print(f"  {n}: {count}")
+
+    print("ByHour (calls, cards ok, cards failed, amplification):")
+    for hour, (calls, ok, failed) in sorted(stats.by_hour.items()):
+        amp = f"{calls / ok:.3f}" if ok else '-'
+        print(f"  {hour}  {calls:>7} {ok:>7} {failed:>7}  {amp}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Link stock card send attempts into retry chains and report amplification.")
+    ap.add_argument('--log', dest='logs', action='append', type=Path,
+                    help=f"log file, repeat in chronological order (default: {LOG_PATH} and its rotated segments)")
+    ap.add_argument('--csv', type=Path, help="also write one row per chain to this CSV")
+    args = ap.parse_args()
+
+    log_paths = args.logs or log_segments(LOG_PATH) or [LOG_PATH]
+    for path in log_paths:
+        if not path.exists():
+            print(f"Log file not found: {path}")
+            return 1
+
+    stats = ChainStats()
+    f = writer = None
+    try:
+        if args.csv:
+            f = args.csv.open('w', newline='', encoding='utf-8')
+            writer = csv.writer(f)
+            writer.writerow(['KartKodu', 'Start', 'Attempts', 'Kinds', 'Outcomes', 'Succeeded'])
+        for chain in iter_chains(log_paths):
+            stats.add(chain)
+            if writer:
+                attempts = chain['attempts']
+                writer.writerow([
+                    chain['kart'],
+                    attempts[0]['ts_text'],
+                    len(attempts),
+                    '>'.join(a['kind'] for a in attempts),
+                    '>'.join(a['outcome'] for a in attempts),
+                    'Y' if any(a['outcome'] in SUCCESS_OUTCOMES for a in attempts) else 'N',
+                ])
+    finally:
+        if f is not None:
+            f.close()
+
+    if not stats.calls:
+        print("No SEND_STOCK_CARD entries found in log.")
+        return 0
+    print_report(stats)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
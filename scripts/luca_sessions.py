@@ -0,0 +1,240 @@
+"""Luca session epochs: how long a session lives and how many calls an expiry wastes.
+
+A session epoch starts with a successful login (AUTH_LOGIN:*,
+AUTH_LOGIN_ONCLIENT:*) or branch change (CHANGE_BRANCH:*); a login followed by
+its branch change before any other call counts as one start.  It ends when a
+call gets the Luca login page back (HTML, the JSESSIONID expired) or code 1003.
+Every call after that up to the next start is wasted on the dead session; the
+call that hit the login page is counted as wasted too.  A start while an epoch
+is still alive closes it as 'refreshed', which says nothing about its lifetime.
+
+SEND_STOCK_CARD_HTML:<kart> re-logs the response of the call before it and is
+not counted again.  AUTH_LOGIN_GET* fetches the login page on purpose and is
+ignored.
+
+The refresh table is a what-if on the expired epochs: refreshing every T
+seconds would have avoided the expiries of epochs that lived longer than T
+(and the calls they wasted), at the price of one extra re-authentication per
+T of session time.  It assumes Luca expires sessions on age; compare the
+lifetime and idle-before-expiry distributions before trusting it.
+
+Usage:
+    python scripts/luca_sessions.py [--log luca-raw.log.1 --log luca-raw.log] [--csv epochs.csv]
+"""
+import argparse
+import csv
+import sys
+from pathlib import Path
+
+from luca_log import LOG_PATH, SUCCESS_OUTCOMES, iter_chunks, log_segments, parse_ts, response_outcome, scan_chunk, span_text
+
+START_TAGS = ('AUTH_LOGIN', 'AUTH_LOGIN_ONCLIENT', 'CHANGE_BRANCH')
+IGNORED_TAGS = ('AUTH_LOGIN_GET', 'AUTH_LOGIN_GET_ONCLIENT')
+HTML_TAG = 'SEND_STOCK_CARD_HTML'
+EXPIRED_OUTCOMES = ('html', 'session')
+# ChangeBranch answers HTTP 200 with these when the session is not logged in
+_NOT_LOGGED_IN = ('login olunmalı', 'login olunmali')
+PERCENTILES = (5, 10, 25, 50, 75, 90, 95)
+REFRESH_MINUTES = (2, 5, 10, 15, 20, 30, 45, 60)
+
+
+def percentile(sorted_values, p):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return None
+    k = max(1, -(-p * len(sorted_values) // 100))
+    return sorted_values[k - 1]
+
+
+def start_succeeded(status, body):
+    if response_outcome(status, body) not in SUCCESS_OUTCOMES:
+        return False
+    low = body[:2000].lower()
+    return not any(m in low for m in _NOT_LOGGED_IN)
+
+
+def iter_epochs(log_paths):
+    """Yield epochs in log order.
+
+    Each epoch is a dict with start/end datetimes, start_tags, calls (calls made
+    while the session was alive), last_ok (time of its last successful call),
+    end_reason ('expired', 'refreshed' or 'open') and wasted (calls that hit the
+    dead session, expired epochs only).
+    """
+    epoch = None
+    last_call_html = False
+    for path in log_paths:
+        for chunk in iter_chunks(path):
+            tok = scan_chunk(chunk)
+            base = tok.tag.partition(':')[0]
+            if base in IGNORED_TAGS:
+                continue
+            ts = parse_ts(tok.ts)
+            body = span_text(chunk, tok.resp_start, tok.resp_end)
+
+            if base in START_TAGS:
+                if not start_succeeded(tok.status, body):
+                    continue
+                last_call_html = False
+                if epoch is not None and epoch['end_reason'] is None and not epoch['calls']:
+                    # Login and its branch change: one re-authentication
+                    epoch['start_tags'].append(base)
+                    continue
+                if epoch is not None:
+                    if epoch['end_reason'] is None:
+                        epoch['end_reason'] = 'refreshed'
+                        epoch['end'] = ts
+                    yield epoch
+                epoch = {'start': ts, 'start_tags': [base], 'end': None, 'end_reason': None,
+                         'calls': 0, 'last_ok': ts, 'wasted': 0}
+                continue
+
+            if base == HTML_TAG and last_call_html:
+                continue
+            expired = response_outcome(tok.status, body) in EXPIRED_OUTCOMES
+            last_call_html = expired
+            if epoch is None:
+                continue
+            if epoch['end_reason'] == 'expired':
+                epoch['wasted'] += 1
+            elif expired:
+                epoch['end_reason'] = 'expired'
+                epoch['end'] = ts
+                epoch['wasted'] = 1
+            else:
+                epoch['calls'] += 1
+                epoch['last_ok'] = ts
+    if epoch is not None:
+        if epoch['end_reason'] is None:
+            epoch['end_reason'] = 'open'
+        yield epoch
+
+
+def seconds_between(a, b):
+    return (b - a).total_seconds() if a is not None and b is not None else None
+
+
+class EpochStats:
+    def __init__(self):
+        self.by_reason = {}
+        self.lifetimes = []       # expired epochs: start -> first dead call
+        self.idle = []            # expired epochs: last successful call -> first dead call
+        self.calls_before = []    # expired epochs: calls that succeeded
+        self.wasted = []          # expired epochs: calls wasted after expiry
+        self.session_seconds = 0.0
+
+    def add(self, epoch):
+        reason = epoch['end_reason']
+        self.by_reason[reason] = self.by_reason.get(reason, 0) + 1
+        life = seconds_between(epoch['start'], epoch['end'])
+        if life is not None and life >= 0:
+            self.session_seconds += life
+        if reason != 'expired' or life is None or life < 0:
+            return
+        self.lifetimes.append(life)
+        idle = seconds_between(epoch['last_ok'], epoch['end'])
+        if idle is not None:
+            self.idle.append(max(idle, 0.0))
+        self.calls_before.append(epoch['calls'])
+        self.wasted.append(epoch['wasted'])
+
+    def refresh_rows(self, intervals):
+        # (T, expiries avoided, wasted calls saved, extra re-authentications)
+        pairs = list(zip(self.lifetimes, self.wasted))
+        for t in intervals:
+            avoided = [w for life, w in pairs if life > t]
+            yield t, len(avoided), sum(avoided), int(self.session_seconds // t)
+
+
+def _fmt_seconds(value):
+    if value is None:
+        return '-'
+    return f"{value / 60:.1f}m" if value >= 120 else f"{value:.1f}s"
+
+
+def print_distribution(label, values, fmt=_fmt_seconds):
+    values = sorted(values)
+    if not values:
+        print(f"{label}: -")
+        return
+    parts = [f"p{p}={fmt(percentile(values, p))}" for p in PERCENTILES]
+    print(f"{label} (n={len(values)}): min={fmt(values[0])} " + ' '.join(parts) + f" max={fmt(values[-1])}")
+
+
+def print_report(stats):
+    total = sum(stats.by_reason.values())
+    print(f"Session epochs: {total}")
+    for reason in ('expired', 'refreshed', 'open'):
+        print(f"  {reason:<10} {stats.by_reason.get(reason, 0)}")
+    if not stats.lifetimes:
+        print("No expired sessions found.")
+        return
+
+    print_distribution("Lifetime until expiry", stats.lifetimes)
+    print_distribution("Idle before expiry", stats.idle)
+    print_distribution("Successful calls per expired session", stats.calls_before, str)
+
+    wasted = stats.wasted
+    print(f"Wasted calls: {sum(wasted)} over {len(wasted)} expiries ({sum(wasted) / len(wasted):.2f} per expiry)")
+    print("WastedPerExpiry (calls -> expiries):")
+    counts = {}
+    for w in wasted:
+        counts[w] = counts.get(w, 0) + 1
+    for n, count in sorted(counts.items()):
+        print(f"  {n}: {count}")
+
+    intervals = sorted({m * 60 for m in REFRESH_MINUTES}
+                       | {int(percentile(sorted(stats.lifetimes), p)) for p in (5, 10)} - {0})
+    print("RefreshEvery (interval, expiries avoided, wasted calls saved, extra re-auths):")
+    for t, avoided, saved, extra in stats.refresh_rows(intervals):
+        print(f"  {_fmt_seconds(t):>7}  {avoided:>6} {avoided / len(wasted):6.1%}  {saved:>7}  {extra:>7}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Rebuild Luca session epochs and report lifetimes and calls wasted per expiry.")
+    ap.add_argument('--log', dest='logs', action='append', type=Path,
+                    help=f"log file, repeat in chronological order (default: {LOG_PATH} and its rotated segments)")
+    ap.add_argument('--csv', type=Path, help="also write one row per epoch to this CSV")
+    args = ap.parse_args()
+
+    log_paths = args.logs or log_segments(LOG_PATH) or [LOG_PATH]
+    for path in log_paths:
+        if not path.exists():
+            print(f"Log file not found: {path}")
+            return 1
+
+    stats = EpochStats()
+    f = writer = None
+    try:
+        if args.csv:
+            f = args.csv.open('w', newline='', encoding='utf-8')
+            writer = csv.writer(f)
+            writer.writerow(['Start', 'End', 'EndReason', 'Seconds', 'IdleSeconds', 'Calls', 'Wasted', 'StartTags'])
+        for epoch in iter_epochs(log_paths):
+            stats.add(epoch)
+            if writer:
+                life = seconds_between(epoch['start'], epoch['end'])
+                idle = seconds_between(epoch['last_ok'], epoch['end']) if epoch['end_reason'] == 'expired' else None
+                writer.writerow([
+                    epoch['start'].isoformat() if epoch['start'] else '',
+                    epoch['end'].isoformat() if epoch['end'] else '',
+                    epoch['end_reason'],
+                    '' if life is None else f"{life:.3f}",
+                    '' if idle is None else f"{idle:.3f}",
+                    epoch['calls'],
+                    epoch['wasted'],
+                    '>'.join(epoch['start_tags']),
+                ])
+    finally:
+        if f is not None:
+            f.close()
+
+    if not stats.by_reason:
+        print("No login or CHANGE_BRANCH entries found in log.")
+        return 0
+    print_report(stats)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""Per-endpoint / per-tag latency and payload-size percentiles for Luca calls.
+
+Sources:
+  * luca-raw.log: request and response body sizes (UTF-8 bytes) of every call,
+    grouped by endpoint (URL path) and by tag.
+  * SaveHttpTrafficAsync dumps next to the log: the stock card send writes
+    SEND_STOCK_CARD_REQUEST:<kart> right before SendAsync and
+    SEND_STOCK_CARD_RESPONSE:<kart> after the response was read and logged, so
+    each REQUEST/RESPONSE pair for the same key gives one latency sample
+    (timestamps from the dump's first line, 100 ns resolution).  Other dumps
+    are written only after the response and carry no latency.
+
+Each distribution is an HDR-style histogram (see hdr_histogram.py); p50/p95/p99
+are exported as CSV and as a Prometheus textfile (node_exporter textfile
+collector format).  Tags are reduced to their base name (SEND_STOCK_CARD_HTML,
+not SEND_STOCK_CARD_HTML:<kart>) to keep the label set small.
+
+Usage:
+    python scripts/luca_traffic_stats.py [--log luca-raw.log] [--dumps src/Katana.API/logs]
+"""
+import argparse
+import csv
+import os
+import sys
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from hdr_histogram import Histogram
+from luca_log import LOG_PATH, iter_chunks, iter_dump_files, log_segments, parse_dump, parse_ts, scan_chunk
+
+OUT_CSV = Path("src/Katana.API/logs/luca_traffic_stats.csv")
+OUT_PROM = Path("src/Katana.API/logs/luca_traffic.prom")
+PERCENTILES = (50, 95, 99)
+# Metric name, unit divisor for the Prometheus export, Prometheus name, help text
+METRICS = (
+    ('latency_us', 1e6, 'luca_request_latency_seconds', "Luca call latency from REQUEST/RESPONSE traffic dumps"),
+    ('request_bytes', 1, 'luca_request_body_bytes', "Luca request body size from luca-raw.log"),
+    ('response_bytes', 1, 'luca_response_body_bytes', "Luca response body size from luca-raw.log"),
+)
+REQUEST_SUFFIX = '_REQUEST'
+RESPONSE_SUFFIX = '_RESPONSE'
+
+
+def endpoint_of(url):
+    if not url:
+        return '(none)'
+    path = urlsplit(url).path if '://' in url else url.split('?', 1)[0]
+    return path or '/'
+
+
+def base_tag(tag):
+    return tag.partition(':')[0] or '(none)'
+
+
+def utf8_len(text):
+    return len(text) if text.isascii() else len(text.encode('utf-8'))
+
+
+class TrafficStats:
+    def __init__(self):
+        # (metric, group, key) -> Histogram; group is 'endpoint' or 'tag'
+        self.hists = {}
+
+    def record(self, metric, endpoint, tag, value):
+        for group, key in (('endpoint', endpoint), ('tag', tag)):
+            h = self.hists.get((metric, group, key))
+            if h is None:
+                h = self.hists[(metric, group, key)] = Histogram()
+            h.record(value)
+
+    def rows(self):
+        for (metric, group, key), h in sorted(self.hists.items()):
+            p50, p95, p99 = h.percentiles(*PERCENTILES)
+            yield {
+                'Metric': metric, 'Group': group, 'Key': key, 'Count': h.total,
+                'Min': h.min, 'P50': p50, 'P95': p95, 'P99': p99, 'Max': h.max,
+                'Mean': round(h.mean(), 1),
+            }
+
+
+def scan_log(stats, log_paths):
+    for path in log_paths:
+        for chunk in iter_chunks(path):
+            tok = scan_chunk(chunk)
+            if tok.req_start == -1:
+                continue
+            endpoint, tag = endpoint_of(tok.url), base_tag(tok.tag)
+            stats.record('request_bytes', endpoint, tag, utf8_len(chunk[tok.req_start:tok.req_end]))
+            if tok.resp_start != -1:
+                stats.record('response_bytes', endpoint, tag, utf8_len(chunk[tok.resp_start:tok.resp_end]))
+
+
+def scan_dumps(stats, directory):
+    # Pair <base>_REQUEST:<key> with the next <base>_RESPONSE:<key> in time order
+    events = []
+    for entry in iter_dump_files(directory):
+        name = entry.name
+        if REQUEST_SUFFIX not in name and RESPONSE_SUFFIX not in name:
+            continue
+        try:
+            with open(entry.path, encoding='utf-8', errors='replace') as f:
+                dump = parse_dump(f.read())
+        except OSError:
+            continue
+        base, _, key = dump['tag'].partition(':')
+        if base.endswith(REQUEST_SUFFIX):
+            kind, base = 'request', base[:-len(REQUEST_SUFFIX)]
+        elif base.endswith(RESPONSE_SUFFIX):
+            kind, base = 'response', base[:-len(RESPONSE_SUFFIX)]
+        else:
+            continue
+        ts = parse_ts(dump['ts'])
+        if ts is not None:
+            events.append((ts, kind == 'response', base, key, dump['uri']))
+
+    events.sort()
+    pending = {}
+    pairs = 0
+    for ts, is_response, base, key, uri in events:
+        if not is_response:
+            # A newer request for the same key means the previous one never got a response dump
+            pending[(base, key)] = ts
+            continue
+        sent = pending.pop((base, key), None)
+        if sent is None:
+            continue
+        stats.record('latency_us', endpoint_of(uri), base, (ts - sent).total_seconds() * 1e6)
+        pairs += 1
+    return pairs
+
+
+def write_csv(stats, path):
+    fields = ['Metric', 'Group', 'Key', 'Count', 'Min', 'P50', 'P95', 'P99', 'Max', 'Mean']
+    with path.open('w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(stats.rows())
+
+
+def _label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def write_prom(stats, path):
+    lines = []
+    for metric, scale, prom_name, help_text in METRICS:
+        series = [(k, h) for k, h in sorted(stats.hists.items()) if k[0] == metric]
+        if not series:
+            continue
+        lines.append(f"# HELP {prom_name} {help_text}")
+        lines.append(f"# TYPE {prom_name} summary")
+        for (_, group, key), h in series:
+            labels = f'{group}="{_label(key)}"'
+            for p, v in zip(PERCENTILES, h.percentiles(*PERCENTILES)):
+                lines.append(f'{prom_name}{{{labels},quantile="{p / 100:g}"}} {v / scale:g}')
+            lines.append(f'{prom_name}_sum{{{labels}}} {h.sum / scale:g}')
+            lines.append(f'{prom_name}_count{{{labels}}} {h.total}')
+    # Write next to the target and rename so the textfile collector never sees a partial file
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    os.replace(tmp, path)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Latency and payload-size percentiles per Luca endpoint and tag.")
+    ap.add_argument('--log', dest='logs', action='append', type=Path,
+                    help=f"log file, repeat in chronological order (default: {LOG_PATH} and its rotated segments)")
+    ap.add_argument('--dumps', type=Path, default=LOG_PATH.parent,
+                    help="directory with SaveHttpTrafficAsync *-http-*.txt dumps (default: %(default)s)")
+    ap.add_argument('--csv', type=Path, default=OUT_CSV, help="CSV output (default: %(default)s)")
+    ap.add_argument('--prom', type=Path, default=OUT_PROM, help="Prometheus textfile output (default: %(default)s)")
+    args = ap.parse_args()
+
+    stats = TrafficStats()
+    log_paths = args.logs or log_segments(LOG_PATH) or [LOG_PATH]
+    for path in log_paths:
+        if not path.exists():
+            print(f"Log file not found: {path}")
+            return 1
+    scan_log(stats, log_paths)
+    pairs = scan_dumps(stats, args.dumps) if args.dumps.is_dir() else 0
+
+    write_csv(stats, args.csv)
+    write_prom(stats, args.prom)
+    print(f"Latency samples (REQUEST/RESPONSE dump pairs): {pairs}")
+    for row in stats.rows():
+        if row['Group'] != 'endpoint':
+            continue
+        print(f"  {row['Metric']:<15} {row['Key']:<45} n={row['Count']:<7} "
+              f"p50={row['P50']} p95={row['P95']} p99={row['P99']} max={row['Max']}")
+    print(f"Wrote {args.csv} and {args.prom}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
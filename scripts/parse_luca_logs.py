@@ -1,199 +1,446 @@
+import argparse
+import hashlib
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import re
 import json
 import csv
+import sys
 from pathlib import Path
 
+from luca_log import (
+    LOG_PATH, BlobStore, blob_ref, decode_chunk, file_state, is_compacted, iter_chunk_spans, iter_compacted_chunks,
+    iter_json_items, log_segments, open_log, resume_segments, scan_chunk, span_text, split_ranges,
+)
+
 
-LOG_PATH = Path("src/Katana.API/logs/luca-raw.log")
 OUT_CSV = Path("src/Katana.API/logs/luca_parsed_report.csv")
 OUT_SUMMARY = Path("src/Katana.API/logs/luca_parsed_summary.txt")
+CHECKPOINT = Path("src/Katana.API/logs/luca_parsed_checkpoint.json")
 
 
-def split_chunks(text):
-    # Split on the ---- separator used in the log
-    parts = [p.strip() for p in re.split(r"\n-+\n", text) if p.strip()]
-    return parts
-
-
-def extract_request_and_response(chunk):
-    # Find request JSON after the first occurrence of 'Request:'
-    req_match = re.search(r"Request:\s*(\[|\{)", chunk)
-    if not req_match:
-        return None
-
-    start = req_match.start(1)
-    # Find ResponseStatus marker to determine end of request JSON
-    resp_status_idx = chunk.find("ResponseStatus:")
-    if resp_status_idx == -1:
-        # fallback: try to find 'Response:'
-        resp_status_idx = chunk.find("Response:")
-    request_json_text = chunk[start:resp_status_idx].strip()
-
-    # Find response body after 'Response:' marker
-    resp_idx = chunk.find("Response:")
-    response_text = ""
-    if resp_idx != -1:
-        response_text = chunk[resp_idx + len("Response:"):].strip()
-
-    # Trim any trailing '----' markers etc
-    request_json_text = request_json_text.rstrip('-\n ')
-    response_text = response_text.rstrip('-\n ')
-
-    return request_json_text, response_text
+def request_kind(tok):
+    # Stock card and stock movement sends, judged from the chunk header only
+    if 'SEND_STOCK_CARD' in tok.tag:
+        return 'STOCK_CARD'
+    if ('SEND_STOCK_MOVEMENT' in tok.tag or 'EkleStkWsDshBaslik' in tok.url
+            or 'OtherStockMovement' in tok.tag or 'OtherStockMovement' in tok.url):
+        return 'STOCK_MOVEMENT'
+    return None
 
 
 def summarize_response(resp_text):
     if not resp_text:
         return ""
     trimmed = resp_text.strip()
-    # If it's JSON, try to parse and summarize
+    # Sniff the first byte: only bodies that can be a JSON object/array are
+    # worth a json.loads attempt (the HTML login page never is)
+    if trimmed[:1] in ('{', '['):
+        try:
+            j = json.loads(trimmed)
+        except ValueError:
+            pass
+        else:
+            # For objects with 'code' or 'error' and 'message'
+            if isinstance(j, dict):
+                if 'code' in j and 'message' in j:
+                    return f"code={j.get('code')} message={j.get('message')}"
+                if 'error' in j and 'message' in j:
+                    return f"error={j.get('error')} message={j.get('message')}"
+            # Otherwise return compact json
+            return json.dumps(j)[:200]
+    # Not JSON — return first meaningful line (strip HTML tags)
+    one = trimmed.partition('\n')[0].rstrip('\r')
+    # Remove HTML tags for short summary
+    no_tags = re.sub(r'<[^>]+>', '', one)
+    return no_tags[:200]
+
+
+_TITLE_RE = re.compile(r'<title[^>]*>(.*?)</title>', re.IGNORECASE | re.DOTALL)
+# Tokens carrying ids, counts or SKUs (anything with a digit) that does not follow "key="
+_VARIABLE_TOKEN_RE = re.compile(r'(?<![=\w])[\w.\-/:]*\d[\w.\-/:]*')
+
+
+def response_template(resp_text, summary):
+    # Normalised form used to cluster responses: ids and numbers become '#',
+    # HTML pages are grouped by their <title>
+    if not resp_text:
+        return '(empty)'
+    text = summary
+    if resp_text.lstrip()[:1] == '<':
+        m = _TITLE_RE.search(resp_text, 0, 4096)
+        text = 'HTML: ' + (m.group(1) if m else summary)
+    text = ' '.join(_VARIABLE_TOKEN_RE.sub('#', text).split())
+    return text or '(empty)'
+
+
+# Most bodies in the log repeat verbatim (the login page after every session
+# expiry, the same code=0 success), so describe_response is memoised on a
+# BLAKE2b digest of the body in a bounded LRU that keeps only the results,
+# never the bodies.  Python's hash() would not do: a collision would put
+# another body's summary in the CSV.
+RESPONSE_CACHE_SIZE = 4096
+_response_cache = OrderedDict()
+
+
+def describe_response(resp_text):
+    # Return (summary, template) for a response body
+    key = hashlib.blake2b(resp_text.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+    return _cached_response(key, lambda: resp_text)
+
+
+def _cached_response(key, load):
+    hit = _response_cache.get(key)
+    if hit is not None:
+        _response_cache.move_to_end(key)
+        return hit
+    resp_text = load()
+    summary = summarize_response(resp_text)
+    hit = (summary, response_template(resp_text, summary))
+    _response_cache[key] = hit
+    if len(_response_cache) > RESPONSE_CACHE_SIZE:
+        _response_cache.popitem(last=False)
+    return hit
+
+
+CSV_FIELDS = ['KartKodu', 'KategoriAgacKod', 'IsNumericOnly', 'IsEmptyKategori', 'BelgeSeri', 'RequestType', 'ResponseSummary']
+
+
+def new_writer(f):
+    # Rows also carry ResponseTemplate for the summary; it is not a CSV column
+    return csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction='ignore')
+
+
+def request_fields(text, start, end):
+    # (KartKodu, KategoriAgacKod, BelgeSeri) for each item of the request at text[start:end]
+    fields = []
+    for it in iter_json_items(text, start, end):
+        # Identify possible SKU / product identifier fields
+        kart = ''
+        if isinstance(it, dict):
+            for k in ('kartKodu', 'kartKod', 'productCode', 'productcode'):
+                if k in it and it.get(k):
+                    kart = it.get(k)
+                    break
+
+        # Category field may be present for stock cards; movements may not include it
+        kategori = ''
+        if isinstance(it, dict):
+            for ck in ('kategoriAgacKod', 'kategoriagacKod', 'kategoriagackod'):
+                if ck in it and it.get(ck) is not None:
+                    kategori = it.get(ck) or ''
+                    break
+
+        # BelgeSeri if present
+        belge = ''
+        if isinstance(it, dict) and 'belgeSeri' in it and it.get('belgeSeri') is not None:
+            belge = it.get('belgeSeri') or ''
+        fields.append((kart, kategori, belge))
+    return fields
+
+
+# In a compacted segment every retry of a card points at the same request blob,
+# so the decoded fields are memoised per digest like describe_response does
+REQUEST_CACHE_SIZE = 4096
+_request_cache = OrderedDict()
+
+
+def blob_request(store, digest):
+    # Return (first character, fields) of a request body kept in the blob store
+    hit = _request_cache.get(digest)
+    if hit is not None:
+        _request_cache.move_to_end(digest)
+        return hit
+    text = store.get(digest)
+    first = text[:1]
+    hit = (first, request_fields(text, 0, len(text)) if first in ('[', '{') else [])
+    _request_cache[digest] = hit
+    if len(_request_cache) > REQUEST_CACHE_SIZE:
+        _request_cache.popitem(last=False)
+    return hit
+
+
+def describe_blob_response(store, digest):
+    # Same as describe_response, keyed on the digest so the body is only fetched on a miss
+    return _cached_response(('blob', digest), lambda: store.get(digest))
+
+
+def chunk_rows(c, store=None):
+    # `store` is the BlobStore of a compacted segment; its @blob: bodies are
+    # looked up by digest and never re-parsed
+    tok = scan_chunk(c)
+    kind = request_kind(tok)
+    if kind is None:
+        return []
+    req_blob = blob_ref(c, tok.req_start, tok.req_end) if store else None
+    if req_blob:
+        first, fields = blob_request(store, req_blob)
+    else:
+        first = c[tok.req_start:tok.req_start + 1]
+    # Only JSON requests (object or batch array) are reported
+    if first not in ('[', '{'):
+        return []
+    # request may be a JSON array (batch) or object; batch items are decoded one
+    # at a time and only the reported fields are kept, and the intact items of a
+    # truncated or corrupt batch are still reported
+    request_type = kind + (':BATCH' if first == '[' else ':SINGLE')
+    if not req_blob:
+        fields = request_fields(c, tok.req_start, tok.req_end)
+    if not fields:
+        return []
+    resp_blob = blob_ref(c, tok.resp_start, tok.resp_end) if store else None
+    if resp_blob:
+        resp_summary, resp_template = describe_blob_response(store, resp_blob)
+    else:
+        resp_summary, resp_template = describe_response(span_text(c, tok.resp_start, tok.resp_end))
+
+    rows = []
+    for kart, kategori, belge in fields:
+        is_numeric = str(kategori).strip().isdigit()
+        is_empty = (kategori is None) or (str(kategori).strip() == '')
+
+        rows.append({
+            'KartKodu': kart,
+            'KategoriAgacKod': kategori,
+            'IsNumericOnly': 'Y' if is_numeric else 'N',
+            'IsEmptyKategori': 'Y' if is_empty else 'N',
+            'BelgeSeri': belge,
+            'RequestType': request_type,
+            'ResponseSummary': resp_summary,
+            'ResponseTemplate': resp_template,
+        })
+    return rows
+
+
+def new_summary():
+    # resp_counts is keyed by response template; resp_examples keeps the first
+    # concrete summary seen for each template
+    return {'total': 0, 'by_type': {}, 'numeric_only': 0, 'empty_kategori': 0, 'resp_counts': {}, 'resp_examples': {}}
+
+
+def add_to_summary(summary, r):
+    summary['total'] += 1
+    typ = r.get('RequestType') or 'UNKNOWN'
+    summary['by_type'][typ] = summary['by_type'].get(typ, 0) + 1
+    if r.get('IsNumericOnly') == 'Y':
+        summary['numeric_only'] += 1
+    if r.get('IsEmptyKategori') == 'Y':
+        summary['empty_kategori'] += 1
+    template = r.get('ResponseTemplate') or '(empty)'
+    summary['resp_counts'][template] = summary['resp_counts'].get(template, 0) + 1
+    summary['resp_examples'].setdefault(template, r.get('ResponseSummary') or '')
+
+
+def merge_summary(summary, part):
+    # Merge a partial summary into `summary`. Parts must be merged in log order
+    # so dict insertion order (which breaks ties in the sorted output) matches
+    # a serial run.
+    summary['total'] += part['total']
+    summary['numeric_only'] += part['numeric_only']
+    summary['empty_kategori'] += part['empty_kategori']
+    for key in ('by_type', 'resp_counts'):
+        for k, v in part[key].items():
+            summary[key][k] = summary[key].get(k, 0) + v
+    for k, v in part['resp_examples'].items():
+        summary['resp_examples'].setdefault(k, v)
+
+
+def write_summary(summary):
+    summary_lines = []
+    summary_lines.append(f"TotalRows={summary['total']}")
+    summary_lines.append("ByRequestType:")
+    for k, v in sorted(summary['by_type'].items(), key=lambda x: x[0]):
+        summary_lines.append(f"  {k}: {v}")
+    summary_lines.append(f"NumericOnlyKategoriCount={summary['numeric_only']}")
+    summary_lines.append(f"EmptyKategoriCount={summary['empty_kategori']}")
+    summary_lines.append("ResponseTemplates:")
+    for k, v in sorted(summary['resp_counts'].items(), key=lambda x: -x[1]):
+        summary_lines.append(f"  {v}x {k}")
+        example = summary['resp_examples'].get(k)
+        if example and example != k:
+            # truncate long examples for readability
+            if len(example) > 200:
+                example = example[:197] + '...'
+            summary_lines.append(f"      e.g. {example}")
+
     try:
-        j = json.loads(trimmed)
-        # For objects with 'code' or 'error' and 'message'
-        if isinstance(j, dict):
-            if 'code' in j and 'message' in j:
-                return f"code={j.get('code')} message={j.get('message')}"
-            if 'error' in j and 'message' in j:
-                return f"error={j.get('error')} message={j.get('message')}"
-        # Otherwise return compact json
-        return json.dumps(j)[:200]
+        OUT_SUMMARY.parent.mkdir(parents=True, exist_ok=True)
+        with OUT_SUMMARY.open('w', encoding='utf-8') as sf:
+            sf.write('\n'.join(summary_lines))
     except Exception:
-        # Not JSON — return first meaningful line (strip HTML tags)
-        one = trimmed.splitlines()[0]
-        # Remove HTML tags for short summary
-        no_tags = re.sub(r'<[^>]+>', '', one)
-        return no_tags[:200]
+        pass
+
+
+def load_checkpoint():
+    try:
+        with CHECKPOINT.open('r', encoding='utf-8') as cf:
+            return json.load(cf)
+    except (OSError, ValueError):
+        return None
+
+
+def save_checkpoint(state):
+    # Write to a temp file and rename so a crash never leaves a half-written checkpoint
+    tmp = CHECKPOINT.with_name(CHECKPOINT.name + '.tmp')
+    with tmp.open('w', encoding='utf-8') as cf:
+        json.dump(state, cf)
+    os.replace(tmp, CHECKPOINT)
 
 
-def parse():
+def parse_incremental():
     if not LOG_PATH.exists():
         print(f"Log file not found: {LOG_PATH}")
         return 1
 
-    text = LOG_PATH.read_text(encoding='utf-8', errors='replace')
-    chunks = split_chunks(text)
+    state = load_checkpoint()
+    segments = resume_segments(LOG_PATH, state)
+    if state and segments[0] != (LOG_PATH, state['offset']):
+        if len(segments) == 1 and state['offset']:
+            # Neither the live log nor a rotated segment holds the bytes the checkpoint points into
+            print(f"WARNING: the log segment read last time was not found (checkpoint at byte {state['offset']}); "
+                  f"rows written to it after the last run are missing from {OUT_CSV}", file=sys.stderr)
+        print(f"Log rotated or truncated since last run; resuming from {segments[0][0]}")
+
+    summary = state['summary'] if state else new_summary()
+    # Checkpoints written before template clustering have no examples yet
+    summary.setdefault('resp_examples', {})
+    before = summary['total']
+    offset = segments[-1][1]
 
-    rows = []
-    for c in chunks:
-        # Process stock card and stock movement sends
-        kind = None
-        if 'SEND_STOCK_CARD' in c or 'SEND_STOCK_CARDS' in c:
-            kind = 'STOCK_CARD'
-        elif 'SEND_STOCK_MOVEMENT' in c or 'EkleStkWsDshBaslik' in c or 'OtherStockMovement' in c:
-            kind = 'STOCK_MOVEMENT'
-        else:
-            continue
-
-        extracted = extract_request_and_response(c)
-        if not extracted:
-            continue
-        req_text, resp_text = extracted
-
-        # request may be a JSON array (batch) or object
-        try:
-            req_json = json.loads(req_text)
-        except Exception:
-            # try to recover by trimming trailing commas or control chars
-            try:
-                # naive attempt: find first '{' or '[' and last matching brace
-                first = min((req_text.find('[') if '[' in req_text else 1e9),
-                            (req_text.find('{') if '{' in req_text else 1e9))
-                req_json = json.loads(req_text[first:])
-            except Exception:
-                # give up on this chunk
-                continue
-
-        items = req_json if isinstance(req_json, list) else [req_json]
-        resp_summary = summarize_response(resp_text)
-
-        for it in items:
-            # Identify possible SKU / product identifier fields
-            kart = ''
-            if isinstance(it, dict):
-                for k in ('kartKodu', 'kartKod', 'productCode', 'productcode'):
-                    if k in it and it.get(k):
-                        kart = it.get(k)
+    OUT_CSV.parent.mkdir(parents=True, exist_ok=True)
+    # First run starts a fresh report; later runs only append the new rows
+    mode = 'a' if state and OUT_CSV.exists() else 'w'
+    with OUT_CSV.open(mode, newline='', encoding='utf-8') as f:
+        writer = new_writer(f)
+        if mode == 'w':
+            writer.writeheader()
+        for seg_path, start in segments:
+            current = seg_path == LOG_PATH
+            store = BlobStore(seg_path) if is_compacted(seg_path) else None
+            with open_log(seg_path) as fh:
+                for chunk_off, length, raw, complete in iter_chunk_spans(fh, start):
+                    # The live log may end in a chunk that is still being written; leave it for next run
+                    if current and not complete:
                         break
+                    for r in chunk_rows(decode_chunk(raw), store):
+                        writer.writerow(r)
+                        add_to_summary(summary, r)
+                    if current:
+                        offset = chunk_off + length
+            if store:
+                store.close()
+
+    write_summary(summary)
+    checkpoint = file_state(LOG_PATH, offset)
+    checkpoint['summary'] = summary
+    save_checkpoint(checkpoint)
+
+    print(f"Appended {summary['total'] - before} rows to {OUT_CSV} ({summary['total']} total)")
+    print(f"Wrote summary to {OUT_SUMMARY}")
+    return 0
 
-            # Category field may be present for stock cards; movements may not include it
-            kategori = ''
-            if isinstance(it, dict):
-                for ck in ('kategoriAgacKod', 'kategoriagacKod', 'kategoriagackod'):
-                    if ck in it and it.get(ck) is not None:
-                        kategori = it.get(ck) or ''
-                        break
 
-            # BelgeSeri if present
-            belge = ''
-            if isinstance(it, dict) and 'belgeSeri' in it and it.get('belgeSeri') is not None:
-                belge = it.get('belgeSeri') or ''
-
-            is_numeric = str(kategori).strip().isdigit()
-            is_empty = (kategori is None) or (str(kategori).strip() == '')
-
-            rows.append({
-                'KartKodu': kart,
-                'KategoriAgacKod': kategori,
-                'IsNumericOnly': 'Y' if is_numeric else 'N',
-                'IsEmptyKategori': 'Y' if is_empty else 'N',
-                'BelgeSeri': belge,
-                'RequestType': kind + (':BATCH' if isinstance(req_json, list) else ':SINGLE'),
-                'ResponseSummary': resp_summary,
-            })
-
-    if not rows:
+def iter_range_rows(path, start=0, end=None):
+    if is_compacted(path):
+        # Compacted segments are never split into ranges (see split_ranges)
+        store = BlobStore(path)
+        try:
+            for c in iter_compacted_chunks(path, store):
+                yield from chunk_rows(c, store)
+        finally:
+            store.close()
+        return
+    with open_log(path) as fh:
+        for _, _, raw, _ in iter_chunk_spans(fh, start, end):
+            yield from chunk_rows(decode_chunk(raw))
+
+
+def parse_range(task):
+    # Process pool worker: parse one chunk-aligned byte range of a log file
+    path, start, end = task
+    rows = list(iter_range_rows(path, start, end))
+    summary = new_summary()
+    for r in rows:
+        add_to_summary(summary, r)
+    return rows, summary
+
+
+def iter_parsed_parts(log_paths, workers):
+    # Yield (rows, summary) parts in log order; summary is None when the caller
+    # should count the rows itself
+    if workers <= 1:
+        # Serial: stream one row at a time so memory stays bounded by the largest chunk
+        for path in log_paths:
+            for r in iter_range_rows(path):
+                yield [r], None
+        return
+
+    # A few ranges per worker keeps the pool busy when chunk sizes are uneven
+    tasks = []
+    total_size = sum(Path(p).stat().st_size for p in log_paths) or 1
+    for path in log_paths:
+        parts = max(1, round(workers * 4 * Path(path).stat().st_size / total_size))
+        tasks.extend((str(path), start, end) for start, end in split_ranges(path, parts))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        yield from pool.map(parse_range, tasks)
+
+
+def parse(log_paths=(LOG_PATH,), workers=1):
+    for path in log_paths:
+        if not Path(path).exists():
+            print(f"Log file not found: {path}")
+            return 1
+
+    # Rows are written as they are produced; parts always arrive in log order,
+    # so a parallel run writes exactly what a serial run would.
+    summary = new_summary()
+    f = None
+    writer = None
+    try:
+        for rows, part in iter_parsed_parts(log_paths, workers):
+            for r in rows:
+                if writer is None:
+                    OUT_CSV.parent.mkdir(parents=True, exist_ok=True)
+                    f = OUT_CSV.open('w', newline='', encoding='utf-8')
+                    writer = new_writer(f)
+                    writer.writeheader()
+                writer.writerow(r)
+                if part is None:
+                    add_to_summary(summary, r)
+            if part is not None:
+                merge_summary(summary, part)
+    finally:
+        if f is not None:
+            f.close()
+
+    if not summary['total']:
         print("No SEND_STOCK_CARD entries found in log.")
         return 0
 
-    OUT_CSV.parent.mkdir(parents=True, exist_ok=True)
-    with OUT_CSV.open('w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=['KartKodu', 'KategoriAgacKod', 'IsNumericOnly', 'IsEmptyKategori', 'BelgeSeri', 'RequestType', 'ResponseSummary'])
-        writer.writeheader()
-        for r in rows:
-            writer.writerow(r)
-
-    # Build a simple summary
-    total = len(rows)
-    by_type = {}
-    numeric_only = 0
-    empty_kategori = 0
-    resp_counts = {}
-    for r in rows:
-        typ = r.get('RequestType') or 'UNKNOWN'
-        by_type[typ] = by_type.get(typ, 0) + 1
-        if r.get('IsNumericOnly') == 'Y':
-            numeric_only += 1
-        if r.get('IsEmptyKategori') == 'Y':
-            empty_kategori += 1
-        resp = r.get('ResponseSummary') or ''
-        resp_counts[resp] = resp_counts.get(resp, 0) + 1
+    write_summary(summary)
 
-    summary_lines = []
-    summary_lines.append(f"TotalRows={total}")
-    summary_lines.append("ByRequestType:")
-    for k, v in sorted(by_type.items(), key=lambda x: x[0]):
-        summary_lines.append(f"  {k}: {v}")
-    summary_lines.append(f"NumericOnlyKategoriCount={numeric_only}")
-    summary_lines.append(f"EmptyKategoriCount={empty_kategori}")
-    summary_lines.append("ResponseSummaryCounts:")
-    for k, v in sorted(resp_counts.items(), key=lambda x: -x[1]):
-        display = k if k else '(empty)'
-        # truncate long response keys for readability
-        if len(display) > 200:
-            display = display[:197] + '...'
-        summary_lines.append(f"  {v}x {display}")
-
-    try:
-        OUT_SUMMARY.parent.mkdir(parents=True, exist_ok=True)
-        with OUT_SUMMARY.open('w', encoding='utf-8') as sf:
-            sf.write('\n'.join(summary_lines))
-    except Exception:
-        pass
-
-    print(f"Wrote report to {OUT_CSV} ({len(rows)} rows)")
+    print(f"Wrote report to {OUT_CSV} ({summary['total']} rows)")
     print(f"Wrote summary to {OUT_SUMMARY}")
     return 0
 
 
+def main():
+    ap = argparse.ArgumentParser(description="Parse luca-raw.log stock card / movement sends into a CSV report.")
+    ap.add_argument('--incremental', action='store_true',
+                    help=f"only parse bytes appended since the last run (checkpoint: {CHECKPOINT})")
+    ap.add_argument('--log', dest='logs', action='append', type=Path,
+                    help=f"log file to parse (plain, .gz or .zst), repeat in chronological order "
+                         f"(default: {LOG_PATH} and its rotated segments)")
+    ap.add_argument('--workers', type=int, default=1,
+                    help="parse chunk-aligned byte ranges in N processes (output is identical to a serial run)")
+    args = ap.parse_args()
+    if args.incremental:
+        if args.logs or args.workers > 1:
+            ap.error("--incremental always tails the live log and runs serially")
+        return parse_incremental()
+    return parse(args.logs or log_segments(LOG_PATH) or [LOG_PATH], args.workers)
+
+
 if __name__ == '__main__':
-    exit(parse())
+    exit(main())
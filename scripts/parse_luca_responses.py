@@ -0,0 +1,195 @@
+"""Summarise SEND_STOCK_CARD_RESPONSE dump files into luca_responses.csv / .json.
+
+Python replacement for scripts/parse-luca-responses.ps1 with the same output
+schema (File, Modified, Code, SkartId; CSV as written by Export-Csv, JSON as
+written by ConvertTo-Json | Out-File).  The dump directory is listed once with
+os.scandir, files are read in a thread pool, and a file only gets decoded and
+JSON-parsed when its bytes contain a ``{`` at all; most dumps are headers only
+and come back as NO_JSON from that sniff.  Results are cached by file name,
+size and mtime, so a re-run only reads files that are new or changed.
+
+Usage:
+    python scripts/parse_luca_responses.py [--logs-path DIR] [--out-csv luca_responses.csv] [--out-json luca_responses.json]
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from fnmatch import fnmatchcase
+from pathlib import Path
+
+LOGS_PATH = Path("src/Katana.API/bin/Debug/net8.0/logs")
+FILTER = "SEND_STOCK_CARD_RESPONSE*.txt"
+OUT_CSV = Path("luca_responses.csv")
+OUT_JSON = Path("luca_responses.json")
+FIELDS = ("File", "Modified", "Code", "SkartId")
+CACHE_VERSION = 1
+
+
+def sniff_response(data):
+    # (Code, SkartId) for one dump's bytes, matching the .ps1 extraction:
+    # everything from the first '{' to the last '}' is parsed as one JSON object
+    start = data.find(b"{")
+    if start == -1:
+        return "NO_JSON", None
+    end = data.rfind(b"}")
+    if end < start:
+        return "NO_JSON", None
+    try:
+        obj = json.loads(data[start:end + 1].decode("utf-8", errors="replace"))
+    except ValueError:
+        return "PARSE_FAILED", None
+    if not isinstance(obj, dict):
+        return None, None
+    skart = obj.get("stkSkart")
+    return obj.get("code"), skart.get("skartId") if isinstance(skart, dict) else None
+
+
+def read_entry(entry):
+    try:
+        with open(entry[0], "rb") as f:
+            return sniff_response(f.read())
+    except OSError as ex:
+        print(f"WARNING: Failed to read {os.path.basename(entry[0])}: {ex}", file=sys.stderr)
+        return None
+
+
+def list_dumps(directory, pattern):
+    # (path, name, mtime_ns, size) of every matching file, from one scandir pass
+    found = []
+    with os.scandir(directory) as it:
+        for e in it:
+            if fnmatchcase(e.name.upper(), pattern.upper()) and e.is_file():
+                st = e.stat()
+                found.append((e.path, e.name, st.st_mtime_ns, st.st_size))
+    return found
+
+
+def load_cache(path):
+    try:
+        cache = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return cache.get("files", {}) if cache.get("version") == CACHE_VERSION else {}
+
+
+def save_cache(path, files):
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps({"version": CACHE_VERSION, "files": files}), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def scan(directory, pattern, cache, workers):
+    """Return (results, cache) where results are (name, mtime_ns, code, skart_id), newest first."""
+    dumps = list_dumps(directory, pattern)
+    results, todo = [], []
+    new_cache = {}
+    for path, name, mtime_ns, size in dumps:
+        hit = cache.get(name)
+        if hit and hit[0] == mtime_ns and hit[1] == size:
+            new_cache[name] = hit
+            results.append((name, mtime_ns, hit[2], hit[3]))
+        else:
+            todo.append((path, name, mtime_ns, size))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for (path, name, mtime_ns, size), res in zip(todo, pool.map(read_entry, todo, chunksize=64)):
+            if res is None:
+                continue
+            code, skart_id = res
+            new_cache[name] = [mtime_ns, size, code, skart_id]
+            results.append((name, mtime_ns, code, skart_id))
+
+    results.sort(key=lambda r: (-r[1], r[0]))
+    return results, new_cache
+
+
+def _csv_value(value):
+    # Export-Csv quotes every value and leaves $null empty
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        value = "True" if value else "False"
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def write_csv(results, path):
+    with path.open("w", encoding="utf-8", newline="") as f:
+        f.write(",".join(_csv_value(h) for h in FIELDS) + "\n")
+        for name, mtime_ns, code, skart_id in results:
+            modified = datetime.fromtimestamp(mtime_ns / 1e9).strftime("%d.%m.%Y %H:%M:%S")
+            f.write(",".join(_csv_value(v) for v in (name, modified, code, skart_id)) + "\n")
+
+
+def _json_value(value):
+    # ConvertTo-Json escapes HTML-sensitive characters and keeps other text as-is
+    text = json.dumps(value, ensure_ascii=False)
+    if isinstance(value, str):
+        text = text.replace("<", "\\u003c").replace(">", "\\u003e").replace("&", "\\u0026").replace("'", "\\u0027")
+    return text
+
+
+def write_json(results, path):
+    # Same layout as Windows PowerShell's ConvertTo-Json | Out-File (UTF-16 LE, CRLF)
+    objects = []
+    for name, mtime_ns, code, skart_id in results:
+        date = '"\\/Date(%d)\\/"' % (mtime_ns // 1_000_000)
+        objects.append([("File", _json_value(name)), ("Modified", date),
+                        ("Code", _json_value(code)), ("SkartId", _json_value(skart_id))])
+
+    def render(obj, indent):
+        pad = " " * indent
+        body = ",\r\n".join(f'{pad}    "{k}":  {v}' for k, v in obj)
+        return f"{pad}{{\r\n{body}\r\n{pad}}}"
+
+    if len(objects) == 1:
+        text = render(objects[0], 0)
+    else:
+        text = "[\r\n" + ",\r\n".join(render(o, 4) for o in objects) + "\r\n]"
+    with path.open("w", encoding="utf-16", newline="") as f:
+        f.write(text + "\r\n")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Summarise SEND_STOCK_CARD_RESPONSE dumps into luca_responses.csv/json.")
+    ap.add_argument("--logs-path", type=Path, default=LOGS_PATH, help="dump directory (default: %(default)s)")
+    ap.add_argument("--filter", default=FILTER, help="file name pattern (default: %(default)s)")
+    ap.add_argument("--out-csv", type=Path, default=OUT_CSV)
+    ap.add_argument("--out-json", type=Path, default=OUT_JSON)
+    ap.add_argument("--cache", type=Path, help="mtime cache file (default: <out-csv>.cache.json)")
+    ap.add_argument("--no-cache", action="store_true", help="read every file and do not update the cache")
+    ap.add_argument("--workers", type=int, default=min(32, (os.cpu_count() or 1) + 4),
+                    help="reader threads (default: %(default)s)")
+    args = ap.parse_args()
+
+    if not args.logs_path.is_dir():
+        print(f"No response files found matching {args.filter} under {args.logs_path}")
+        return 0
+    cache_path = args.cache or args.out_csv.with_name(args.out_csv.name + ".cache.json")
+    cache = {} if args.no_cache else load_cache(cache_path)
+
+    results, new_cache = scan(args.logs_path, args.filter, cache, max(1, args.workers))
+    if not results:
+        print(f"No response files found matching {args.filter} under {args.logs_path}")
+        return 0
+
+    codes = {}
+    for _, _, code, _ in results:
+        codes[str(code)] = codes.get(str(code), 0) + 1
+    reused = sum(1 for name, _, _, _ in results if name in cache and cache[name] == new_cache[name])
+    print(f"Files: {len(results)} (read={len(results) - reused}, cached={reused})")
+    for code, count in sorted(codes.items(), key=lambda x: -x[1]):
+        print(f"  {code}: {count}")
+
+    write_csv(results, args.out_csv)
+    write_json(results, args.out_json)
+    if not args.no_cache:
+        save_cache(cache_path, new_cache)
+    print(f"Summary written to: {args.out_csv} and {args.out_json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
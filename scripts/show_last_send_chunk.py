@@ -1,19 +1,27 @@
 from pathlib import Path
+
+from luca_log import scan_chunk
+from luca_log_index import iter_segment_indexes, read_chunk
+
 p=Path('src/Katana.API/logs/luca-raw.log')
-text=p.read_text(encoding='utf-8',errors='replace')
 key='SEND_STOCK_CARD'
-idx=text.rfind(key)
-if idx==-1:
+# Seek straight to the most recent SEND_STOCK_CARD* chunk through the sidecar
+# indexes, falling back to older (possibly compressed) segments
+row=None
+for segment, conn in iter_segment_indexes(p):
+    # Exact, case-sensitive prefix: LIKE would treat '_' as a wildcard and ignore case
+    row=conn.execute("SELECT offset, length FROM chunks WHERE substr(tag, 1, length(?)) = ? ORDER BY id DESC LIMIT 1", (key, key)).fetchone()
+    if row is not None:
+        break
+if row is None:
     print('no match')
 else:
-    sub=text[idx:idx+20000]
+    sub=read_chunk(segment, *row)
     # try to locate Request: ... ResponseStatus:
-    rpos=sub.find('Request:')
-    rspos=sub.find('ResponseStatus:')
-    if rpos!=-1 and rspos!=-1:
-        req=sub[rpos+len('Request:'):rspos].strip()
+    tok=scan_chunk(sub)
+    if tok.req_start!=-1 and tok.status is not None:
         print('----REQUEST----')
-        print(req[:4000])
+        print(sub[tok.req_start:min(tok.req_end, tok.req_start+4000)])
     else:
         print('No Request/Response markers found in last chunk')
     # also print a small suffix
@@ -4,16 +4,22 @@ Katana Uygulaması Test Script
 API ve Database bağlantısını kontrol eder
 """
 
+import argparse
 import requests
 import subprocess
 import json
 import sys
+import time
 from datetime import datetime
-from typing import Tuple, Dict, Any
+from typing import Tuple, Dict, Any, List
+
+from check_runner import DEFAULT_CONCURRENCY, Check, run_checks
+from katana_client import KatanaClient
 
 class KatanaHealthCheck:
     def __init__(self):
         self.api_url = "http://localhost:8080"
+        self.client = KatanaClient(self.api_url, timeout=5)
         self.passed = 0
         self.failed = 0
         self.results = []
@@ -43,87 +49,76 @@ class KatanaHealthCheck:
             "message": message
         })
     
-    def test_api_health(self) -> bool:
+    def probe_api_health(self) -> Tuple[bool, str]:
         """API health endpoint'ini kontrol et"""
         try:
-            response = requests.get(f"{self.api_url}/api/health", timeout=5)
-            if response.status_code == 200:
-                self.print_test_result("API Health Endpoint", True, f"Status: {response.status_code}")
-                return True
-            else:
-                self.print_test_result("API Health Endpoint", False, f"Status: {response.status_code}")
-                return False
+            response = self.client.health()
+            return response.status_code == 200, f"Status: {response.status_code}"
         except Exception as e:
-            self.print_test_result("API Health Endpoint", False, str(e))
-            return False
+            return False, str(e)
     
-    def test_api_connectivity(self) -> bool:
+    def probe_api_connectivity(self) -> Tuple[bool, str]:
         """API'ye temel bağlantı test et"""
         try:
-            response = requests.get(f"{self.api_url}/api", timeout=5)
-            self.print_test_result("API Bağlantısı", True)
-            return True
+            self.client.get("/api")
+            return True, ""
         except requests.exceptions.ConnectionError:
-            self.print_test_result("API Bağlantısı", False, "API erişilemez")
-            return False
+            return False, "API erişilemez"
         except Exception as e:
-            self.print_test_result("API Bağlantısı", False, str(e))
-            return False
+            return False, str(e)
     
-    def test_suppliers_endpoint(self) -> bool:
-        """Suppliers endpoint'ini test et"""
+    def probe_endpoint(self, path: str) -> Tuple[bool, str]:
+        """Korumalı bir endpoint'i test et; 401 auth hatası olabilir ama API çalışıyor"""
         try:
             headers = {"Authorization": "Bearer test"}
-            response = requests.get(f"{self.api_url}/api/suppliers", headers=headers, timeout=5)
-            if response.status_code in [200, 401]:  # 401 auth hatası olabilir ama API çalışıyor
-                self.print_test_result("Suppliers Endpoint", True, f"Status: {response.status_code}")
-                return True
-            else:
-                self.print_test_result("Suppliers Endpoint", False, f"Status: {response.status_code}")
-                return False
+            response = self.client.get(path, headers=headers)
+            return response.status_code in [200, 401], f"Status: {response.status_code}"
         except Exception as e:
-            self.print_test_result("Suppliers Endpoint", False, str(e))
-            return False
+            return False, str(e)
+    
+    def probe_container(self, name: str) -> Tuple[bool, str]:
+        """Docker container'ının çalıştığını kontrol et"""
+        result = subprocess.run(["docker", "ps", "--format", "{{.Names}}"], 
+                              capture_output=True, text=True, timeout=5)
+        containers = result.stdout.strip().split('\n')
+        return any(name in c for c in containers), ""
+    
+    def probe_port(self, port: int) -> Tuple[bool, str]:
+        """Port'un dinlendiğini kontrol et (macOS için lsof komutu)"""
+        result = subprocess.run(["lsof", "-i", f":{port}"], 
+                              capture_output=True, timeout=5)
+        return result.returncode == 0, ""
+    
+    def test_api_health(self) -> bool:
+        success, message = self.probe_api_health()
+        self.print_test_result("API Health Endpoint", success, message)
+        return success
+    
+    def test_api_connectivity(self) -> bool:
+        success, message = self.probe_api_connectivity()
+        self.print_test_result("API Bağlantısı", success, message)
+        return success
+    
+    def test_suppliers_endpoint(self) -> bool:
+        success, message = self.probe_endpoint("/api/suppliers")
+        self.print_test_result("Suppliers Endpoint", success, message)
+        return success
     
     def test_products_endpoint(self) -> bool:
-        """Products endpoint'ini test et"""
-        try:
-            headers = {"Authorization": "Bearer test"}
-            response = requests.get(f"{self.api_url}/api/products", headers=headers, timeout=5)
-            if response.status_code in [200, 401]:
-                self.print_test_result("Products Endpoint", True, f"Status: {response.status_code}")
-                return True
-            else:
-                self.print_test_result("Products Endpoint", False, f"Status: {response.status_code}")
-                return False
-        except Exception as e:
-            self.print_test_result("Products Endpoint", False, str(e))
-            return False
+        success, message = self.probe_endpoint("/api/products")
+        self.print_test_result("Products Endpoint", success, message)
+        return success
     
     def test_purchase_orders_endpoint(self) -> bool:
-        """Purchase Orders endpoint'ini test et"""
-        try:
-            headers = {"Authorization": "Bearer test"}
-            response = requests.get(f"{self.api_url}/api/purchase-orders", headers=headers, timeout=5)
-            if response.status_code in [200, 401]:
-                self.print_test_result("Purchase Orders Endpoint", True, f"Status: {response.status_code}")
-                return True
-            else:
-                self.print_test_result("Purchase Orders Endpoint", False, f"Status: {response.status_code}")
-                return False
-        except Exception as e:
-            self.print_test_result("Purchase Orders Endpoint", False, str(e))
-            return False
+        success, message = self.probe_endpoint("/api/purchase-orders")
+        self.print_test_result("Purchase Orders Endpoint", success, message)
+        return success
     
     def check_docker_containers(self) -> bool:
         """Docker container'ları kontrol et"""
         try:
-            result = subprocess.run(["docker", "ps", "--format", "{{.Names}}"], 
-                                  capture_output=True, text=True, timeout=5)
-            containers = result.stdout.strip().split('\n')
-            
-            api_running = any("katana-api" in c for c in containers)
-            db_running = any("katana-db" in c for c in containers)
+            api_running, _ = self.probe_container("katana-api")
+            db_running, _ = self.probe_container("katana-db")
             
             self.print_test_result("API Container", api_running)
             self.print_test_result("Database Container", db_running)
@@ -136,14 +131,8 @@ class KatanaHealthCheck:
     def check_ports(self) -> bool:
         """Port kontrolü yap"""
         try:
-            # macOS için lsof komutu
-            result_8080 = subprocess.run(["lsof", "-i", ":8080"], 
-                                        capture_output=True, timeout=5)
-            result_1433 = subprocess.run(["lsof", "-i", ":1433"], 
-                                        capture_output=True, timeout=5)
-            
-            port_8080_open = result_8080.returncode == 0
-            port_1433_open = result_1433.returncode == 0
+            port_8080_open, _ = self.probe_port(8080)
+            port_1433_open, _ = self.probe_port(1433)
             
             self.print_test_result("API Port (8080)", port_8080_open)
             self.print_test_result("Database Port (1433)", port_1433_open)
@@ -153,6 +142,32 @@ class KatanaHealthCheck:
             self.print_test_result("Port Check", False, str(e))
             return False
     
+    def checks(self) -> List[Check]:
+        """Kontroller ve bağımlılıkları; API'ye ulaşılamazsa endpoint'ler denenmez"""
+        return [
+            Check("API Bağlantısı", self.probe_api_connectivity, deadline=15),
+            Check("API Health Endpoint", self.probe_api_health, after=["API Bağlantısı"], deadline=10),
+            Check("Suppliers Endpoint", lambda: self.probe_endpoint("/api/suppliers"), after=["API Bağlantısı"], deadline=10),
+            Check("Products Endpoint", lambda: self.probe_endpoint("/api/products"), after=["API Bağlantısı"], deadline=10),
+            Check("Purchase Orders Endpoint", lambda: self.probe_endpoint("/api/purchase-orders"), after=["API Bağlantısı"], deadline=10),
+            Check("API Container", lambda: self.probe_container("katana-api"), deadline=10),
+            Check("Database Container", lambda: self.probe_container("katana-db"), deadline=10),
+            Check("API Port (8080)", lambda: self.probe_port(8080), deadline=10),
+            Check("Database Port (1433)", lambda: self.probe_port(1433), deadline=10),
+        ]
+    
+    def run_concurrent(self, concurrency: int = DEFAULT_CONCURRENCY):
+        """Bağımsız kontrolleri eşzamanlı çalıştır, sonuçları sırayla yazdır"""
+        print("\033[94m")  # Mavi renk
+        print(f"Katana Uygulaması Sağlık Kontrolü (eşzamanlı, en fazla {concurrency})")
+        print(f"Başlama Zamanı: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        print("\033[0m")  # Renk sıfırla
+        
+        start = time.perf_counter()
+        run_checks(self.checks(), concurrency,
+                   report=lambda r: self.print_test_result(r.name, r.success, r.message))
+        print(f"\nSüre: {time.perf_counter() - start:.1f}s")
+    
     def run_all_tests(self):
         """Tüm testleri çalıştır"""
         print("\033[94m")  # Mavi renk
@@ -216,8 +231,16 @@ class KatanaHealthCheck:
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Katana API, container ve port kontrolleri")
+    parser.add_argument("--sequential", action="store_true", help="kontrolleri tek tek çalıştır")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="aynı anda en fazla kaç kontrol")
+    args = parser.parse_args()
+    
     checker = KatanaHealthCheck()
-    checker.run_all_tests()
+    if args.sequential:
+        checker.run_all_tests()
+    else:
+        checker.run_concurrent(args.concurrency)
     exit_code = checker.print_summary()
     checker.export_results("katana-test-results.json")
     sys.exit(exit_code)
@@ -10,15 +10,20 @@ Bu script Luca API entegrasyonunu test eder:
 
 Kullanım:
     python3 test-luca-integration.py [--api-url http://localhost:5000] [--verbose]
+                                     [--sequential] [--concurrency 4] [--results luca-test-results.json]
 """
 
 import argparse
 import json
 import requests
+import threading
 import time
 from datetime import datetime
 from typing import Optional, Dict, Any
 
+from check_runner import Check, run_checks, write_results
+from katana_client import KatanaClient
+
 # Renkli output
 class Colors:
     GREEN = '\033[92m'
@@ -38,6 +43,7 @@ def step(msg): print(f"\n{Colors.MAGENTA}🔹 {msg}{Colors.END}")
 class LucaIntegrationTester:
     def __init__(self, api_base_url: str, verbose: bool = False):
         self.api_base_url = api_base_url.rstrip('/')
+        self.client = KatanaClient(self.api_base_url)
         self.verbose = verbose
         self.test_sku = f"TEST-PY-{datetime.now().strftime('%Y%m%d%H%M%S')}"
         self.results = {
@@ -45,6 +51,24 @@ class LucaIntegrationTester:
             'failed': 0,
             'warnings': 0
         }
+        self._lock = threading.Lock()
+        # In run_concurrent each test records its outcome under its own check name
+        self._current = threading.local()
+        self._outcomes = {}
+
+    def count(self, outcome: str):
+        check = getattr(self._current, 'check', None)
+        with self._lock:
+            if check is None:
+                self.results[outcome] += 1
+            else:
+                self._outcomes[check] = outcome
+
+    def _as_check(self, name: str, test):
+        def probe():
+            self._current.check = name
+            return test()
+        return probe
 
     def log_verbose(self, msg: str):
         if self.verbose:
@@ -56,12 +80,9 @@ class LucaIntegrationTester:
         self.log_verbose(f"{method} {url}")
         
         try:
-            if method.upper() == 'GET':
-                response = requests.get(url, timeout=timeout)
-            elif method.upper() == 'POST':
-                response = requests.post(url, json=data, timeout=timeout)
-            else:
+            if method.upper() not in ('GET', 'POST'):
                 raise ValueError(f"Unsupported method: {method}")
+            response = self.client.request(method.upper(), endpoint, json=data, timeout=timeout)
             
             return {
                 'status_code': response.status_code,
@@ -93,11 +114,11 @@ class LucaIntegrationTester:
         
         if result['success']:
             success("API is healthy")
-            self.results['passed'] += 1
+            self.count('passed')
             return True
         else:
             error(f"API health check failed: {result.get('error', result['text'])}")
-            self.results['failed'] += 1
+            self.count('failed')
             return False
 
     def test_luca_connection(self) -> bool:
@@ -108,11 +129,11 @@ class LucaIntegrationTester:
         
         if result['success']:
             success("Luca connection test passed")
-            self.results['passed'] += 1
+            self.count('passed')
             return True
         else:
             warning(f"Luca connection test returned {result['status_code']} (might be expected)")
-            self.results['warnings'] += 1
+            self.count('warnings')
             return True  # Continue with other tests
 
     def test_stock_card_search(self) -> bool:
@@ -137,7 +158,7 @@ class LucaIntegrationTester:
             else:
                 warning(f"Search failed for '{sku}': {result.get('error', result['text'][:100])}")
         
-        self.results['passed'] += 1
+        self.count('passed')
         return all_passed
 
     def test_stock_card_sync(self) -> bool:
@@ -173,11 +194,11 @@ class LucaIntegrationTester:
                 for err in body['errors'][:5]:
                     print(f"    - {err}")
             
-            self.results['passed'] += 1
+            self.count('passed')
             return True
         else:
             error(f"Sync failed: {result.get('error', result['text'][:200])}")
-            self.results['failed'] += 1
+            self.count('failed')
             return False
 
     def test_duplicate_detection(self) -> bool:
@@ -206,21 +227,21 @@ class LucaIntegrationTester:
             
             if dup_count > 0 or skip_count > 0:
                 success(f"Duplicate detection working! Skipped: {skip_count}, Duplicates: {dup_count}")
-                self.results['passed'] += 1
+                self.count('passed')
                 return True
             else:
                 warning(f"Expected duplicate detection but got: Successful={body.get('successfulRecords')}")
-                self.results['warnings'] += 1
+                self.count('warnings')
                 return True
         else:
             # Duplicate hatası beklenen bir durum olabilir
             if any(x in result['text'].lower() for x in ['duplicate', 'zaten', 'mevcut', 'kullanılmış']):
                 success("Duplicate error caught correctly")
-                self.results['passed'] += 1
+                self.count('passed')
                 return True
             else:
                 error(f"Unexpected error: {result.get('error', result['text'][:200])}")
-                self.results['failed'] += 1
+                self.count('failed')
                 return False
 
     def test_batch_sync(self) -> bool:
@@ -253,15 +274,14 @@ class LucaIntegrationTester:
             print(f"  - Successful: {body.get('successfulRecords', 'N/A')}")
             print(f"  - Failed: {body.get('failedRecords', 'N/A')}")
             print(f"  - Duration: {body.get('duration', 'N/A')}")
-            self.results['passed'] += 1
+            self.count('passed')
             return True
         else:
             error(f"Batch sync failed: {result.get('error', result['text'][:200])}")
-            self.results['failed'] += 1
+            self.count('failed')
             return False
 
-    def run_all_tests(self):
-        """Run all tests"""
+    def print_banner(self):
         print("=" * 60)
         print(f"{Colors.BLUE}🧪 LUCA INTEGRATION TEST (Python){Colors.END}")
         print("=" * 60)
@@ -270,6 +290,10 @@ class LucaIntegrationTester:
         print(f"Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print("=" * 60)
 
+    def run_all_tests(self):
+        """Run all tests"""
+        self.print_banner()
+
         # Run tests
         if not self.test_health_check():
             error("API not available, stopping tests")
@@ -288,6 +312,36 @@ class LucaIntegrationTester:
         # Summary
         self.print_summary()
 
+    def checks(self):
+        """The tests with their dependencies; deadlines are the request timeouts plus a margin"""
+        return [
+            Check(name, self._as_check(name, test), after=after, deadline=deadline)
+            for name, test, after, deadline in [
+                ('API Health Check', self.test_health_check, [], 35),
+                ('Luca Connection Test', self.test_luca_connection, ['API Health Check'], 65),
+                ('Stock Card Search', self.test_stock_card_search, ['API Health Check'], 95),
+                ('Stock Card Sync', self.test_stock_card_sync, ['API Health Check'], 125),
+                ('Duplicate Detection', self.test_duplicate_detection, ['Stock Card Sync'], 125),
+                ('Batch Sync', self.test_batch_sync, ['API Health Check'], 305),
+            ]
+        ]
+
+    def run_concurrent(self, concurrency: int = 4):
+        """Run independent tests concurrently; output is printed per test in the usual order"""
+        self.print_banner()
+        start = time.perf_counter()
+        results = run_checks(self.checks(), concurrency)
+        with self._lock:
+            outcomes = dict(self._outcomes)
+        for result in results:
+            # Skipped, timed out or raised counts as failed; an abandoned test that
+            # records its outcome later is not counted a second time
+            outcome = outcomes.get(result.name, 'passed' if result.success else 'failed')
+            self.results[outcome if result.completed else 'failed'] += 1
+        info(f"Finished in {time.perf_counter() - start:.1f}s (concurrency {concurrency})")
+        self.print_summary()
+        return results
+
     def print_summary(self):
         """Print test summary"""
         print("\n" + "=" * 60)
@@ -330,10 +384,19 @@ def main():
     parser = argparse.ArgumentParser(description='Luca API Integration Test')
     parser.add_argument('--api-url', default='http://localhost:5000', help='API base URL')
     parser.add_argument('--verbose', '-v', action='store_true', help='Verbose output')
+    parser.add_argument('--sequential', action='store_true', help='Run the tests one after another')
+    parser.add_argument('--concurrency', type=int, default=4, help='Tests running at the same time')
+    parser.add_argument('--results', help='Also write the results to this JSON file (katana-test-results.json format)')
     args = parser.parse_args()
 
     tester = LucaIntegrationTester(args.api_url, args.verbose)
-    tester.run_all_tests()
+    if args.sequential:
+        tester.run_all_tests()
+    else:
+        results = tester.run_concurrent(args.concurrency)
+        if args.results:
+            write_results(results, args.results)
+            info(f"Results saved: {args.results}")
 
 
 if __name__ == '__main__':
@@ -4,16 +4,18 @@ Tedarik Siparişi Entegrasyon Testi
 Frontend, Backend ve Database arasında tam çalışma akışını test eder
 """
 
-import requests
 import json
 import time
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, Tuple
 import sys
 
+from katana_client import ApiError, KatanaClient
+
 class PurchaseOrderIntegrationTest:
     def __init__(self):
         self.api_url = "http://localhost:8080/api"
+        self.client = KatanaClient(self.api_url.replace('/api', ''), username="admin", password="Admin@123", timeout=5)
         self.passed = 0
         self.failed = 0
         self.auth_token = None
@@ -21,35 +23,17 @@ class PurchaseOrderIntegrationTest:
         self.test_product_id = None
         self.created_purchase_order_id = None
         self.results = []
-        self.headers = {"Content-Type": "application/json"}
         
     def login(self) -> bool:
         """API'ye giriş yap"""
         try:
-            login_payload = {
-                "username": "admin",
-                "password": "Admin@123"
-            }
-            
-            response = requests.post(
-                f"{self.api_url.replace('/api', '')}/api/auth/login",
-                json=login_payload,
-                timeout=5
-            )
-            
-            if response.status_code in [200, 201]:
-                data = response.json()
-                self.auth_token = data.get('token') or data.get('accessToken')
-                if self.auth_token:
-                    self.headers["Authorization"] = f"Bearer {self.auth_token}"
-                    self.print_test_result("API'ye Giriş Yap", True, "Token başarıyla alındı")
-                    return True
-                else:
-                    self.print_test_result("API'ye Giriş Yap", False, "Token bulunamadı")
-                    return False
-            else:
-                self.print_test_result("API'ye Giriş Yap", False, f"Status: {response.status_code}")
-                return False
+            self.auth_token = self.client.token()
+            self.print_test_result("API'ye Giriş Yap", True, "Token başarıyla alındı")
+            return True
+        except ApiError as e:
+            message = f"Status: {e.status_code}" if e.status_code not in [200, 201] else "Token bulunamadı"
+            self.print_test_result("API'ye Giriş Yap", False, message)
+            return False
         except Exception as e:
             self.print_test_result("API'ye Giriş Yap", False, str(e))
             return False
@@ -82,7 +66,7 @@ class PurchaseOrderIntegrationTest:
     def test_api_health(self) -> bool:
         """API'nin çalışıp çalışmadığını kontrol et"""
         try:
-            response = requests.get(f"{self.api_url.replace('/api', '')}/api/health", timeout=5)
+            response = self.client.health(auth=False)
             success = response.status_code == 200
             self.print_test_result("API Health Check", success, f"Status: {response.status_code}")
             return success
@@ -93,7 +77,7 @@ class PurchaseOrderIntegrationTest:
     def get_test_supplier(self) -> Optional[Dict[str, Any]]:
         """Test için bir tedarikçi al"""
         try:
-            response = requests.get(f"{self.api_url}/suppliers", headers=self.headers, timeout=5)
+            response = self.client.list_suppliers()
             if response.status_code == 200:
                 suppliers = response.json()
                 if isinstance(suppliers, list) and len(suppliers) > 0:
@@ -127,7 +111,7 @@ class PurchaseOrderIntegrationTest:
                 "address": "Test Adresi"
             }
             
-            response = requests.post(f"{self.api_url}/suppliers", json=payload, headers=self.headers, timeout=5)
+            response = self.client.create_supplier(payload)
             if response.status_code in [200, 201]:
                 supplier = response.json()
                 self.test_supplier_id = supplier.get('id')
@@ -147,7 +131,7 @@ class PurchaseOrderIntegrationTest:
     def get_test_product(self) -> Optional[Dict[str, Any]]:
         """Test için bir ürün al"""
         try:
-            response = requests.get(f"{self.api_url}/products", headers=self.headers, timeout=5)
+            response = self.client.list_products()
             if response.status_code == 200:
                 products = response.json()
                 if isinstance(products, list) and len(products) > 0:
@@ -206,7 +190,7 @@ class PurchaseOrderIntegrationTest:
                 ]
             }
             
-            response = requests.post(f"{self.api_url}/purchase-orders", json=payload, headers=self.headers, timeout=10)
+            response = self.client.create_purchase_order(payload, timeout=10)
             if response.status_code in [200, 201]:
                 po = response.json()
                 self.created_purchase_order_id = po.get('id')
@@ -239,10 +223,7 @@ class PurchaseOrderIntegrationTest:
             return False
         
         try:
-            response = requests.get(
-                f"{self.api_url}/purchase-orders/{self.created_purchase_order_id}", 
-                timeout=5
-            )
+            response = self.client.get_purchase_order(self.created_purchase_order_id)
             if response.status_code == 200:
                 po = response.json()
                 self.print_test_result(
@@ -265,7 +246,7 @@ class PurchaseOrderIntegrationTest:
     def list_purchase_orders(self) -> bool:
         """Tüm tedarik siparişlerini listele"""
         try:
-            response = requests.get(f"{self.api_url}/purchase-orders", headers=self.headers, timeout=5)
+            response = self.client.list_purchase_orders()
             if response.status_code == 200:
                 pos = response.json()
                 count = len(pos) if isinstance(pos, list) else 1
@@ -297,11 +278,7 @@ class PurchaseOrderIntegrationTest:
                 "description": f"Güncellenen Sipariş - {datetime.now().isoformat()}"
             }
             
-            response = requests.put(
-                f"{self.api_url}/purchase-orders/{self.created_purchase_order_id}", 
-                json=payload, 
-                timeout=5
-            )
+            response = self.client.update_purchase_order(self.created_purchase_order_id, payload)
             
             if response.status_code in [200, 204]:
                 self.print_test_result("Siparişi Güncelle", True, "Sipariş başarıyla güncellendi")
@@ -328,10 +305,7 @@ class PurchaseOrderIntegrationTest:
             return False
         
         try:
-            response = requests.get(
-                f"{self.api_url}/purchase-orders/{self.created_purchase_order_id}", 
-                timeout=5
-            )
+            response = self.client.get_purchase_order(self.created_purchase_order_id)
             if response.status_code == 200:
                 po = response.json()
                 items = po.get('items', [])
@@ -3,15 +3,17 @@
 Tedarik Siparişi Basit Entegrasyon Testi
 """
 
-import requests
 import json
 import time
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional
 
+from katana_client import KatanaClient
+
 class SimplePurchaseOrderTest:
     def __init__(self):
         self.api_url = "http://localhost:8080/api"
+        self.client = KatanaClient(self.api_url.replace('/api', ''), timeout=5)
         self.passed = 0
         self.failed = 0
         self.results = []
@@ -44,7 +46,7 @@ class SimplePurchaseOrderTest:
     def test_health(self):
         """Health endpoint test"""
         try:
-            response = requests.get(f"{self.api_url.replace('/api', '')}/api/health", timeout=5)
+            response = self.client.health()
             self.print_test("API Health Check", response.status_code == 200, f"Status: {response.status_code}")
             return response.status_code == 200
         except Exception as e:
@@ -54,7 +56,7 @@ class SimplePurchaseOrderTest:
     def test_suppliers_list(self):
         """Tedarikçi listesini al"""
         try:
-            response = requests.get(f"{self.api_url}/suppliers", timeout=5)
+            response = self.client.list_suppliers()
             success = response.status_code == 200
             
             if success:
@@ -72,7 +74,7 @@ class SimplePurchaseOrderTest:
     def test_products_list(self):
         """Ürün listesini al"""
         try:
-            response = requests.get(f"{self.api_url}/products", timeout=5)
+            response = self.client.list_products()
             success = response.status_code == 200
             
             if success:
@@ -97,7 +99,7 @@ class SimplePurchaseOrderTest:
                 "email": "test@test.com"
             }
             
-            response = requests.post(f"{self.api_url}/suppliers", json=payload, timeout=5)
+            response = self.client.create_supplier(payload)
             
             if response.status_code in [200, 201]:
                 supplier = response.json()
@@ -139,7 +141,7 @@ class SimplePurchaseOrderTest:
                 ]
             }
             
-            response = requests.post(f"{self.api_url}/purchase-orders", json=payload, timeout=10)
+            response = self.client.create_purchase_order(payload, timeout=10)
             
             if response.status_code in [200, 201]:
                 po = response.json()
@@ -158,7 +160,7 @@ class SimplePurchaseOrderTest:
     def test_get_purchase_order(self, po_id: int):
         """Oluşturulan siparişi al"""
         try:
-            response = requests.get(f"{self.api_url}/purchase-orders/{po_id}", timeout=5)
+            response = self.client.get_purchase_order(po_id)
             
             if response.status_code == 200:
                 po = response.json()
@@ -175,7 +177,7 @@ class SimplePurchaseOrderTest:
     def test_list_purchase_orders(self):
         """Tüm siparişleri listele"""
         try:
-            response = requests.get(f"{self.api_url}/purchase-orders", timeout=5)
+            response = self.client.list_purchase_orders()
             
             if response.status_code == 200:
                 pos = response.json()
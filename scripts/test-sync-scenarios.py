@@ -3,18 +3,28 @@
 Katana → Luca Stok Kartı Senkronizasyonu Test Senaryoları
 Test 1: İlk Senkronizasyon (Temiz Durum)
 Test 2: Duplicate Detection
+
+Senkronizasyonu suite kendisi tetikler (--trigger batch: /api/luca/push-products-batch,
+--trigger sync: /api/sync/to-luca/stock-cards) ve iş bitene kadar batch-status
+uç noktasını artan aralıklarla sorgular.
+Her senaryo için tamamlanma süresi ve ürün/sn kaydedilir.
 """
 
-import requests
+import argparse
 import json
+import os
 import time
 from datetime import datetime
 from typing import Dict, List, Any
 
+from katana_client import ApiError, KatanaClient, batch_finished, batch_state, poll
+
 # Konfigürasyon
-API_BASE_URL = "http://localhost:8080/api"
-ADMIN_API_URL = "http://localhost:8080/api/adminpanel"
+KATANA_URL = "http://localhost:8080"
+KATANA_USERNAME = os.environ.get("KATANA_USERNAME", "admin")
+KATANA_PASSWORD = os.environ.get("KATANA_PASSWORD", "Admin@123")
 TEST_RESULTS_FILE = "test_sync_results.json"
+SYNC_TIMEOUT = 1800
 
 class TestLogger:
     def __init__(self):
@@ -33,14 +43,18 @@ class TestLogger:
         self.log("INFO", f"Test logları kaydedildi: {filename}")
 
 class KatanaTestSuite:
-    def __init__(self):
+    def __init__(self, trigger: str = "batch", batch_size: int = 100, sync_timeout: int = SYNC_TIMEOUT):
         self.logger = TestLogger()
         self.test_results = {}
+        self.client = KatanaClient(KATANA_URL, username=KATANA_USERNAME, password=KATANA_PASSWORD, timeout=10)
+        self.trigger = trigger
+        self.batch_size = batch_size
+        self.sync_timeout = sync_timeout
     
     def get_sync_status(self) -> Dict[str, Any]:
         """Senkronizasyon durumunu kontrol et"""
         try:
-            response = requests.get(f"{ADMIN_API_URL}/sync-logs-anon", timeout=10)
+            response = self.client.sync_logs()
             if response.status_code == 200:
                 return response.json()
             else:
@@ -53,7 +67,7 @@ class KatanaTestSuite:
     def get_failed_records(self) -> List[Dict]:
         """Başarısız kayıtları al"""
         try:
-            response = requests.get(f"{ADMIN_API_URL}/failed-records-anon", timeout=10)
+            response = self.client.failed_records()
             if response.status_code == 200:
                 data = response.json()
                 return data.get('records', []) if isinstance(data, dict) else data
@@ -65,7 +79,7 @@ class KatanaTestSuite:
     def get_products_count(self) -> int:
         """Ürün sayısını al"""
         try:
-            response = requests.get(f"{API_BASE_URL}/Products?pageSize=1", timeout=10)
+            response = self.client.list_products(params={"pageSize": 1})
             if response.status_code == 200:
                 data = response.json()
                 return data.get('totalCount', 0)
@@ -74,6 +88,69 @@ class KatanaTestSuite:
             self.logger.log("ERROR", f"Ürün sayısı alınamadı: {str(e)}")
             return 0
     
+    def _json(self, response) -> Dict[str, Any]:
+        if response.status_code != 200:
+            raise ApiError(f"{response.request.path_url}: Status {response.status_code}", response)
+        return response.json()
+    
+    def wait_for_job(self, job_id: str) -> Dict[str, Any]:
+        """Batch job'ı terminal duruma gelene kadar izle"""
+        def batch():
+            response = self.client.batch_status(job_id)
+            if response.status_code == 404:
+                # BatchJobService işleri yalnızca bellekte tutar
+                raise ApiError(f"Job {job_id} bulunamadı: temizlenmiş ya da servis yeniden başlamış", response)
+            status = self._json(response)
+            self.logger.log("INFO", f"İlerleme: {status.get('processedItems', 0)}/{status.get('totalItems', 0)} "
+                                    f"({batch_state(status)})")
+            return status
+        
+        status, polls = poll(batch, batch_finished, self.sync_timeout, progress=lambda st: st.get('processedItems'))
+        return {
+            'state': batch_state(status),
+            'items': status.get('processedItems', 0),
+            'successful': status.get('successfulItems', 0),
+            'failed': status.get('failedItems', 0),
+            'errors': status.get('errors', [])[:5],
+            'polls': polls
+        }
+    
+    def run_sync(self) -> Dict[str, Any]:
+        """Senkronizasyonu tetikle, bitmesini bekle; süre ve ürün/sn ile sonucu döner"""
+        start = time.monotonic()
+        if self.trigger == "sync":
+            self.logger.log("INFO", "POST /api/sync/to-luca/stock-cards (senkron, cevap gelince biter)")
+            response = self.client.sync_to_luca_stock_cards({"dryRun": False}, timeout=self.sync_timeout)
+            if response.status_code not in [200, 400]:  # 400: sync çalıştı ama başarısız
+                raise ApiError(f"Sync tetiklenemedi: Status {response.status_code}", response)
+            body = response.json()
+            result = {
+                'state': 'Success' if body.get('isSuccess') else 'Failed',
+                'items': body.get('processedRecords', 0),
+                'successful': body.get('successfulRecords', 0),
+                'failed': body.get('failedRecords', 0),
+                'duplicates': body.get('duplicateRecords', 0),
+                'skipped': body.get('skippedRecords', 0),
+                'errors': body.get('errors', [])[:5],
+                'polls': 0
+            }
+        else:
+            self.logger.log("INFO", f"POST /api/luca/push-products-batch (batchSize={self.batch_size})")
+            response = self.client.push_products_batch({"batchSize": self.batch_size})
+            if response.status_code not in [200, 202]:
+                raise ApiError(f"Batch job başlatılamadı: Status {response.status_code} {response.text[:200]}", response)
+            job_id = response.json().get('jobId')
+            self.logger.log("INFO", f"Job: {job_id}")
+            result = {'job_id': job_id, **self.wait_for_job(job_id)}
+        
+        seconds = time.monotonic() - start
+        result['trigger'] = self.trigger
+        result['time_to_complete_s'] = round(seconds, 2)
+        result['items_per_sec'] = round(result['items'] / seconds, 2) if result['items'] and seconds > 0 else None
+        self.logger.log("INFO", f"Sync bitti: {result['state']}, {seconds:.1f}s, {result['items']} ürün, "
+                                f"{result['items_per_sec']} ürün/sn, {result['polls']} sorgu")
+        return result
+    
     def test_1_initial_sync(self):
         """TEST 1: İlk Senkronizasyon (Temiz Durum)"""
         self.logger.log("INFO", "=" * 60)
@@ -88,20 +165,15 @@ class KatanaTestSuite:
         initial_status = self.get_sync_status()
         self.logger.log("INFO", f"Başlangıç sync status: {json.dumps(initial_status, ensure_ascii=False)}")
         
-        # Manual sync tetikle (API aracılığıyla varsa)
+        # Sync'i tetikle ve bitmesini bekle
+        sync = {}
         try:
-            self.logger.log("INFO", "Senkronizasyon başlatılıyor... (Manual olarak AdminPanel'den yapınız)")
-            self.logger.log("WAIT", "Admin Panel → Stok Kartları Senkronizasyonu → Senkronize Et")
-            
-            # 60 saniye bekle
-            for i in range(60, 0, -10):
-                self.logger.log("INFO", f"Bekleniyor... ({i}s)")
-                time.sleep(10)
+            self.logger.log("INFO", "Senkronizasyon başlatılıyor...")
+            sync = self.run_sync()
         except Exception as e:
-            self.logger.log("ERROR", f"Sync tetiklenemedi: {str(e)}")
+            self.logger.log("ERROR", f"Sync tamamlanamadı: {str(e)}")
         
         # Sonuçları kontrol et
-        time.sleep(5)
         failed_records = self.get_failed_records()
         final_status = self.get_sync_status()
         
@@ -117,7 +189,8 @@ class KatanaTestSuite:
         self.logger.log("INFO", "⏭️ Atlanan: 0")
         
         self.test_results['test_1'] = {
-            'status': 'COMPLETED',
+            'status': 'COMPLETED' if sync else 'FAILED',
+            'sync': sync,
             'product_count': product_count,
             'final_status': final_status,
             'failed_records_count': len(failed_records)
@@ -130,18 +203,13 @@ class KatanaTestSuite:
         self.logger.log("INFO", "=" * 60)
         
         self.logger.log("INFO", "Aynı senkronizasyonu tekrar çalıştırılıyor...")
-        self.logger.log("WAIT", "Admin Panel → Stok Kartları Senkronizasyonu → Senkronize Et (2. kez)")
-        
+        sync = {}
         try:
-            # 60 saniye bekle
-            for i in range(60, 0, -10):
-                self.logger.log("INFO", f"Bekleniyor... ({i}s)")
-                time.sleep(10)
+            sync = self.run_sync()
         except Exception as e:
-            self.logger.log("ERROR", f"Sync tetiklenemedi: {str(e)}")
+            self.logger.log("ERROR", f"Sync tamamlanamadı: {str(e)}")
         
         # Sonuçları kontrol et
-        time.sleep(5)
         failed_records = self.get_failed_records()
         final_status = self.get_sync_status()
         
@@ -157,7 +225,8 @@ class KatanaTestSuite:
         self.logger.log("INFO", "⏭️ Atlanan: 0")
         
         self.test_results['test_2'] = {
-            'status': 'COMPLETED',
+            'status': 'COMPLETED' if sync else 'FAILED',
+            'sync': sync,
             'final_status': final_status,
             'failed_records_count': len(failed_records),
             'duplicate_expected': True
@@ -183,7 +252,6 @@ class KatanaTestSuite:
         try:
             self.test_1_initial_sync()
             self.logger.log("INFO", "")
-            time.sleep(5)
             self.test_2_duplicate_detection()
             self.logger.log("INFO", "")
             self.check_backend_logs()
@@ -200,10 +268,17 @@ class KatanaTestSuite:
 
 def main():
     """Ana fonksiyon"""
+    parser = argparse.ArgumentParser(description="Katana → Luca stok kartı senkronizasyon senaryoları")
+    parser.add_argument("--trigger", choices=["batch", "sync"], default="batch",
+                        help="batch: push-products-batch + batch-status izleme, sync: to-luca/stock-cards")
+    parser.add_argument("--batch-size", type=int, default=100, help="push-products-batch batch boyutu")
+    parser.add_argument("--timeout", type=int, default=SYNC_TIMEOUT, help="senaryo başına en fazla bekleme (sn)")
+    args = parser.parse_args()
+    
     print("🚀 Katana → Luca Stok Kartı Senkronizasyonu Test Senaryoları")
     print("=" * 60)
     
-    suite = KatanaTestSuite()
+    suite = KatanaTestSuite(args.trigger, args.batch_size, args.timeout)
     suite.run_all_tests()
     
     print("\n" + "=" * 60)
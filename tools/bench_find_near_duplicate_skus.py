@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Check and time find_near_duplicate_skus.py.
+
+A few hand-made cases check that sizes and ids after a dash (`BORU-16`,
+`VARIANT-7`) stay apart while Katana copies (`X`, `X-1`) merge.  Then a
+synthetic product list with copies and respaced SKUs is grouped and timed.
+
+Usage:
+    python tools/bench_find_near_duplicate_skus.py [--products 100000]
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+
+import find_near_duplicate_skus as nd
+
+NAMES = ["BAKIR BORU", "PUT", "DİRSEK", "MANŞON", "TE", "REDÜKSİYON"]
+
+
+def _groups(products: list[nd.Product]) -> list[list[str]]:
+    result = nd.find_duplicates(products)
+    return sorted(sorted(products[i].sku for i in g) for g in result.groups)
+
+
+def check_suffixes() -> bool:
+    cases = [
+        ("sizes", [nd.Product(1, "X-16", "X"), nd.Product(2, "X-22", "X")], []),
+        ("pipe sizes", [nd.Product(i, f"BORU-{d}", "Ø BAKIR BORU") for i, d in enumerate((16, 22, 35), 1)], []),
+        ("variant ids", [nd.Product(i, f"VARIANT-{i}", "VARIANT") for i in range(1, 100)], []),
+        ("copies", [nd.Product(1, "X", "X"), nd.Product(2, "X-1", "X-1"), nd.Product(3, "X-2", "X")],
+         [["X", "X-1", "X-2"]]),
+    ]
+    ok = True
+    for label, products, expected in cases:
+        groups = _groups(products)
+        good = groups == expected
+        ok &= good
+        print(f"{label}: {len(groups)} groups for {len(products)} products: {'ok' if good else 'FAILED ' + str(groups)}")
+    return ok
+
+
+def synthetic_products(count: int, seed: int = 1) -> list[nd.Product]:
+    rng = random.Random(seed)
+    products = []
+    for i in range(count):
+        name = f"Ø{rng.choice((10, 12, 16, 22, 28))} {rng.choice(NAMES)}"
+        sku = f"PRD-{i // 4:06d}.{rng.randint(1, 9)}"
+        r = rng.random()
+        if r < 0.05:
+            sku += "-1"
+        elif r < 0.1:
+            sku = sku.replace("-", " - ")
+        products.append(nd.Product(i + 1, sku, name))
+    return products
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Check and time the near-duplicate SKU search.")
+    ap.add_argument("--products", type=int, default=100_000, help="products in the synthetic list")
+    args = ap.parse_args()
+
+    if not check_suffixes():
+        return 1
+
+    products = synthetic_products(args.products)
+    start = time.perf_counter()
+    result = nd.find_duplicates(products)
+    elapsed = time.perf_counter() - start
+    print(f"{len(products)} products: {len(result.groups)} groups, {result.candidates} candidate pairs, "
+          f"{elapsed:.2f}s (numpy: {nd.np is not None})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""Find near-duplicate products by SKU and name and write them as merge groups.
+
+The PowerShell analysers (analyze-katana-duplicates.ps1 and friends) only group
+products whose SKU matches exactly, so `PUT. Ø22*1,5` and `PUT.Ø22*1.5` stay
+apart.  Here SKUs and names are normalised first (case, spacing, decimal comma,
+`*` / `×` between numbers) and products with the same normalised SKU are merged
+directly.  Candidate pairs come from blocking on the SKU without punctuation
+and a Katana copy suffix (`-1`, `-2`, only when the SKU without it exists too:
+`BORU-16` alone is a size, not a copy), and from MinHash/LSH over character
+3-grams of that SKU.  Names only verify: they are too generic to block on
+(hundreds of `Ø10 BAKIR BORU`).  A candidate scores the lower of its SKU
+and name similarities and is merged when the numbers in both SKUs and both
+names agree and the score reaches --threshold, so look-alike codes with
+generic names (`...AEB-PSL-A` / `...ADB-PSL-A`) stay apart.  Merges are
+grouped with union-find.
+
+No bucket is compared all-pairs: a bucket with more than MAX_BUCKET products is
+sorted by SKU and only compared within a window, so the run stays close to
+linear in the number of products.  numpy is used for the signatures when
+installed.
+
+The output follows sku-merge-plan.json.  The oldest product of a group
+(created_at, else the lowest id) is kept, as in analyze-katana-duplicates.ps1.
+
+Usage:
+    python tools/find_near_duplicate_skus.py katana-all-products.json [--out sku-merge-plan.near.json]
+    python tools/find_near_duplicate_skus.py products.csv [--threshold 0.8] [--pairs-csv pairs.csv]
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import random
+import re
+import unicodedata
+import zlib
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from functools import cached_property
+from pathlib import Path
+from typing import Iterator, Optional
+
+import validate_katana_csvs as v
+
+try:  # optional: vectorised signatures
+    import numpy as np
+except ImportError:
+    np = None
+
+PRODUCT_ID_COLUMNS = ["id", "product id", "product_id", "katana_product_id", "katana product id"]
+PRODUCT_CREATED_COLUMNS = ["created_at", "createdat", "created at", "olusturma", "oluşturma"]
+
+NGRAM = 3
+NUM_PERM = 60
+BANDS = 10
+THRESHOLD = 0.8
+# Buckets larger than this are compared within a window after sorting by SKU
+MAX_BUCKET = 50
+WINDOW = 8
+SEED = 20251222
+
+_MASK64 = (1 << 64) - 1
+# Between two numbers (or a number and a diameter sign), x / × / * all mean "by"
+_DIMENSION_X = re.compile(r"(?<=\d)[X×*](?=[\dØ])")
+_DECIMAL_COMMA = re.compile(r"(?<=\d),(?=\d)")
+# Katana appends -1, -2 ... to copies of a SKU; longer numeric tails are part numbers.
+# A short tail is only a copy suffix when the SKU without it exists too
+_COPY_SUFFIX = re.compile(r"-\d{1,2}$")
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+_NAME_PUNCT = re.compile(r"[^\w.Ø%]+")
+# Separators dropped from the compact SKU; a "." between digits is a decimal point and stays
+_SKU_PUNCT = re.compile(r"[\s\-_/.]+(?<!\d\.(?=\d))")
+
+
+@dataclass
+class Product:
+    id: int
+    sku: str
+    name: str
+    created: str = ""
+
+
+@dataclass
+class Keys:
+    """Normalised forms of one product used for blocking and scoring."""
+
+    sku: str
+    compact: str  # without punctuation and copy suffix
+    name: str
+    numbers: tuple  # in the compact SKU and in the name: sizes and part numbers must match
+    sku_grams: frozenset
+
+    @cached_property
+    def name_grams(self) -> frozenset:
+        # Only needed for candidates whose SKUs are similar enough
+        return ngrams(self.name)
+
+
+def normalise_sku(sku: str) -> str:
+    s = "".join(unicodedata.normalize("NFKC", sku or "").upper().split())
+    s = _DECIMAL_COMMA.sub(".", s)
+    return _DIMENSION_X.sub("X", s)
+
+
+def normalise_name(name: str) -> str:
+    s = unicodedata.normalize("NFKC", name or "").upper()
+    s = _DIMENSION_X.sub("X", _DECIMAL_COMMA.sub(".", s))
+    return " ".join(_NAME_PUNCT.sub(" ", s).split())
+
+
+def ngrams(text: str, n: int = NGRAM) -> frozenset:
+    padded = f"^{text}$"
+    if len(padded) <= n:
+        return frozenset([padded])
+    return frozenset(padded[i:i + n] for i in range(len(padded) - n + 1))
+
+
+def copy_base(sku: str, skus: set[str]) -> Optional[str]:
+    """`sku` without its copy suffix if that SKU is in `skus`, else None."""
+    base = _COPY_SUFFIX.sub("", sku)
+    return base if base != sku and base in skus else None
+
+
+def compact_sku(sku: str) -> str:
+    return _SKU_PUNCT.sub("", sku)
+
+
+def product_keys(product: Product, skus: set[str] = frozenset()) -> Keys:
+    """Keys of `product`; `skus` (normalised) decides whether a `-1`, `-2` tail is a copy suffix."""
+    sku = normalise_sku(product.sku)
+    base = copy_base(sku, skus)
+    compact = compact_sku(base or sku)
+    name = (product.name or "").strip()
+    if base is not None:
+        # Copies often carry the suffix in the name too; normalising would turn its "-" into a space
+        name = _COPY_SUFFIX.sub("", name)
+    name = normalise_name(name)
+    numbers = (tuple(_NUMBER.findall(compact)), tuple(_NUMBER.findall(name)))
+    return Keys(sku, compact, name, numbers, ngrams(compact))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    inter = len(a & b)
+    return inter / (len(a) + len(b) - inter)
+
+
+def score_pair(a: Keys, b: Keys, threshold: float = 0.0) -> Optional[tuple[float, float, float]]:
+    """(score, SKU similarity, name similarity), or None if their numbers differ or the SKUs score below `threshold`."""
+    if a.numbers != b.numbers:
+        return None
+    sku_sim = 1.0 if a.compact == b.compact else jaccard(a.sku_grams, b.sku_grams)
+    if sku_sim < threshold:
+        return None
+    name_sim = jaccard(a.name_grams, b.name_grams) if a.name and b.name else sku_sim
+    return min(sku_sim, name_sim), sku_sim, name_sim
+
+
+# --- Loading ----------------------------------------------------------------
+
+
+def _product_id(value) -> Optional[int]:
+    text = str(value if value is not None else "").strip()
+    return int(text) if text.isdigit() else None
+
+
+def _load_json(path: Path) -> Iterator[Product]:
+    data = path.read_bytes()
+    # PowerShell's Out-File writes UTF-16 with a BOM
+    text = data.decode("utf-16" if data[:2] in (b"\xff\xfe", b"\xfe\xff") else "utf-8-sig")
+    items = json.loads(text)
+    if isinstance(items, dict):
+        items = items.get("products") or items.get("data") or []
+    for item in items:
+        pid = _product_id(item.get("id"))
+        if pid is not None:
+            yield Product(pid, item.get("sku") or "", item.get("name") or "", item.get("created_at") or "")
+
+
+def _load_csv(path: Path, encoding: Optional[str]) -> list[Product]:
+    def scan(stream: v.CsvStream) -> list[Product]:
+        fieldnames = stream.fieldnames
+        sku_col = v._pick_column(fieldnames, v.PRODUCT_SKU_COLUMNS)
+        name_col = v._pick_column(fieldnames, v.PRODUCT_NAME_COLUMNS)
+        id_col = v._pick_column(fieldnames, PRODUCT_ID_COLUMNS)
+        created_col = v._pick_column(fieldnames, PRODUCT_CREATED_COLUMNS)
+        if not sku_col or not id_col:
+            raise RuntimeError(f"{path}: needs an id and a SKU column. Headers: {fieldnames}")
+        products = []
+        for row in stream.rows:
+            pid = _product_id(row.get(id_col))
+            if pid is not None:
+                products.append(Product(pid, row.get(sku_col, ""), row.get(name_col, "") if name_col else "",
+                                        row.get(created_col, "") if created_col else ""))
+        return products
+
+    return v.scan_csv(path, scan, encoding)
+
+
+def load_products(path: Path, encoding: Optional[str] = None) -> list[Product]:
+    products = list(_load_json(path)) if path.suffix.lower() == ".json" else _load_csv(path, encoding)
+    # Rows without a SKU cannot be merged by SKU
+    return [p for p in products if p.sku.strip()]
+
+
+# --- Blocking -----------------------------------------------------------------
+
+
+def _permutations(num_perm: int, seed: int) -> list[tuple[int, int]]:
+    rng = random.Random(seed)
+    return [(rng.getrandbits(64) | 1, rng.getrandbits(64)) for _ in range(num_perm)]
+
+
+def _gram_hashes(grams: frozenset) -> list[int]:
+    return [zlib.crc32(g.encode("utf-8")) for g in grams]
+
+
+def lsh_buckets(gram_sets: list[frozenset], num_perm: int = NUM_PERM, bands: int = BANDS, seed: int = SEED) -> Iterator[list[int]]:
+    """Groups (two or more indices) of gram sets whose MinHash signatures agree on a whole band.
+
+    Signatures are num_perm 32-bit minima of multiply-shift hashes of the
+    grams' CRC32; with numpy they are computed and bucketed as arrays.
+    """
+    perms = _permutations(num_perm, seed)
+    rows = num_perm // bands
+    hashes = [_gram_hashes(grams) for grams in gram_sets]
+    if np is None:
+        signatures = [tuple(min(((a * h + b) & _MASK64) >> 32 for h in hs) for a, b in perms) for hs in hashes]
+        for band in range(bands):
+            buckets: dict[tuple, list[int]] = defaultdict(list)
+            lo = band * rows
+            for i, sig in enumerate(signatures):
+                buckets[sig[lo:lo + rows]].append(i)
+            yield from (members for members in buckets.values() if len(members) > 1)
+        return
+    if not hashes:
+        return
+    flat = np.fromiter((h for hs in hashes for h in hs), dtype=np.uint64)
+    starts = np.cumsum([0] + [len(hs) for hs in hashes[:-1]], dtype=np.int64)
+    sig = np.empty((len(hashes), num_perm), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for k, (a, b) in enumerate(perms):
+            sig[:, k] = np.minimum.reduceat((flat * np.uint64(a) + np.uint64(b)) >> np.uint64(32), starts)
+        for band in range(bands):
+            # The band is folded into one 64-bit key; a collision only adds a candidate that scoring drops
+            key = np.zeros(len(hashes), dtype=np.uint64)
+            for k in range(band * rows, (band + 1) * rows):
+                key = (key * np.uint64(0x9E3779B97F4A7C15)) ^ sig[:, k]
+            order = np.argsort(key, kind="stable")
+            sorted_key = key[order]
+            cuts = np.flatnonzero(sorted_key[1:] != sorted_key[:-1]) + 1
+            lo = np.concatenate(([0], cuts))
+            hi = np.concatenate((cuts, [len(order)]))
+            shared = hi - lo > 1
+            for a, b in zip(lo[shared].tolist(), hi[shared].tolist()):
+                yield order[a:b].tolist()
+
+
+def _bucket_pairs(members: list[int], keys: list[Keys]) -> Iterator[tuple[int, int]]:
+    # Pairs (i < j) of one bucket
+    if len(members) <= MAX_BUCKET:
+        for x in range(len(members)):
+            for y in range(x + 1, len(members)):
+                yield members[x], members[y]
+        return
+    # Sorted neighbourhood: a huge bucket (e.g. thousands of VARIANT-<id> SKUs) is compared with its neighbours only
+    members = sorted(members, key=lambda i: (keys[i].compact, i))
+    for x in range(len(members)):
+        for y in range(x + 1, min(x + 1 + WINDOW, len(members))):
+            yield min(members[x], members[y]), max(members[x], members[y])
+
+
+def candidate_pairs(keys: list[Keys]) -> set[tuple[int, int]]:
+    """Pairs (i < j) with the same compact SKU or sharing an LSH band of their SKU signatures."""
+    pairs: set[tuple[int, int]] = set()
+    same_compact: dict[str, list[int]] = defaultdict(list)
+    for i, k in enumerate(keys):
+        same_compact[k.compact].append(i)
+    for members in same_compact.values():
+        if len(members) > 1:
+            pairs.update(_bucket_pairs(members, keys))
+    for members in lsh_buckets([k.sku_grams for k in keys]):
+        pairs.update(_bucket_pairs(members, keys))
+    return pairs
+
+
+# --- Grouping -------------------------------------------------------------------
+
+
+class UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, x: int, y: int) -> bool:
+        x, y = self.find(x), self.find(y)
+        if x == y:
+            return False
+        if self.size[x] < self.size[y]:
+            x, y = y, x
+        self.parent[y] = x
+        self.size[x] += self.size[y]
+        return True
+
+
+@dataclass
+class ScoredPair:
+    a: int
+    b: int
+    score: float
+    sku_sim: float
+    name_sim: float
+
+
+@dataclass
+class DuplicateSearch:
+    products: list[Product]
+    candidates: int = 0
+    exact_merges: int = 0
+    pairs: list[ScoredPair] = field(default_factory=list)
+    groups: list[list[int]] = field(default_factory=list)
+
+
+def find_duplicates(products: list[Product], threshold: float = THRESHOLD) -> DuplicateSearch:
+    skus = {normalise_sku(p.sku) for p in products}
+    keys = [product_keys(p, skus) for p in products]
+    result = DuplicateSearch(products)
+    uf = UnionFind(len(products))
+
+    first_of_sku: dict[str, int] = {}
+    for i, k in enumerate(keys):
+        j = first_of_sku.setdefault(k.sku, i)
+        if j != i and uf.union(j, i):
+            result.exact_merges += 1
+
+    candidates = candidate_pairs(keys)
+    result.candidates = len(candidates)
+    for i, j in candidates:
+        if keys[i].sku == keys[j].sku:
+            continue
+        scored = score_pair(keys[i], keys[j], threshold)
+        if scored is not None and scored[0] >= threshold:
+            result.pairs.append(ScoredPair(i, j, *scored))
+            uf.union(i, j)
+
+    members: dict[int, list[int]] = defaultdict(list)
+    for i in range(len(products)):
+        members[uf.find(i)].append(i)
+    result.groups = sorted((g for g in members.values() if len(g) > 1), key=lambda g: _keep_order(products, g)[0])
+    return result
+
+
+def _keep_order(products: list[Product], group: list[int]) -> list[int]:
+    # Oldest first (analyze-katana-duplicates.ps1 keeps the first created product); ids break ties
+    return sorted(group, key=lambda i: (not products[i].created, products[i].created, products[i].id))
+
+
+def merge_plan(result: DuplicateSearch) -> dict:
+    products = result.products
+    groups = []
+    for group in result.groups:
+        ordered = _keep_order(products, group)
+        canonical = products[ordered[0]]
+        base = copy_base(normalise_sku(canonical.sku), {normalise_sku(products[i].sku) for i in group})
+        groups.append({
+            "baseSku": _COPY_SUFFIX.sub("", canonical.sku.strip()) if base else canonical.sku.strip(),
+            "canonicalProductId": canonical.id,
+            "duplicateProductIds": [products[i].id for i in ordered[1:]],
+            "productSkus": [products[i].sku for i in ordered],
+        })
+    return {
+        "groups": groups,
+        "totalGroups": len(groups),
+        "totalDuplicates": sum(len(g["duplicateProductIds"]) for g in groups),
+        "generatedAt": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Group near-duplicate products into an sku-merge-plan.json.")
+    ap.add_argument("products", type=Path, help="products CSV (id, SKU, name) or a JSON list like katana-all-products.json")
+    ap.add_argument("--out", type=Path, default=Path("sku-merge-plan.near.json"), help="merge plan to write")
+    ap.add_argument("--threshold", type=float, default=THRESHOLD,
+                    help=f"minimum SKU and name 3-gram similarity for a merge (default: {THRESHOLD})")
+    ap.add_argument("--pairs-csv", type=Path, help="also write every accepted fuzzy pair with its scores")
+    ap.add_argument("--encoding", help="CSV encoding instead of detecting it")
+    args = ap.parse_args()
+
+    if not args.products.exists():
+        print(f"File not found: {args.products}")
+        return 1
+    products = load_products(args.products, args.encoding)
+    result = find_duplicates(products, args.threshold)
+    plan = merge_plan(result)
+    args.out.write_text(json.dumps(plan, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+    print(f"[near-dup] Products: {len(products)}")
+    print(f"[near-dup] Same SKU after normalising: {result.exact_merges} merges")
+    print(f"[near-dup] Candidate pairs: {result.candidates}, accepted: {len(result.pairs)}")
+    print(f"[near-dup] Groups: {plan['totalGroups']}, duplicates: {plan['totalDuplicates']} -> {args.out}")
+    for group in plan["groups"][:10]:
+        print(f"[near-dup]   {group['baseSku']}: " + " | ".join(group["productSkus"][:6])
+              + (" ..." if len(group["productSkus"]) > 6 else ""))
+
+    if args.pairs_csv:
+        with args.pairs_csv.open("w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["id_a", "sku_a", "name_a", "id_b", "sku_b", "name_b", "score", "sku_similarity", "name_similarity"])
+            for pair in sorted(result.pairs, key=lambda p: (-p.score, p.a, p.b)):
+                a, b = products[pair.a], products[pair.b]
+                w.writerow([a.id, a.sku, a.name, b.id, b.sku, b.name,
+                            f"{pair.score:.3f}", f"{pair.sku_sim:.3f}", f"{pair.name_sim:.3f}"])
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
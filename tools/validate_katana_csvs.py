@@ -2,19 +2,159 @@
 from __future__ import annotations
 
 import argparse
+import bisect
+import codecs
 import csv
+import hashlib
+import heapq
+import itertools
+import json
+import mmap
+import re
+import sqlite3
 import sys
-from dataclasses import dataclass
+import zlib
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Iterable, Optional
+from typing import Callable, Iterable, Iterator, Optional
 
+try:  # optional: columnar engine
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:
+    np = pa = pc = pa_csv = None
 
-def _try_read_text(path: Path, encodings: Iterable[str]) -> tuple[str, str]:
+ENCODINGS = ["utf-8-sig", "utf-8", "cp1254", "iso-8859-9"]
+SNIFF_LINES = 50
+STREAM_CHUNK = 1 << 20
+# Characters str.splitlines() breaks on ("\r\n" counts as one break)
+_LINE_BREAKS = frozenset("\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029")
+# Issues kept per file for the report; the rest are only counted
+REPORT_ISSUES = 25
+
+
+def _iter_lines(
+    path: Path, encoding: str, chunk_size: int = STREAM_CHUNK, start: int = 0, end: Optional[int] = None
+) -> Iterator[str]:
+    # Incremental equivalent of path.read_text(encoding).splitlines() (of the
+    # bytes start..end only): the mapped file is decoded chunk by chunk and a
+    # decode error surfaces as soon as the bad bytes are reached.
+    decoder = codecs.getincrementaldecoder(encoding)()
+    tail = ""
+    with path.open("rb") as f:
+        size = f.seek(0, 2)
+        end = size if end is None else min(end, size)
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        try:
+            pos = start
+            while True:
+                data = mm[pos:min(pos + chunk_size, end)]
+                pos += len(data)
+                text = tail + decoder.decode(data, final=not data)
+                if not data:
+                    yield from text.splitlines()
+                    return
+                pieces = text.splitlines(keepends=True)
+                # The last piece may still grow, and a trailing "\r" may be half of "\r\n"
+                tail = pieces.pop() if pieces and (pieces[-1][-1] == "\r" or pieces[-1][-1] not in _LINE_BREAKS) else ""
+                for piece in pieces:
+                    yield piece[:-2] if piece.endswith("\r\n") else piece[:-1]
+        finally:
+            if size:
+                mm.close()
+
+
+# --- Encoding detection --------------------------------------------------------
+#
+# The encoding is told from the bytes instead of decoding the whole file with
+# each of ENCODINGS in turn: a UTF-8 BOM means utf-8-sig; otherwise a sample
+# (the start, the end and the bytes around the first non-ASCII one) that is
+# valid UTF-8 means utf-8.  Anything else is one of the Turkish code pages.
+# cp1254 and iso-8859-9 encode every Turkish letter alike and only differ in
+# 0x80-0x9F (punctuation in cp1254, C1 controls in iso-8859-9), so letter
+# frequencies cannot tell them apart; cp1254 is taken unless the file holds a
+# byte cp1254 leaves undefined, which is where the old order fell through to
+# iso-8859-9 too.  The guess is confirmed by decoding the whole file (without
+# parsing it) before any row is handed out; if it fails partway, the remaining
+# encodings are tried in the old order.
+
+SAMPLE_BYTES = 64 * 1024
+_UTF8_BOM = codecs.BOM_UTF8
+_NON_ASCII = re.compile(rb"[\x80-\xff]")
+_CP1254_UNDEFINED = re.compile(rb"[\x81\x8d\x8e\x8f\x90\x9d\x9e]")
+
+
+def _valid_utf8(sample: bytes, cut_start: bool) -> bool:
+    # A sample cut out of the file may start or end inside a character
+    if cut_start:
+        skip = 0
+        while skip < 3 and skip < len(sample) and sample[skip] & 0xC0 == 0x80:
+            skip += 1
+        sample = sample[skip:]
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def _guess_encoding(mm: "mmap.mmap | bytes") -> str:
+    if mm[:len(_UTF8_BOM)] == _UTF8_BOM:
+        return "utf-8-sig"
+    first = _NON_ASCII.search(mm)
+    if first is None:
+        return "utf-8"
+    at = max(first.start() - 16, 0)
+    samples = [(mm[at:at + SAMPLE_BYTES], at > 0), (mm[:SAMPLE_BYTES], False)]
+    if len(mm) > SAMPLE_BYTES:
+        samples.append((mm[-SAMPLE_BYTES:], True))
+    if all(_valid_utf8(sample, cut) for sample, cut in samples):
+        return "utf-8"
+    return "cp1254" if _CP1254_UNDEFINED.search(mm) is None else "iso-8859-9"
+
+
+def detect_encoding(path: Path) -> str:
+    with path.open("rb") as f:
+        if not f.seek(0, 2):
+            return "utf-8"
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _guess_encoding(mm)
+
+
+def encoding_candidates(path: Path, encoding: Optional[str] = None) -> list[str]:
+    """Encodings to read `path` with, in order: only `encoding` if given, else the detected one first."""
+    if encoding:
+        return [encoding]
+    guess = detect_encoding(path)
+    # A file that is not UTF-8 past the sample is not UTF-8 with or without a BOM either
+    rest = [enc for enc in ENCODINGS if enc != guess and not (guess.startswith("utf-8") and enc.startswith("utf-8"))]
+    return [guess] + rest
+
+
+def _decode_all(path: Path, encoding: str) -> None:
+    # Raises UnicodeDecodeError (or LookupError) where _iter_lines would
+    decoder = codecs.getincrementaldecoder(encoding)()
+    with path.open("rb") as f:
+        while True:
+            data = f.read(STREAM_CHUNK)
+            decoder.decode(data, final=not data)
+            if not data:
+                return
+
+
+def settle_encoding(path: Path, encoding: Optional[str] = None) -> str:
+    """The first of encoding_candidates() the whole file decodes with; raises RuntimeError if none does."""
     last_err: Optional[Exception] = None
-    for enc in encodings:
+    for enc in encoding_candidates(path, encoding):
         try:
-            return path.read_text(encoding=enc), enc
-        except Exception as e:  # noqa: BLE001
+            _decode_all(path, enc)
+            return enc
+        except (UnicodeDecodeError, LookupError, OSError) as e:
             last_err = e
     raise RuntimeError(f"Failed to read {path} with known encodings: {last_err}")
 
@@ -72,6 +212,67 @@ def _pick_column(fieldnames: list[str], candidates: list[str]) -> Optional[str]:
     return None
 
 
+PRODUCT_SKU_COLUMNS = [
+    "sku",
+    "item sku",
+    "item_code",
+    "item code",
+    "product sku",
+    "product_code",
+    "product code",
+    "stok_kodu",
+    "stok kodu",
+    "kart_kodu",
+    "kart kodu",
+    "code",
+]
+PRODUCT_NAME_COLUMNS = [
+    "name",
+    "item name",
+    "item_name",
+    "product name",
+    "product_name",
+    "stok_adi",
+    "stok adi",
+    "kart_adi",
+    "kart adi",
+    "description",
+]
+RECIPE_PARENT_COLUMNS = [
+    "parent_sku",
+    "product_sku",
+    "product sku",
+    "recipe_sku",
+    "recipe sku",
+    "sku",
+    "product",
+    "mamül",
+    "mamul",
+]
+RECIPE_COMPONENT_COLUMNS = [
+    "component_sku",
+    "ingredient_sku",
+    "material_sku",
+    "child_sku",
+    "component sku",
+    "material sku",
+    "ingredient sku",
+    "bom_sku",
+    "bom sku",
+    "hammadde",
+    "malzeme",
+]
+RECIPE_QTY_COLUMNS = [
+    "qty",
+    "quantity",
+    "amount",
+    "miktar",
+    "quantity per",
+    "component_qty",
+    "component qty",
+]
+
+
 @dataclass(frozen=True)
 class ProductRow:
     sku: str
@@ -85,197 +286,1664 @@ class RecipeRow:
     qty: float
 
 
-def read_csv_rows(path: Path) -> tuple[list[dict[str, str]], list[str], str, str]:
-    text, encoding = _try_read_text(path, ["utf-8-sig", "utf-8", "cp1254", "iso-8859-9"])
-    sample = "\n".join(text.splitlines()[:50])
-    dialect = _sniff_dialect(sample)
-    reader = csv.DictReader(text.splitlines(), dialect=dialect)
+class IssueLog:
+    """Issue messages in line order; only the first `limit` are kept, all are counted."""
+
+    def __init__(self, limit: Optional[int] = None) -> None:
+        self.limit = limit
+        self.head: list[str] = []
+        self.count = 0
+
+    def append(self, message: str) -> None:
+        self.count += 1
+        if self.limit is None or len(self.head) < self.limit:
+            self.head.append(message)
+
+
+@dataclass
+class CsvStream:
+    rows: Iterator[dict[str, str]]
+    fieldnames: list[str]
+    encoding: str
+    delimiter: str
+
+
+def open_csv_stream(path: Path, encoding: str) -> CsvStream:
+    # Only the first SNIFF_LINES lines are buffered for the dialect sniff; rows
+    # are then decoded and parsed lazily.  A UnicodeDecodeError may be raised
+    # here or while iterating `rows`.
+    lines = _iter_lines(path, encoding)
+    head = list(itertools.islice(lines, SNIFF_LINES))
+    dialect = _sniff_dialect("\n".join(head))
+    reader = csv.DictReader(itertools.chain(head, lines), dialect=dialect)
     if reader.fieldnames is None:
         raise RuntimeError(f"{path} appears to have no header row.")
-    rows = []
-    for row in reader:
-        # DictReader may return None keys if row length mismatches; ignore them.
-        clean = {k: (v if v is not None else "") for k, v in row.items() if k is not None}
-        rows.append(clean)
-    return rows, list(reader.fieldnames), encoding, dialect.delimiter
 
+    def rows() -> Iterator[dict[str, str]]:
+        for row in reader:
+            # DictReader may return None keys if row length mismatches; ignore them.
+            yield {k: (v if v is not None else "") for k, v in row.items() if k is not None}
 
-def validate_products(path: Path) -> tuple[list[ProductRow], list[str]]:
-    rows, fieldnames, encoding, delim = read_csv_rows(path)
-    sku_col = _pick_column(
-        fieldnames,
-        [
-            "sku",
-            "item sku",
-            "item_code",
-            "item code",
-            "product sku",
-            "product_code",
-            "product code",
-            "stok_kodu",
-            "stok kodu",
-            "kart_kodu",
-            "kart kodu",
-            "code",
-        ],
-    )
-    name_col = _pick_column(
-        fieldnames,
-        [
-            "name",
-            "item name",
-            "item_name",
-            "product name",
-            "product_name",
-            "stok_adi",
-            "stok adi",
-            "kart_adi",
-            "kart adi",
-            "description",
-        ],
-    )
+    return CsvStream(rows(), list(reader.fieldnames), encoding, dialect.delimiter)
+
+
+def scan_csv(path: Path, scan: Callable[[CsvStream], object], encoding: Optional[str] = None):
+    """Run `scan` once over a streamed CSV, in the encoding settle_encoding() picks.
+
+    The encoding is settled before `scan` sees a row, so a bad byte late in the
+    file cannot restart a scan whose on_row callbacks have already fired.
+    """
+    enc = settle_encoding(path, encoding)
+    try:
+        return scan(open_csv_stream(path, enc))
+    except OSError as e:
+        raise RuntimeError(f"Failed to read {path}: {e}") from e
 
-    issues: list[str] = []
+
+def read_csv_rows(path: Path) -> tuple[list[dict[str, str]], list[str], str, str]:
+    def scan(stream: CsvStream):
+        return list(stream.rows), stream.fieldnames, stream.encoding, stream.delimiter
+
+    return scan_csv(path, scan)
+
+
+@dataclass
+class ProductScan:
+    issues: IssueLog
+    rows: int = 0
+    encoding: str = ""
+    delimiter: str = ""
+    # Normalised SKU -> line of its first occurrence
+    skus: dict[str, int] = field(default_factory=dict)
+    critical: bool = False
+
+    def report(self) -> list[str]:
+        if self.critical:
+            return self.issues.head
+        return [f"[products] Read {self.rows} rows (encoding={self.encoding}, delimiter='{self.delimiter}')"] + self.issues.head
+
+    @property
+    def issue_count(self) -> int:
+        return self.issues.count + (0 if self.critical else 1)
+
+
+@dataclass
+class RecipeScan:
+    issues: IssueLog
+    rows: int = 0
+    encoding: str = ""
+    delimiter: str = ""
+    # Rows that passed validation and their distinct parent / component SKUs
+    parsed: int = 0
+    parents: set[str] = field(default_factory=set)
+    components: set[str] = field(default_factory=set)
+    critical: bool = False
+
+    def report(self) -> list[str]:
+        if self.critical:
+            return self.issues.head
+        return [f"[recipes] Read {self.rows} rows (encoding={self.encoding}, delimiter='{self.delimiter}')"] + self.issues.head
+
+    @property
+    def issue_count(self) -> int:
+        return self.issues.count + (0 if self.critical else 1)
+
+
+def _product_columns(fieldnames: list[str], result: ProductScan) -> Optional[tuple[str, str]]:
+    sku_col = _pick_column(fieldnames, PRODUCT_SKU_COLUMNS)
+    name_col = _pick_column(fieldnames, PRODUCT_NAME_COLUMNS)
     if not sku_col:
-        issues.append(f"[products] SKU column not found. Headers: {fieldnames}")
-        return [], issues
+        result.issues.append(f"[products] SKU column not found. Headers: {fieldnames}")
+        result.critical = True
+        return None
     if not name_col:
-        issues.append(f"[products] Name column not found. Headers: {fieldnames}")
-        return [], issues
+        result.issues.append(f"[products] Name column not found. Headers: {fieldnames}")
+        result.critical = True
+        return None
+    return sku_col, name_col
 
-    parsed: list[ProductRow] = []
-    seen: dict[str, int] = {}
 
-    for i, r in enumerate(rows, start=2):
-        sku_raw = r.get(sku_col, "")
-        sku = _norm_sku(sku_raw)
-        name = (r.get(name_col, "") or "").strip()
+def _recipe_columns(fieldnames: list[str], result: RecipeScan) -> Optional[tuple[str, str, str]]:
+    parent_col = _pick_column(fieldnames, RECIPE_PARENT_COLUMNS)
+    component_col = _pick_column(fieldnames, RECIPE_COMPONENT_COLUMNS)
+    qty_col = _pick_column(fieldnames, RECIPE_QTY_COLUMNS)
+    if not parent_col:
+        result.issues.append(f"[recipes] Parent SKU column not found. Headers: {fieldnames}")
+        result.critical = True
+        return None
+    if not component_col:
+        result.issues.append(f"[recipes] Component SKU column not found. Headers: {fieldnames}")
+        result.critical = True
+        return None
+    if not qty_col:
+        result.issues.append(f"[recipes] Quantity column not found. Headers: {fieldnames}")
+        result.critical = True
+        return None
+    return parent_col, component_col, qty_col
+
 
-        if not sku:
-            issues.append(f"[products] Line {i}: empty SKU")
-            continue
-        if not name:
-            issues.append(f"[products] Line {i}: empty Name for SKU={sku}")
-        if sku in seen:
-            issues.append(f"[products] Line {i}: duplicate SKU={sku} (first at line {seen[sku]})")
-        else:
-            seen[sku] = i
-        parsed.append(ProductRow(sku=sku, name=name))
+def scan_products(
+    path: Path,
+    issue_limit: Optional[int] = None,
+    on_row: Optional[Callable[[ProductRow], None]] = None,
+    encoding: Optional[str] = None,
+) -> ProductScan:
+    def scan(stream: CsvStream) -> ProductScan:
+        result = ProductScan(IssueLog(issue_limit), encoding=stream.encoding, delimiter=stream.delimiter)
+        cols = _product_columns(stream.fieldnames, result)
+        if cols is None:
+            return result
+        sku_col, name_col = cols
+        issues = result.issues
 
-    issues.insert(0, f"[products] Read {len(rows)} rows (encoding={encoding}, delimiter='{delim}')")
-    return parsed, issues
+        seen = result.skus
+        i = 1
+        for i, r in enumerate(stream.rows, start=2):
+            sku_raw = r.get(sku_col, "")
+            sku = _norm_sku(sku_raw)
+            name = (r.get(name_col, "") or "").strip()
 
+            if not sku:
+                issues.append(f"[products] Line {i}: empty SKU")
+                continue
+            if not name:
+                issues.append(f"[products] Line {i}: empty Name for SKU={sku}")
+            if sku in seen:
+                issues.append(f"[products] Line {i}: duplicate SKU={sku} (first at line {seen[sku]})")
+            else:
+                seen[sku] = i
+            if on_row is not None:
+                on_row(ProductRow(sku=sku, name=name))
+        result.rows = i - 1
+        return result
 
-def validate_recipes(path: Path) -> tuple[list[RecipeRow], list[str]]:
-    rows, fieldnames, encoding, delim = read_csv_rows(path)
-    parent_col = _pick_column(
-        fieldnames,
-        [
-            "parent_sku",
-            "product_sku",
-            "product sku",
-            "recipe_sku",
-            "recipe sku",
-            "sku",
-            "product",
-            "mamül",
-            "mamul",
-        ],
-    )
-    component_col = _pick_column(
-        fieldnames,
-        [
-            "component_sku",
-            "ingredient_sku",
-            "material_sku",
-            "child_sku",
-            "component sku",
-            "material sku",
-            "ingredient sku",
-            "bom_sku",
-            "bom sku",
-            "hammadde",
-            "malzeme",
-        ],
+    return scan_csv(path, scan, encoding)
+
+
+def scan_recipes(
+    path: Path,
+    issue_limit: Optional[int] = None,
+    on_row: Optional[Callable[[RecipeRow], None]] = None,
+    encoding: Optional[str] = None,
+) -> RecipeScan:
+    def scan(stream: CsvStream) -> RecipeScan:
+        result = RecipeScan(IssueLog(issue_limit), encoding=stream.encoding, delimiter=stream.delimiter)
+        cols = _recipe_columns(stream.fieldnames, result)
+        if cols is None:
+            return result
+        parent_col, component_col, qty_col = cols
+        issues = result.issues
+
+        i = 1
+        for i, r in enumerate(stream.rows, start=2):
+            parent = _norm_sku(r.get(parent_col, ""))
+            component = _norm_sku(r.get(component_col, ""))
+            qty_raw = r.get(qty_col, "")
+            qty = _parse_decimal(qty_raw)
+
+            if not parent:
+                issues.append(f"[recipes] Line {i}: empty parent SKU")
+                continue
+            if not component:
+                issues.append(f"[recipes] Line {i}: empty component SKU (parent={parent})")
+                continue
+            if parent == component:
+                issues.append(f"[recipes] Line {i}: parent SKU equals component SKU ({parent})")
+
+            if qty is None:
+                issues.append(f"[recipes] Line {i}: invalid qty '{qty_raw}' (parent={parent}, component={component})")
+                continue
+            if qty <= 0:
+                issues.append(f"[recipes] Line {i}: non-positive qty {qty} (parent={parent}, component={component})")
+
+            result.parsed += 1
+            result.parents.add(parent)
+            result.components.add(component)
+            if on_row is not None:
+                on_row(RecipeRow(parent_sku=parent, component_sku=component, qty=qty))
+        result.rows = i - 1
+        return result
+
+    return scan_csv(path, scan, encoding)
+
+
+# --- Columnar engine (pyarrow + numpy) ---------------------------------------
+#
+# Parses the whole file with Arrow's multi-threaded CSV reader and runs the row
+# checks as array operations; only the rows that end up in the report are
+# turned back into Python objects.  Columns are dictionary-encoded first, so SKU
+# normalisation and decimal parsing run once per distinct value and duplicates,
+# set differences and parent == component become integer-code operations.
+#
+# The results are the same as scan_products / scan_recipes: anything Arrow
+# would read differently from csv.DictReader over str.splitlines() (ragged
+# rows, line breaks other than CR/LF, a quote after skipped initial spaces,
+# duplicate headers) raises ColumnarUnsupported and the caller falls back to
+# the streaming engine.  Values are normalised by Arrow only where that is
+# identical to the Python code (ASCII SKUs, plain decimals); the rest go
+# through _norm_sku / _parse_decimal.
+
+ENGINES = ("auto", "python", "columnar")
+# RE2 class of the characters str.split() / str.strip() treat as whitespace
+_WHITESPACE_CLASS = r"[\t\n\x0b\x0c\r\x1c-\x1f \x{85}\x{a0}\x{1680}\x{2000}-\x{200a}\x{2028}\x{2029}\x{202f}\x{205f}\x{3000}]"
+# Decimals float() parses the same way after "," -> "." (no sign, spaces, exponents or grouping)
+_PLAIN_DECIMAL = r"^-?[0-9]+(?:[.,][0-9]+)?$"
+
+
+class ColumnarUnsupported(Exception):
+    """The file needs the streaming engine to be read exactly like csv.DictReader."""
+
+
+def columnar_available() -> bool:
+    return pa is not None
+
+
+def _contains_any(path: Path, needles: Iterable[bytes]) -> bool:
+    if path.stat().st_size == 0:
+        return False
+    with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return any(mm.find(needle) != -1 for needle in needles)
+
+
+def _encoded(chars: Iterable[str], encoding: str) -> list[bytes]:
+    # utf-8-sig would prefix every needle with a BOM
+    encoding = "utf-8" if encoding == "utf-8-sig" else encoding
+    found = []
+    for ch in chars:
+        try:
+            found.append(ch.encode(encoding))
+        except UnicodeEncodeError:
+            pass
+    return found
+
+
+def _read_header(path: Path, encoding: str) -> tuple[list[str], csv.Dialect]:
+    head = list(itertools.islice(_iter_lines(path, encoding), SNIFF_LINES))
+    dialect = _sniff_dialect("\n".join(head))
+    fieldnames = next(csv.reader(head, dialect=dialect), None)
+    if fieldnames is None:
+        raise RuntimeError(f"{path} appears to have no header row.")
+    return fieldnames, dialect
+
+
+def _read_table(path: Path, encoding: str, fieldnames: list[str], dialect: csv.Dialect):
+    if len(set(fieldnames)) != len(fieldnames):
+        raise ColumnarUnsupported(f"{path}: duplicate column names")
+    # splitlines() also breaks on \v, \f, \x1c-\x1e, NEL, LS and PS; Arrow only on CR/LF
+    if _contains_any(path, _encoded(_LINE_BREAKS - {"\n", "\r"}, encoding)):
+        raise ColumnarUnsupported(f"{path}: contains line breaks other than CR/LF")
+    # skipinitialspace only drops leading spaces (see _strip_initial_space) as long as no quote follows them
+    if dialect.skipinitialspace and dialect.quotechar and _contains_any(path, _encoded([" " + dialect.quotechar], encoding)):
+        raise ColumnarUnsupported(f"{path}: quoted field after spaces with skipinitialspace")
+    read_options = pa_csv.ReadOptions(encoding="utf8" if encoding.startswith("utf-8") else encoding)
+    parse_options = pa_csv.ParseOptions(
+        delimiter=dialect.delimiter,
+        quote_char=dialect.quotechar or False,
+        double_quote=dialect.doublequote,
+        escape_char=dialect.escapechar or False,
+        newlines_in_values=True,
+        ignore_empty_lines=True,
     )
-    qty_col = _pick_column(
-        fieldnames,
-        [
-            "qty",
-            "quantity",
-            "amount",
-            "miktar",
-            "quantity per",
-            "component_qty",
-            "component qty",
-        ],
+    # Every column is read as text so that invalid bytes anywhere fail the encoding, as in the Python engine
+    convert_options = pa_csv.ConvertOptions(
+        column_types={name: pa.string() for name in fieldnames},
+        strings_can_be_null=False,
+        quoted_strings_can_be_null=False,
     )
+    try:
+        table = pa_csv.read_csv(path, read_options=read_options, parse_options=parse_options, convert_options=convert_options)
+    except pa.ArrowInvalid as e:
+        if "invalid UTF8" in str(e):
+            raise UnicodeDecodeError(encoding, b"", 0, 0, str(e)) from e
+        raise ColumnarUnsupported(f"{path}: {e}") from e
+    if table.column_names != fieldnames:
+        raise ColumnarUnsupported(f"{path}: header parsed differently")
+    # The Python engine feeds csv lines without their line breaks, so a quoted
+    # field that spans lines comes out with the breaks dropped
+    for i, column in enumerate(table.columns):
+        if pc.any(pc.match_substring_regex(column, "[\r\n]")).as_py():
+            table = table.set_column(i, table.field(i), pc.replace_substring_regex(column, "[\r\n]", ""))
+    return table
 
-    issues: list[str] = []
-    if not parent_col:
-        issues.append(f"[recipes] Parent SKU column not found. Headers: {fieldnames}")
-        return [], issues
-    if not component_col:
-        issues.append(f"[recipes] Component SKU column not found. Headers: {fieldnames}")
-        return [], issues
-    if not qty_col:
-        issues.append(f"[recipes] Quantity column not found. Headers: {fieldnames}")
-        return [], issues
 
-    parsed: list[RecipeRow] = []
-    for i, r in enumerate(rows, start=2):
-        parent = _norm_sku(r.get(parent_col, ""))
-        component = _norm_sku(r.get(component_col, ""))
-        qty_raw = r.get(qty_col, "")
-        qty = _parse_decimal(qty_raw)
+def scan_csv_columnar(path: Path, scan: Callable, encoding: Optional[str] = None):
+    """Columnar counterpart of scan_csv: `scan(fieldnames, encoding, dialect, load)`.
 
-        if not parent:
-            issues.append(f"[recipes] Line {i}: empty parent SKU")
-            continue
-        if not component:
-            issues.append(f"[recipes] Line {i}: empty component SKU (parent={parent})")
+    `load()` returns the file as a pyarrow Table; it is only called once the
+    needed columns were found, so a missing column costs one header read.
+    """
+    last_err: Optional[Exception] = None
+    for enc in encoding_candidates(path, encoding):
+        try:
+            fieldnames, dialect = _read_header(path, enc)
+            return scan(fieldnames, enc, dialect, lambda: _read_table(path, enc, fieldnames, dialect))
+        except (UnicodeDecodeError, LookupError, OSError) as e:
+            last_err = e
+    raise RuntimeError(f"Failed to read {path} with known encodings: {last_err}")
+
+
+def _to_numpy(array) -> "np.ndarray":
+    return array.to_numpy(zero_copy_only=False)
+
+
+def _patch(array, mask: "np.ndarray", fix: Callable[[str], object]):
+    # Replace the values under `mask` with fix(value), computed in Python
+    idx = np.flatnonzero(mask)
+    if not len(idx):
+        return array
+    fixed = pa.array([fix(v) for v in array.take(pa.array(idx)).to_pylist()], type=array.type)
+    return pc.replace_with_mask(array, pa.array(mask), fixed)
+
+
+def _encode(*columns) -> tuple[object, list["np.ndarray"]]:
+    # One shared dictionary for all `columns` and the per-row codes of each;
+    # exports repeat the same SKUs and quantities, so the value checks below
+    # only run on the distinct values.
+    arrays = [c.combine_chunks() if isinstance(c, pa.ChunkedArray) else c for c in columns]
+    encoded = pc.dictionary_encode(pa.concat_arrays(arrays) if len(arrays) > 1 else arrays[0])
+    indices = _to_numpy(encoded.indices).astype(np.int64)
+    bounds = np.cumsum([len(a) for a in arrays])[:-1]
+    return encoded.dictionary, np.split(indices, bounds)
+
+
+def _norm_sku_dictionary(values):
+    upper = pc.ascii_upper(values)
+    collapsed = pc.replace_substring_regex(upper, _WHITESPACE_CLASS + "+", " ")
+    norm = pc.utf8_trim(collapsed, " ")
+    # str.upper() has its own rules outside ASCII
+    return _patch(norm, ~_to_numpy(pc.string_is_ascii(values)), _norm_sku)
+
+
+def _column_norm_sku(*columns) -> tuple[object, list["np.ndarray"]]:
+    """Normalised SKUs as (distinct values, per-row codes of each column)."""
+    raw, codes = _encode(*columns)
+    # Different raw spellings can normalise to the same SKU: re-encode
+    norm = pc.dictionary_encode(_norm_sku_dictionary(raw))
+    remap = _to_numpy(norm.indices).astype(np.int64)
+    return norm.dictionary, [remap[c] for c in codes]
+
+
+def _column_blank(column) -> "np.ndarray":
+    values, (codes,) = _encode(column)
+    return _to_numpy(pc.match_substring_regex(values, "^" + _WHITESPACE_CLASS + "*$"))[codes]
+
+
+def _column_decimal(column) -> tuple["np.ndarray", "np.ndarray"]:
+    # (values, valid) per row: valid is False where _parse_decimal returns None
+    distinct, (codes,) = _encode(column)
+    plain = _to_numpy(pc.match_substring_regex(distinct, _PLAIN_DECIMAL))
+    text = pc.if_else(pa.array(plain), pc.replace_substring(distinct, ",", "."), "0")
+    values = _to_numpy(pc.cast(text, pa.float64())).copy()
+    valid = plain.copy()
+    other = np.flatnonzero(~plain)
+    if len(other):
+        parsed = [_parse_decimal(v) for v in distinct.take(pa.array(other)).to_pylist()]
+        ok = np.array([q is not None for q in parsed], dtype=bool)
+        valid[other] = ok
+        values[other[ok]] = [q for q in parsed if q is not None]
+    return values[codes], valid[codes]
+
+
+def _first_rows(codes: "np.ndarray", valid: "np.ndarray", n_codes: int) -> tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """(first valid row of each row's code, distinct valid codes, their first rows)."""
+    rows = np.flatnonzero(valid)
+    first_of_code = np.full(n_codes, len(codes), dtype=np.int64)
+    np.minimum.at(first_of_code, codes[rows], rows)
+    uniq = np.flatnonzero(first_of_code < len(codes))
+    return first_of_code[codes], uniq, first_of_code[uniq]
+
+
+def _distinct(codes: "np.ndarray", n_codes: int) -> "np.ndarray":
+    present = np.zeros(n_codes, dtype=bool)
+    present[codes] = True
+    return np.flatnonzero(present)
+
+
+def _take(values, codes: "np.ndarray") -> list:
+    return values.take(pa.array(codes)).to_pylist()
+
+
+def _strip_initial_space(column, dialect: csv.Dialect):
+    # What csv's skipinitialspace does to an unquoted field
+    return pc.utf8_ltrim(column, " ") if dialect.skipinitialspace else column
+
+
+def _raw_text(value: str) -> str:
+    # csv.reader joins the lines of a multi-line field with "\n"; Arrow keeps the original break
+    return value.replace("\r\n", "\n").replace("\r", "\n") if "\r" in value else value
+
+
+def scan_products_columnar(path: Path, issue_limit: Optional[int] = None, encoding: Optional[str] = None) -> ProductScan:
+    def scan(fieldnames, encoding, dialect, load) -> ProductScan:
+        result = ProductScan(IssueLog(issue_limit), encoding=encoding, delimiter=dialect.delimiter)
+        cols = _product_columns(fieldnames, result)
+        if cols is None:
+            return result
+        table = load()
+        n = table.num_rows
+        skus, (codes,) = _column_norm_sku(table.column(cols[0]))
+        valid = ~_to_numpy(pc.equal(skus, ""))[codes]
+        empty_name = valid & _column_blank(table.column(cols[1]))
+        first_row, key_codes, key_rows = _first_rows(codes, valid, len(skus))
+        dup = valid & (first_row != np.arange(n))
+
+        result.rows = n
+        result.skus = dict(zip(_take(skus, key_codes), (key_rows + 2).tolist()))
+        issues = result.issues
+        flagged = np.flatnonzero(~valid | empty_name | dup)
+        if issues.limit is not None:
+            flagged = flagged[:issues.limit]
+        for row, value in zip(flagged.tolist(), _take(skus, codes[flagged])):
+            i = row + 2
+            if not valid[row]:
+                issues.append(f"[products] Line {i}: empty SKU")
+                continue
+            if empty_name[row]:
+                issues.append(f"[products] Line {i}: empty Name for SKU={value}")
+            if dup[row]:
+                issues.append(f"[products] Line {i}: duplicate SKU={value} (first at line {first_row[row] + 2})")
+        # Messages past the limit are only counted
+        issues.count = int((~valid).sum() + empty_name.sum() + dup.sum())
+        return result
+
+    return scan_csv_columnar(path, scan, encoding)
+
+
+def scan_recipes_columnar(
+    path: Path,
+    issue_limit: Optional[int] = None,
+    on_row: Optional[Callable[[RecipeRow], None]] = None,
+    encoding: Optional[str] = None,
+) -> RecipeScan:
+    def scan(fieldnames, encoding, dialect, load) -> RecipeScan:
+        result = RecipeScan(IssueLog(issue_limit), encoding=encoding, delimiter=dialect.delimiter)
+        cols = _recipe_columns(fieldnames, result)
+        if cols is None:
+            return result
+        table = load()
+        skus, (parent, component) = _column_norm_sku(table.column(cols[0]), table.column(cols[1]))
+        # SKUs are normalised anyway, only the quantity text is reported as read
+        qty_raw = _strip_initial_space(table.column(cols[2]).combine_chunks(), dialect)
+        qty, qty_ok = _column_decimal(qty_raw)
+
+        empty = _to_numpy(pc.equal(skus, ""))
+        empty_parent = empty[parent]
+        empty_component = ~empty_parent & empty[component]
+        ok = ~empty_parent & ~empty_component
+        same = ok & (parent == component)
+        invalid = ok & ~qty_ok
+        non_positive = ok & qty_ok & (qty <= 0)
+        parsed = ok & qty_ok
+
+        result.rows = table.num_rows
+        result.parsed = int(parsed.sum())
+        result.parents = set(_take(skus, _distinct(parent[parsed], len(skus))))
+        result.components = set(_take(skus, _distinct(component[parsed], len(skus))))
+
+        issues = result.issues
+        flagged = np.flatnonzero(empty_parent | empty_component | same | invalid | non_positive)
+        if issues.limit is not None:
+            flagged = flagged[:issues.limit]
+        rows = zip(flagged.tolist(), _take(skus, parent[flagged]), _take(skus, component[flagged]),
+                   qty_raw.take(pa.array(flagged)).to_pylist(), qty[flagged].tolist())
+        for row, p, c, raw, q in rows:
+            i = row + 2
+            if empty_parent[row]:
+                issues.append(f"[recipes] Line {i}: empty parent SKU")
+                continue
+            if empty_component[row]:
+                issues.append(f"[recipes] Line {i}: empty component SKU (parent={p})")
+                continue
+            if same[row]:
+                issues.append(f"[recipes] Line {i}: parent SKU equals component SKU ({p})")
+            if invalid[row]:
+                issues.append(f"[recipes] Line {i}: invalid qty '{_raw_text(raw)}' (parent={p}, component={c})")
+                continue
+            if non_positive[row]:
+                issues.append(f"[recipes] Line {i}: non-positive qty {q} (parent={p}, component={c})")
+        issues.count = int(empty_parent.sum() + empty_component.sum() + same.sum() + invalid.sum() + non_positive.sum())
+        if on_row is not None:
+            for p, c, q in zip(_take(skus, parent[parsed]), _take(skus, component[parsed]), qty[parsed].tolist()):
+                on_row(RecipeRow(parent_sku=p, component_sku=c, qty=q))
+        return result
+
+    return scan_csv_columnar(path, scan, encoding)
+
+
+def run_scan(engine: str, path: Path, columnar: Callable, streaming: Callable, **kwargs):
+    if engine == "columnar" or (engine == "auto" and columnar_available()):
+        if not columnar_available():
+            raise RuntimeError("--engine columnar needs numpy and pyarrow")
+        try:
+            return columnar(path, **kwargs)
+        except ColumnarUnsupported as e:
+            print(f"[engine] {e}; using the streaming engine", file=sys.stderr)
+    return streaming(path, **kwargs)
+
+
+# --- Parallel streaming engine (--jobs N) -------------------------------------
+#
+# The file is cut into byte ranges at record boundaries and each range is
+# parsed by a worker process with the streaming parser.  Checks that only need
+# the row itself are done in the worker; SKUs are routed to shards by a stable
+# hash, and duplicate SKUs and missing parents / components are resolved per
+# shard in a second round of tasks.  Issues carry their row number so the merged
+# report is in the same line order as a serial run.  A file that cannot be cut
+# safely (see _quoted_spans) is parsed as a single range.
+
+SHARD_FACTOR = 4
+# Order of a duplicate-SKU issue among the issues of its row (after the row's own ones)
+DUPLICATE_SEQ = 9
+_DIALECT_FIELDS = ("delimiter", "quotechar", "escapechar", "doublequote", "skipinitialspace", "quoting")
+
+
+def _product_row_issues(sku: str, name: str) -> list[str]:
+    # Checks of one product row on its own, without the "[products] Line N: " prefix
+    if not sku:
+        return ["empty SKU"]
+    return [] if name else [f"empty Name for SKU={sku}"]
+
+
+def _recipe_row_issues(parent: str, component: str, qty_raw: str) -> tuple[list[str], Optional[float]]:
+    # Checks of one recipe row on its own; the qty is None unless the row counts as parsed
+    if not parent:
+        return ["empty parent SKU"], None
+    if not component:
+        return [f"empty component SKU (parent={parent})"], None
+    issues = []
+    if parent == component:
+        issues.append(f"parent SKU equals component SKU ({parent})")
+    qty = _parse_decimal(qty_raw)
+    if qty is None:
+        issues.append(f"invalid qty '{qty_raw}' (parent={parent}, component={component})")
+    elif qty <= 0:
+        issues.append(f"non-positive qty {qty} (parent={parent}, component={component})")
+    return issues, qty
+
+
+def _shard_of(sku: str, shards: int) -> int:
+    # str hashes are salted per process; crc32 routes the same SKU to the same shard in every worker
+    return zlib.crc32(sku.encode("utf-8", "surrogatepass")) % shards
+
+
+def _dialect_params(dialect: csv.Dialect) -> dict:
+    # Sniffed dialects are classes built on the fly and cannot be pickled
+    return {name: getattr(dialect, name) for name in _DIALECT_FIELDS}
+
+
+def _quoted_spans(
+    mm: "mmap.mmap | bytes", dialect: csv.Dialect, keep: bool = True
+) -> Optional[list[tuple[int, int]]]:
+    """Byte spans of the quoted fields, or None if quotes are not used the regular way.
+
+    Regular means every quote either opens a field, closes it right before a
+    delimiter / line break, or is doubled inside it; that is when the csv
+    module and this scan agree on where the quoted fields are.  With `keep`
+    False only the check is made and the list comes back empty.
+    """
+    quote = dialect.quotechar.encode("latin-1")
+    delim = dialect.delimiter.encode("latin-1")
+    q = re.escape(quote)
+    quoted_field = re.compile(q + b"[^" + q + b"]*(?:" + q + q + b"[^" + q + b"]*)*" + q)
+    boundary = delim + b"\r\n"
+    spans: list[tuple[int, int]] = []
+    prev = 0
+    for m in quoted_field.finditer(mm):
+        start, end = m.span()
+        if mm.find(quote, prev, start) != -1:
+            return None  # an unterminated quote was skipped over
+        lead = start
+        if dialect.skipinitialspace:
+            while lead > prev and mm[lead - 1:lead] == b" ":
+                lead -= 1
+        if lead > 0 and mm[lead - 1:lead] not in boundary:
+            return None
+        if end < len(mm) and mm[end:end + 1] not in boundary:
+            return None
+        if keep:
+            spans.append((start, end))
+        prev = end
+    if mm.find(quote, prev) != -1:
+        return None
+    return spans
+
+
+def _split_ranges(path: Path, parts: int, dialect: csv.Dialect) -> list[tuple[int, int]]:
+    """About `parts` byte ranges, each starting right after a "\n" outside any quoted field.
+
+    Files with an escape character or irregular quoting are not cut at all.
+    """
+    size = path.stat().st_size
+    if parts <= 1 or size == 0:
+        return [(0, size)]
+    quote = (dialect.quotechar or "").encode("latin-1", "replace")
+    with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        spans: list[tuple[int, int]] = []
+        if quote and mm.find(quote) != -1:
+            if dialect.escapechar or len(quote) != 1 or len(dialect.delimiter.encode("latin-1", "replace")) != 1:
+                return [(0, size)]
+            found = _quoted_spans(mm, dialect)
+            if found is None:
+                return [(0, size)]
+            spans = found
+        starts = [start for start, _ in spans]
+        cuts = [0]
+        for k in range(1, parts):
+            pos = max(size * k // parts, cuts[-1])
+            while True:
+                nl = mm.find(b"\n", pos)
+                if nl == -1:
+                    break
+                i = bisect.bisect_right(starts, nl) - 1
+                if i < 0 or spans[i][1] <= nl:
+                    break
+                pos = spans[i][1]  # the "\n" is inside a quoted field
+            if nl == -1 or nl + 1 >= size:
+                break
+            if nl + 1 > cuts[-1]:
+                cuts.append(nl + 1)
+    cuts.append(size)
+    return list(zip(cuts, cuts[1:]))
+
+
+class _Top:
+    """The `limit` smallest (row, seq, text) issues seen, plus a count of all of them."""
+
+    def __init__(self, limit: Optional[int]) -> None:
+        self.limit = limit
+        self.items: list[tuple[int, int, str]] = []
+        self.count = 0
+
+    def add(self, row: int, seq: int, text: str) -> None:
+        self.count += 1
+        if self.limit is None or len(self.items) < self.limit:
+            self.items.append((row, seq, text))
+            if len(self.items) == self.limit:
+                self.items.sort()
+        elif (row, seq) < self.items[-1][:2]:
+            # Shard tasks see rows out of order, so a later one may still make the cut
+            self.items[-1] = (row, seq, text)
+            self.items.sort()
+
+
+def _piece_rows(path: Path, encoding: str, rng: tuple[int, int], fieldnames: Optional[list[str]], params: dict):
+    lines = _iter_lines(path, encoding, start=rng[0], end=rng[1])
+    # The first range still holds the header line
+    reader = csv.DictReader(lines, fieldnames=fieldnames, **params)
+    for row in reader:
+        yield {k: (v if v is not None else "") for k, v in row.items() if k is not None}
+
+
+def _products_piece(task) -> dict:
+    path, encoding, rng, fieldnames, params, (sku_col, name_col), shards, limit, _ = task
+    issues = _Top(limit)
+    # Per shard: SKU -> [first row, further occurrences, first `limit` further rows]
+    by_shard: list[dict[str, list]] = [{} for _ in range(shards)]
+    n = 0
+    for n, r in enumerate(_piece_rows(path, encoding, rng, fieldnames, params), start=1):
+        row = n - 1
+        sku = _norm_sku(r.get(sku_col, ""))
+        for seq, text in enumerate(_product_row_issues(sku, (r.get(name_col, "") or "").strip())):
+            issues.add(row, seq, text)
+        if not sku:
             continue
-        if parent == component:
-            issues.append(f"[recipes] Line {i}: parent SKU equals component SKU ({parent})")
+        seen = by_shard[_shard_of(sku, shards)]
+        entry = seen.get(sku)
+        if entry is None:
+            seen[sku] = [row, 0, []]
+        else:
+            entry[1] += 1
+            if limit is None or len(entry[2]) < limit:
+                entry[2].append(row)
+    return {"rows": n, "issues": issues, "shards": by_shard}
 
+
+def _products_shard(task) -> tuple[dict[str, int], _Top]:
+    # Merge one shard of every range (in file order): the first occurrence of a
+    # SKU wins, every other one is a duplicate
+    pieces, offsets, limit = task
+    first: dict[str, int] = {}
+    dups = _Top(limit)
+    for seen, offset in zip(pieces, offsets):
+        for sku, (row, extra, rows) in seen.items():
+            known = first.get(sku)
+            if known is None:
+                first[sku] = row + offset
+            else:
+                dups.add(row + offset, DUPLICATE_SEQ, f"duplicate SKU={sku} (first at line {known + 2})")
+            line = first[sku] + 2
+            for later in rows:
+                dups.add(later + offset, DUPLICATE_SEQ, f"duplicate SKU={sku} (first at line {line})")
+            dups.count += extra - len(rows)
+    return first, dups
+
+
+def _recipes_piece(task) -> dict:
+    path, encoding, rng, fieldnames, params, (parent_col, component_col, qty_col), shards, limit, keep_rows = task
+    issues = _Top(limit)
+    parents: list[set[str]] = [set() for _ in range(shards)]
+    components: list[set[str]] = [set() for _ in range(shards)]
+    edges: list[tuple[str, str, float]] = []
+    n = parsed = 0
+    for n, r in enumerate(_piece_rows(path, encoding, rng, fieldnames, params), start=1):
+        row = n - 1
+        parent = _norm_sku(r.get(parent_col, ""))
+        component = _norm_sku(r.get(component_col, ""))
+        row_issues, qty = _recipe_row_issues(parent, component, r.get(qty_col, ""))
+        for seq, text in enumerate(row_issues):
+            issues.add(row, seq, text)
         if qty is None:
-            issues.append(f"[recipes] Line {i}: invalid qty '{qty_raw}' (parent={parent}, component={component})")
             continue
-        if qty <= 0:
-            issues.append(f"[recipes] Line {i}: non-positive qty {qty} (parent={parent}, component={component})")
+        parsed += 1
+        parents[_shard_of(parent, shards)].add(parent)
+        components[_shard_of(component, shards)].add(component)
+        if keep_rows:
+            edges.append((parent, component, qty))
+    return {"rows": n, "parsed": parsed, "issues": issues, "parents": parents, "components": components, "edges": edges}
+
+
+def _missing_shard(task) -> tuple[list[str], list[str]]:
+    product_skus, parent_sets, component_sets = task
+    parents = set().union(*parent_sets)
+    components = set().union(*component_sets)
+    return sorted(parents - product_skus), sorted(components - product_skus)
+
+
+def _run_pieces(
+    pool, path: Path, worker, columns_of, result, jobs: int, shards: int, limit: Optional[int], keep_rows: bool = False,
+    encoding: Optional[str] = None,
+):
+    """Parse `path` in ranges with `worker`; returns the piece results or None if a column is missing.
+
+    Tries the encodings in order like scan_csv: a range that does not decode
+    fails the whole attempt.
+    """
+    last_err: Optional[Exception] = None
+    for enc in encoding_candidates(path, encoding):
+        try:
+            fieldnames, dialect = _read_header(path, enc)
+            result.encoding, result.delimiter = enc, dialect.delimiter
+            cols = columns_of(fieldnames, result)
+            if cols is None:
+                return None
+            params = _dialect_params(dialect)
+            ranges = _split_ranges(path, jobs * 2, dialect)
+            tasks = [(path, enc, rng, None if k == 0 else fieldnames, params, cols, shards, limit, keep_rows)
+                     for k, rng in enumerate(ranges)]
+            return list(pool.map(worker, tasks))
+        except (UnicodeDecodeError, LookupError, OSError) as e:
+            last_err = e
+    raise RuntimeError(f"Failed to read {path} with known encodings: {last_err}")
+
+
+def _merge_issues(log: IssueLog, scope: str, tops: list[tuple[_Top, int]]) -> None:
+    # Shift every (issues, row offset) to file rows and keep the first ones overall
+    streams = [sorted((row + offset, seq, text) for row, seq, text in top.items) for top, offset in tops]
+    for row, _, text in itertools.islice(heapq.merge(*streams), log.limit):
+        log.append(f"[{scope}] Line {row + 2}: {text}")
+    log.count = sum(top.count for top, _ in tops)
+
+
+def validate_parallel(
+    products_path: Path,
+    recipes_path: Path,
+    jobs: int,
+    issue_limit: Optional[int] = None,
+    on_recipe_row: Optional[Callable[[RecipeRow], None]] = None,
+    encoding: Optional[str] = None,
+) -> tuple[ProductScan, RecipeScan, list[str], list[str]]:
+    """Validate both files with `jobs` worker processes.
+
+    Returns the two scans and the sorted missing parents / components, i.e.
+    what main() derives from scan_products + scan_recipes.  `on_recipe_row`
+    gets the parsed recipe rows in file order once all ranges are done.
+    """
+    shards = jobs * SHARD_FACTOR
+    products = ProductScan(IssueLog(issue_limit))
+    recipes = RecipeScan(IssueLog(issue_limit))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        prod_pieces = _run_pieces(pool, products_path, _products_piece, _product_columns, products, jobs, shards, issue_limit,
+                                  encoding=encoding)
+        rec_pieces = _run_pieces(pool, recipes_path, _recipes_piece, _recipe_columns, recipes, jobs, shards, issue_limit,
+                                 keep_rows=on_recipe_row is not None, encoding=encoding)
+
+        shard_skus: list[dict[str, int]] = [{} for _ in range(shards)]
+        if prod_pieces is not None:
+            offsets = list(itertools.accumulate([p["rows"] for p in prod_pieces], initial=0))[:-1]
+            shard_tasks = [([p["shards"][s] for p in prod_pieces], offsets, issue_limit) for s in range(shards)]
+            merged = list(pool.map(_products_shard, shard_tasks))
+            shard_skus = [first for first, _ in merged]
+            products.rows = sum(p["rows"] for p in prod_pieces)
+            for first in shard_skus:
+                products.skus.update((sku, row + 2) for sku, row in first.items())
+            _merge_issues(products.issues, "products",
+                          [(p["issues"], off) for p, off in zip(prod_pieces, offsets)] + [(dups, 0) for _, dups in merged])
+
+        missing_parents: list[str] = []
+        missing_components: list[str] = []
+        if rec_pieces is not None:
+            offsets = list(itertools.accumulate([p["rows"] for p in rec_pieces], initial=0))[:-1]
+            recipes.rows = sum(p["rows"] for p in rec_pieces)
+            recipes.parsed = sum(p["parsed"] for p in rec_pieces)
+            _merge_issues(recipes.issues, "recipes", [(p["issues"], off) for p, off in zip(rec_pieces, offsets)])
+            missing_tasks = [(set(shard_skus[s]), [p["parents"][s] for p in rec_pieces],
+                              [p["components"][s] for p in rec_pieces]) for s in range(shards)]
+            for parents, components in pool.map(_missing_shard, missing_tasks):
+                missing_parents.extend(parents)
+                missing_components.extend(components)
+            for p in rec_pieces:
+                for s in range(shards):
+                    recipes.parents |= p["parents"][s]
+                    recipes.components |= p["components"][s]
+                if on_recipe_row is not None:
+                    for parent, component, qty in p["edges"]:
+                        on_recipe_row(RecipeRow(parent_sku=parent, component_sku=component, qty=qty))
+    return products, recipes, sorted(missing_parents), sorted(missing_components)
+
+
+# --- BOM graph -------------------------------------------------------------------
+#
+# parent == component is caught per row; a cycle through two or more recipes,
+# or a chain deeper than the manufacturing-order sync can follow, only shows
+# on the whole graph.  Everything here is linear in SKUs + recipe rows except
+# explode(), which costs about the size of the breakdowns it builds.
+
+MAX_BOM_DEPTH = 10
+REPORT_SAMPLES = 10
+
+
+class BomGraph:
+    """Adjacency index over parsed recipe rows; add() is an on_row callback for the scans.
+
+    SKUs are numbered in order of appearance.  A parent listed twice with the
+    same component keeps both rows, so their quantities add up in explode().
+    """
+
+    def __init__(self) -> None:
+        self.skus: list[str] = []
+        self.index: dict[str, int] = {}
+        self.children: list[list[int]] = []
+        self.qtys: list[list[float]] = []
+        self.edges = 0
+        self._memo: dict[int, Optional[dict[int, float]]] = {}
+        self._memo_edges = 0
+
+    def _node(self, sku: str) -> int:
+        node = self.index[sku] = len(self.skus)
+        self.skus.append(sku)
+        self.children.append([])
+        self.qtys.append([])
+        return node
+
+    def add(self, row: RecipeRow) -> None:
+        self.add_edge(row.parent_sku, row.component_sku, row.qty)
+
+    def add_edge(self, parent_sku: str, component_sku: str, qty: float, count: int = 1) -> None:
+        # `count` identical rows at once
+        index = self.index
+        parent = index.get(parent_sku)
+        if parent is None:
+            parent = self._node(parent_sku)
+        component = index.get(component_sku)
+        if component is None:
+            component = self._node(component_sku)
+        self.children[parent].append(component)
+        self.qtys[parent].append(qty * count)
+        self.edges += count
+
+    def strongly_connected(self) -> list[list[int]]:
+        """Strongly connected components, components before their parents (iterative Tarjan)."""
+        n = len(self.skus)
+        index = [-1] * n
+        low = [0] * n
+        on_stack = [False] * n
+        stack: list[int] = []
+        result: list[list[int]] = []
+        counter = 0
+        for root in range(n):
+            if index[root] != -1:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            work = [(root, 0)]
+            while work:
+                node, i = work[-1]
+                kids = self.children[node]
+                if i < len(kids):
+                    work[-1] = (node, i + 1)
+                    kid = kids[i]
+                    if index[kid] == -1:
+                        index[kid] = low[kid] = counter
+                        counter += 1
+                        stack.append(kid)
+                        on_stack[kid] = True
+                        work.append((kid, 0))
+                    elif on_stack[kid] and index[kid] < low[node]:
+                        low[node] = index[kid]
+                    continue
+                work.pop()
+                if work:
+                    up = work[-1][0]
+                    if low[node] < low[up]:
+                        low[up] = low[node]
+                if low[node] == index[node]:
+                    scc = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        scc.append(member)
+                        if member == node:
+                            break
+                    result.append(scc)
+        return result
+
+    def _cycle_path(self, scc: list[int]) -> list[str]:
+        # One cycle through the smallest SKU of the component: BFS inside it back
+        # to the start, components in SKU order so the path does not depend on row order
+        members = set(scc)
+        start = min(scc, key=self.skus.__getitem__)
+        came_from = {start: start}
+        queue = [start]
+        for node in queue:
+            for kid in sorted(set(self.children[node]), key=self.skus.__getitem__):
+                if kid == start:
+                    path = [node]
+                    while path[-1] != start:
+                        path.append(came_from[path[-1]])
+                    return [self.skus[v] for v in reversed(path)] + [self.skus[start]]
+                if kid in members and kid not in came_from:
+                    came_from[kid] = node
+                    queue.append(kid)
+        return [self.skus[start]]
+
+    def analyse(self) -> "BomReport":
+        n = len(self.skus)
+        report = BomReport(skus=n, edges=self.edges)
+        depth: list[Optional[int]] = [0] * n
+        for scc in self.strongly_connected():
+            cyclic = len(scc) > 1 or scc[0] in self.children[scc[0]]
+            if cyclic:
+                report.cycles.append(self._cycle_path(scc))
+                report.cyclic_skus += len(scc)
+            for node in scc:
+                kids = self.children[node]
+                if cyclic or any(depth[kid] is None for kid in kids):
+                    # In a cycle or above one: no finite depth
+                    depth[node] = None
+                elif kids:
+                    depth[node] = 1 + max(depth[kid] for kid in kids)
+        report.cycles.sort()
+        for node, kids in enumerate(self.children):
+            if not kids:
+                continue
+            report.parents += 1
+            fan_out = len(set(kids))
+            sku = self.skus[node]
+            report.per_parent[sku] = (depth[node], fan_out)
+            # Ties go to the smallest SKU, whatever order the rows came in
+            if (-fan_out, sku) < (-report.max_fan_out[0], report.max_fan_out[1]):
+                report.max_fan_out = (fan_out, sku)
+            d = depth[node]
+            if d is not None and (-d, sku) < (-report.max_depth[0], report.max_depth[1]):
+                report.max_depth = (d, sku)
+        return report
+
+    def finished(self) -> list[str]:
+        """Parents that are no other recipe's component, sorted."""
+        used = [False] * len(self.skus)
+        for kids in self.children:
+            for kid in kids:
+                used[kid] = True
+        return sorted(sku for node, sku in enumerate(self.skus) if self.children[node] and not used[node])
+
+    def explode(self, sku: str) -> Optional[dict[str, float]]:
+        """Total quantity of every raw material (SKU without a recipe) in one `sku`.
+
+        Breakdowns of intermediate SKUs are memoised, so exploding every
+        finished SKU computes each sub-assembly once.  None if `sku` reaches a
+        cycle; a SKU without a recipe is its own raw material.
+        """
+        root = self.index.get(sku)
+        if root is None:
+            return {sku: 1.0}
+        if self._memo_edges != self.edges:
+            self._memo.clear()
+            self._memo_edges = self.edges
+        memo = self._memo
+        if root not in memo:
+            # Post-order walk; a node on the current path seen again is a cycle
+            on_path = set()
+            work = [(root, False)]
+            while work:
+                node, done = work.pop()
+                if done:
+                    on_path.discard(node)
+                    kids = self.children[node]
+                    if not kids:
+                        memo[node] = {node: 1.0}
+                        continue
+                    if any(memo[kid] is None for kid in kids):
+                        memo[node] = None
+                        continue
+                    total: dict[int, float] = {}
+                    for kid, qty in zip(kids, self.qtys[node]):
+                        for raw, per in memo[kid].items():
+                            total[raw] = total.get(raw, 0.0) + qty * per
+                    memo[node] = total
+                    continue
+                if node in memo:
+                    continue
+                kids = self.children[node]
+                if node in kids or any(kid in on_path for kid in kids):
+                    memo[node] = None
+                    continue
+                on_path.add(node)
+                work.append((node, True))
+                work.extend((kid, False) for kid in kids if kid not in memo)
+        total = memo[root]
+        if total is None:
+            return None
+        return {self.skus[raw]: qty for raw, qty in total.items()}
+
+
+@dataclass
+class BomReport:
+    skus: int
+    edges: int
+    parents: int = 0
+    # One cycle per strongly connected component (self-loops included), as SKU paths
+    cycles: list[list[str]] = field(default_factory=list)
+    cyclic_skus: int = 0
+    # (value, SKU); depth counts levels down to the raw materials, None when a cycle is reachable
+    max_depth: tuple[int, str] = (0, "")
+    max_fan_out: tuple[int, str] = (0, "")
+    per_parent: dict[str, tuple[Optional[int], int]] = field(default_factory=dict)
+
+    def too_deep(self, limit: int) -> list[tuple[int, str]]:
+        return sorted(((d, sku) for sku, (d, _) in self.per_parent.items() if d is not None and d > limit),
+                      key=lambda item: (-item[0], item[1]))
+
+
+@dataclass
+class Validation:
+    """Everything main() reports on a products + recipes pair."""
+
+    products: ProductScan
+    recipes: RecipeScan
+    unique_products: int
+    missing_parents: list[str]
+    missing_components: list[str]
+    graph: BomGraph
+    _bom: Optional[BomReport] = field(default=None, repr=False)
+
+    @property
+    def bom(self) -> BomReport:
+        if self._bom is None:
+            self._bom = self.graph.analyse()
+        return self._bom
+
+    def summary(self) -> tuple:
+        # What a run prints, for comparing two runs
+        return (self.products.report(), self.products.issue_count, self.recipes.report(), self.recipes.issue_count,
+                self.recipes.parsed, self.unique_products, self.missing_parents, self.missing_components, self.bom)
+
+
+# --- Incremental manifest (--manifest) -------------------------------------------
+#
+# The CSVs are re-exported daily with few rows changed.  The manifest (SQLite)
+# keeps the content hash of every row of both files, in order, and the checked
+# state of each distinct row (for recipes that is also the BOM edge it adds);
+# across the files it keeps per-SKU counts.  A run streams the files record by
+# record over their raw bytes and keeps only the hashes, parses and checks only
+# rows whose content is new (in batches, straight into the manifest), and
+# updates the counts with the rows that were added or removed, found by a merge
+# of the sorted old and new hashes.  The issue list is then rebuilt by walking
+# the rows from the top until it is full.
+#
+# A file whose records cannot be found on its bytes (irregular quoting, an
+# escape character, line breaks other than CR/LF) raises ManifestUnsupported.
+
+MANIFEST_VERSION = 1
+ROW_HASH_SIZE = 8
+_RECORD_SPLIT = re.compile(rb"(\r\n|\r|\n)")
+_LOOKUP_BATCH = 500
+# Quantities are stored as repr() text: SQLite would turn a NaN REAL into NULL.
+# Issue texts never contain a line break (rows are read line by line), so a
+# row's issues are stored joined by "\n".
+# Past this many changed rows the sku table is read whole instead of per key
+_PRELOAD_CHANGES = 20000
+# New rows parsed and stored at a time
+_PARSE_BATCH = 10000
+
+_MANIFEST_SCHEMA = """
+CREATE TABLE IF NOT EXISTS file (role TEXT PRIMARY KEY, meta TEXT NOT NULL, hashes BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS row (
+    role TEXT NOT NULL, hash BLOB NOT NULL, count INTEGER NOT NULL,
+    sku TEXT NOT NULL, component TEXT, qty TEXT, issues TEXT NOT NULL,
+    PRIMARY KEY (role, hash)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sku (
+    sku TEXT PRIMARY KEY, products INTEGER NOT NULL, parents INTEGER NOT NULL, components INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
 
-        parsed.append(RecipeRow(parent_sku=parent, component_sku=component, qty=qty))
 
-    issues.insert(0, f"[recipes] Read {len(rows)} rows (encoding={encoding}, delimiter='{delim}')")
-    return parsed, issues
+class ManifestUnsupported(Exception):
+    pass
+
+
+@dataclass
+class _FileRows:
+    """One CSV as the manifest sees it: its identity (what row states depend on) and the row hashes."""
+
+    role: str
+    path: Path
+    result: object  # ProductScan / RecipeScan, with the column issues if any
+    identity: dict
+    # ROW_HASH_SIZE bytes per row, in line order
+    hashes: bytes = b""
+    body_encoding: str = ""
+    fieldnames: list[str] = field(default_factory=list)
+    params: dict = field(default_factory=dict)
+    columns: tuple = ()
+    # The quote character when quoted fields may hold line breaks
+    quote: bytes = b""
+
+    @property
+    def count(self) -> int:
+        return len(self.hashes) // ROW_HASH_SIZE
+
+
+def _chunk_end(mm: "mmap.mmap | bytes", pos: int, size: int) -> int:
+    # Just past the last line break within STREAM_CHUNK bytes of `pos` (further if there is none), or the end
+    window = STREAM_CHUNK
+    while pos + window < size:
+        end = pos + window
+        cut = mm.rfind(b"\n", pos, end)
+        if cut == -1:
+            # A "\r" in the last byte may be the first half of a "\r\n"
+            cut = mm.rfind(b"\r", pos, end - 1)
+        if cut != -1:
+            return cut + 1
+        window *= 2
+    return size
+
+
+def _iter_records(mm: "mmap.mmap | bytes", quote: bytes) -> Iterator[bytes]:
+    # The records of a mapped file, split STREAM_CHUNK bytes at a time.  CR, LF
+    # and CRLF end a record unless they are inside a quoted field; with regular
+    # quoting (see _quoted_spans) a break is inside one exactly when an odd
+    # number of quotes precedes it in the record.
+    size = len(mm)
+    pos = 0
+    partial = last = b""
+    while pos < size:
+        end = _chunk_end(mm, pos, size)
+        # record, break, record, ..., break, rest (empty unless the file ends without a break)
+        parts = _RECORD_SPLIT.split(mm[pos:end])
+        pos = end
+        last = parts.pop()
+        for i in range(0, len(parts), 2):
+            record = partial + parts[i] if partial else parts[i]
+            if quote and record.count(quote) % 2:
+                partial = record + parts[i + 1]
+                continue
+            partial = b""
+            yield record
+    yield partial + last
+
+
+def _sorted_hashes(blob: "bytes | bytearray") -> array:
+    # The row hashes as big-endian integers, sorted: integer order is the key order of the row table
+    values = array("Q")
+    values.frombytes(blob)
+    if sys.byteorder == "little":
+        values.byteswap()
+    return array("Q", sorted(values))
+
+
+def _hash_bytes(value: int) -> bytes:
+    return value.to_bytes(ROW_HASH_SIZE, "big")
+
+
+def _open_file_rows(path: Path, role: str, result, columns_of, encoding: Optional[str] = None) -> _FileRows:
+    enc = settle_encoding(path, encoding)
+    fieldnames, dialect = _read_header(path, enc)
+    result.encoding, result.delimiter = enc, dialect.delimiter
+    cols = columns_of(fieldnames, result)
+    params = _dialect_params(dialect)
+    rows = _FileRows(role, path, result, {
+        "version": MANIFEST_VERSION, "encoding": enc, "fieldnames": fieldnames, "dialect": params,
+        "columns": list(cols) if cols else None,
+    })
+    if cols is None:
+        return rows
+    if _contains_any(path, _encoded(_LINE_BREAKS - {"\n", "\r"}, enc)):
+        raise ManifestUnsupported(f"{path}: contains line breaks other than CR/LF")
+    quote = (dialect.quotechar or "").encode("latin-1", "replace")
+    if quote and _contains_any(path, [quote]):
+        if dialect.escapechar or len(quote) != 1 or len(dialect.delimiter.encode("latin-1", "replace")) != 1:
+            raise ManifestUnsupported("quoted fields with an escape character")
+        with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if _quoted_spans(mm, dialect, keep=False) is None:
+                raise ManifestUnsupported("quotes inside unquoted fields")
+        rows.quote = quote
+    # A BOM is only stripped at the start of the file
+    rows.body_encoding = "utf-8" if enc == "utf-8-sig" else enc
+    rows.fieldnames, rows.params, rows.columns = fieldnames, params, cols
+    return rows
+
+
+def _hash_rows(rows: _FileRows) -> None:
+    # rows.hashes for every non-blank record after the header, read through a map
+    with rows.path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        records = _iter_records(mm, rows.quote)
+        header = next(records)
+        # The header is the first record; DictReader skips blank lines after it
+        if not header or next(csv.reader(header.decode(rows.identity["encoding"]).splitlines(), **rows.params),
+                              None) != rows.fieldnames:
+            raise ManifestUnsupported(f"{rows.path}: header is not the first line")
+        hashes = bytearray()
+        for record in records:
+            if record:
+                hashes += hashlib.blake2b(record, digest_size=ROW_HASH_SIZE).digest()
+    rows.hashes = bytes(hashes)
+
+
+def _store_new_rows(
+    con: sqlite3.Connection, rows: _FileRows, fresh: Optional[set[bytes]], meta: dict, counts: _SkuCounts
+) -> None:
+    """Parse and add the rows whose content hash is in `fresh` (every row if None), i.e. is new to the manifest.
+
+    The file is read again record by record and rows are parsed _PARSE_BATCH
+    contents at a time, so only one batch of records is held.  A content seen
+    in an earlier batch is parsed again and adds to its count.
+    """
+    pending: dict[bytes, bytes] = {}
+    occurrences: Counter = Counter()
+
+    def store() -> None:
+        upserts = []
+        for (h, record), state in zip(pending.items(), _row_states(rows, pending.values())):
+            sku, component, qty, issues = state
+            _apply_delta(rows.role, state, occurrences[h], meta, counts)
+            upserts.append((rows.role, h, occurrences[h], sku, component, None if qty is None else repr(qty),
+                            "\n".join(issues)))
+        # In key order, so the B-tree is appended to rather than split all over
+        con.executemany("INSERT INTO row VALUES (?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT (role, hash) DO UPDATE SET count = count + excluded.count", sorted(upserts))
+        pending.clear()
+        occurrences.clear()
+
+    hashes = rows.hashes
+    k = 0
+    with rows.path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        records = _iter_records(mm, rows.quote)
+        next(records)
+        for record in records:
+            if not record:
+                continue
+            h = hashes[k:k + ROW_HASH_SIZE]
+            k += ROW_HASH_SIZE
+            if fresh is not None and h not in fresh:
+                continue
+            occurrences[h] += 1
+            if h not in pending:
+                pending[h] = record
+                if len(pending) >= _PARSE_BATCH:
+                    store()
+    if pending:
+        store()
+
+
+def _row_states(rows: _FileRows, records: Iterable[bytes]) -> Iterator[tuple[str, Optional[str], Optional[float], list[str]]]:
+    """(sku or parent, component, qty if parsed, row-local issues) per record, as the streaming scan sees the rows.
+
+    Every record is one complete, non-blank row, so a single reader over all
+    their lines yields exactly one row per record.
+    """
+    fieldnames = rows.fieldnames
+    lines = itertools.chain.from_iterable(r.decode(rows.body_encoding).splitlines() for r in records)
+    for values in csv.reader(lines, **rows.params):
+        r = dict(zip(fieldnames, values))
+        for key in fieldnames[len(values):]:
+            r[key] = ""
+        if rows.role == "products":
+            sku_col, name_col = rows.columns
+            sku = _norm_sku(r.get(sku_col, ""))
+            yield sku, None, None, _product_row_issues(sku, (r.get(name_col, "") or "").strip())
+        else:
+            parent_col, component_col, qty_col = rows.columns
+            parent = _norm_sku(r.get(parent_col, ""))
+            component = _norm_sku(r.get(component_col, ""))
+            issues, qty = _recipe_row_issues(parent, component, r.get(qty_col, ""))
+            yield parent, component, qty, issues
+
+
+def _load_states(con: sqlite3.Connection, role: str, hashes) -> dict:
+    states = {}
+    hashes = list(hashes)
+    for i in range(0, len(hashes), _LOOKUP_BATCH):
+        batch = hashes[i:i + _LOOKUP_BATCH]
+        query = ("SELECT hash, count, sku, component, qty, issues FROM row WHERE role = ? AND hash IN ("
+                 + ",".join("?" * len(batch)) + ")")
+        for h, count, sku, component, qty, issues in con.execute(query, [role, *batch]):
+            states[h] = (count, (sku, component, None if qty is None else float(qty), issues.split("\n") if issues else []))
+    return states
+
+
+def _count_changes(old: array, new: array) -> Iterator[tuple[int, int, int]]:
+    # (hash, rows before, rows now) for every content whose number of rows changed, in hash order
+    i = j = 0
+    n_old, n_new = len(old), len(new)
+    while i < n_old or j < n_new:
+        h = old[i] if j == n_new or (i < n_old and old[i] < new[j]) else new[j]
+        before, now = i, j
+        while i < n_old and old[i] == h:
+            i += 1
+        while j < n_new and new[j] == h:
+            j += 1
+        if i - before != j - now:
+            yield h, i - before, j - now
+
+
+class _SkuCounts:
+    """Touched rows of the sku table, written back by flush()."""
+
+    def __init__(self, con: sqlite3.Connection) -> None:
+        self.con = con
+        self.skus: dict[str, list[int]] = {}
+        self.preloaded = False
+        self.touched: set[str] = set()
+        self.duplicates = 0  # change in the number of duplicate product rows
+
+    def preload(self) -> None:
+        if not self.preloaded:
+            for sku, *counts in self.con.execute("SELECT * FROM sku"):
+                self.skus.setdefault(sku, counts)
+            self.preloaded = True
+
+    def sku(self, sku: str) -> list[int]:
+        counts = self.skus.get(sku)
+        if counts is None:
+            found = None
+            if not self.preloaded:
+                found = self.con.execute("SELECT products, parents, components FROM sku WHERE sku = ?", (sku,)).fetchone()
+            counts = self.skus[sku] = list(found) if found else [0, 0, 0]
+        self.touched.add(sku)
+        return counts
+
+    def add_product(self, sku: str, delta: int) -> None:
+        counts = self.sku(sku)
+        before = max(counts[0] - 1, 0)
+        counts[0] += delta
+        self.duplicates += max(counts[0] - 1, 0) - before
+
+    def add_recipe(self, parent: str, component: str, delta: int) -> None:
+        self.sku(parent)[1] += delta
+        self.sku(component)[2] += delta
+
+    def flush(self) -> None:
+        skus = sorted(self.touched)
+        self.con.executemany("DELETE FROM sku WHERE sku = ?", [(k,) for k in skus if not any(self.skus[k])])
+        self.con.executemany("INSERT OR REPLACE INTO sku VALUES (?, ?, ?, ?)",
+                             [(k, *self.skus[k]) for k in skus if any(self.skus[k])])
+
+
+def _apply_delta(role: str, state: tuple, delta: int, meta: dict, counts: _SkuCounts) -> None:
+    # Count `delta` more (or fewer) rows with this parsed state
+    sku, component, qty, issues = state
+    meta["issues"] += delta * len(issues)
+    if role == "products":
+        if sku:
+            counts.add_product(sku, delta)
+    elif qty is not None:
+        meta["parsed"] += delta
+        counts.add_recipe(sku, component, delta)
+
+
+def _update_rows(
+    con: sqlite3.Connection, rows: _FileRows, old: array, meta: dict, counts: _SkuCounts
+) -> tuple[int, int]:
+    """Apply the rows added / removed since the manifest was written; returns their numbers.
+
+    `old` is _sorted_hashes() of the previous run.  Contents new to the
+    manifest are parsed and added by _store_new_rows; the others only change
+    their counts, from the states the manifest holds.
+    """
+    new = _sorted_hashes(rows.hashes)
+    added = removed = changed = 0
+    # Without an old file every content is new, and the set is not needed
+    fresh: Optional[set[bytes]] = set() if old else None
+    for h, before, now in _count_changes(old, new):
+        changed += 1
+        if now > before:
+            added += now - before
+        else:
+            removed += before - now
+        if not before and fresh is not None:
+            fresh.add(_hash_bytes(h))
+    if changed > _PRELOAD_CHANGES:
+        counts.preload()
+    if fresh is None or fresh:
+        _store_new_rows(con, rows, fresh, meta, counts)
+    if not old:
+        return added, removed
+    changes = ((h, before, now) for h, before, now in _count_changes(old, new) if before)
+    while True:
+        batch = list(itertools.islice(changes, _LOOKUP_BATCH))
+        if not batch:
+            break
+        states = _load_states(con, rows.role, [_hash_bytes(h) for h, _, _ in batch])
+        upserts, deletes = [], []
+        for h, before, now in batch:
+            key = _hash_bytes(h)
+            count, state = states[key]
+            sku, component, qty, issues = state
+            _apply_delta(rows.role, state, now - before, meta, counts)
+            if count + now - before:
+                upserts.append((rows.role, key, count + now - before, sku, component,
+                                None if qty is None else repr(qty), "\n".join(issues)))
+            else:
+                deletes.append((rows.role, key))
+        # Batches come in key order, so the B-tree is appended to rather than split all over
+        con.executemany("DELETE FROM row WHERE role = ? AND hash = ?", deletes)
+        con.executemany("INSERT OR REPLACE INTO row VALUES (?, ?, ?, ?, ?, ?, ?)", upserts)
+    return added, removed
+
+
+def _walk_issues(con: sqlite3.Connection, rows: _FileRows, log: IssueLog, total: int) -> None:
+    # First issues in line order; row states come from the manifest in batches
+    seen: dict[str, int] = {}
+    hashes = rows.hashes
+    for start in range(0, rows.count, _LOOKUP_BATCH):
+        if log.limit is not None and len(log.head) >= log.limit:
+            break
+        batch = [hashes[k:k + ROW_HASH_SIZE] for k in range(start * ROW_HASH_SIZE,
+                                                            min(start + _LOOKUP_BATCH, rows.count) * ROW_HASH_SIZE,
+                                                            ROW_HASH_SIZE)]
+        states = _load_states(con, rows.role, set(batch))
+        for i, h in enumerate(batch, start=start + 2):
+            sku, _, _, issues = states[h][1]
+            for text in issues:
+                log.append(f"[{rows.role}] Line {i}: {text}")
+            if rows.role == "products" and sku:
+                first = seen.setdefault(sku, i)
+                if first != i:
+                    log.append(f"[products] Line {i}: duplicate SKU={sku} (first at line {first})")
+    log.head = log.head[:log.limit] if log.limit is not None else log.head
+    log.count = total
+
+
+def validate_incremental(
+    products_path: Path, recipes_path: Path, manifest: Path, issue_limit: Optional[int] = None,
+    encoding: Optional[str] = None,
+) -> Validation:
+    """Validate both files against the manifest of the previous run and update it.
+
+    Gives the same result as a full run, except that products.skus is left
+    empty (the manifest does not know first lines of SKUs without issues).
+    """
+    products = _open_file_rows(products_path, "products", ProductScan(IssueLog(issue_limit)), _product_columns, encoding)
+    recipes = _open_file_rows(recipes_path, "recipes", RecipeScan(IssueLog(issue_limit)), _recipe_columns, encoding)
+    con = sqlite3.connect(manifest)
+    try:
+        # The manifest is a cache that --full or a fresh file rebuilds, so durability is traded for speed
+        con.execute("PRAGMA synchronous = OFF")
+        con.execute("PRAGMA journal_mode = MEMORY")
+        with con:
+            con.executescript(_MANIFEST_SCHEMA)
+            stored = {role: (json.loads(meta), hashes) for role, meta, hashes in con.execute("SELECT * FROM file")}
+            if any(stored.get(rows.role, ({}, b""))[0].get("identity") != rows.identity for rows in (products, recipes)):
+                # New columns, dialect or encoding: every row state is stale
+                for table in ("file", "row", "sku"):
+                    con.execute(f"DELETE FROM {table}")
+                stored = {}
+            counts = _SkuCounts(con)
+            metas = {}
+            for rows in (products, recipes):
+                meta, blob = stored.get(rows.role, ({"identity": rows.identity, "issues": 0, "parsed": 0, "duplicates": 0}, b""))
+                if rows.columns:
+                    _hash_rows(rows)
+                added = removed = 0
+                if blob != rows.hashes:
+                    added, removed = _update_rows(con, rows, _sorted_hashes(blob), meta, counts)
+                print(f"[manifest] {rows.role}: {rows.count} rows, {added} added, {removed} removed", file=sys.stderr)
+                metas[rows.role] = meta
+            counts.flush()
+            metas["products"]["duplicates"] += counts.duplicates
+            for rows in (products, recipes):
+                con.execute("INSERT OR REPLACE INTO file VALUES (?, ?, ?)",
+                            (rows.role, json.dumps(metas[rows.role], ensure_ascii=False), rows.hashes))
+
+            product_scan, recipe_scan = products.result, recipes.result
+            if not product_scan.critical:
+                product_scan.rows = products.count
+                meta = metas["products"]
+                _walk_issues(con, products, product_scan.issues, meta["issues"] + meta["duplicates"])
+            if not recipe_scan.critical:
+                recipe_scan.rows = recipes.count
+                recipe_scan.parsed = metas["recipes"]["parsed"]
+                _walk_issues(con, recipes, recipe_scan.issues, metas["recipes"]["issues"])
+                recipe_scan.parents = {sku for sku, in con.execute("SELECT sku FROM sku WHERE parents > 0")}
+                recipe_scan.components = {sku for sku, in con.execute("SELECT sku FROM sku WHERE components > 0")}
+            graph = BomGraph()
+            parsed_rows = "SELECT sku, component, qty, count FROM row WHERE role = 'recipes' AND qty IS NOT NULL"
+            for parent, component, qty, n in con.execute(parsed_rows):
+                graph.add_edge(parent, component, float(qty), n)
+            return Validation(
+                products=product_scan,
+                recipes=recipe_scan,
+                unique_products=con.execute("SELECT COUNT(*) FROM sku WHERE products > 0").fetchone()[0],
+                missing_parents=[sku for sku, in con.execute(
+                    "SELECT sku FROM sku WHERE parents > 0 AND products = 0 ORDER BY sku")],
+                missing_components=[sku for sku, in con.execute(
+                    "SELECT sku FROM sku WHERE components > 0 AND products = 0 ORDER BY sku")],
+                graph=graph,
+            )
+    finally:
+        con.close()
+
+
+def validate_full(
+    products_path: Path, recipes_path: Path, engine: str = "auto", jobs: int = 1, issue_limit: Optional[int] = None,
+    encoding: Optional[str] = None,
+) -> Validation:
+    # Either engine keeps only the reported issues and per-SKU state, plus the BOM edges
+    graph = BomGraph()
+    if jobs > 1:
+        products, recipes, missing_parents, missing_components = validate_parallel(
+            products_path, recipes_path, jobs, issue_limit=issue_limit, on_recipe_row=graph.add, encoding=encoding)
+    else:
+        products = run_scan(engine, products_path, scan_products_columnar, scan_products,
+                            issue_limit=issue_limit, encoding=encoding)
+        recipes = run_scan(engine, recipes_path, scan_recipes_columnar, scan_recipes,
+                           issue_limit=issue_limit, on_row=graph.add, encoding=encoding)
+        missing_parents = sorted(recipes.parents - products.skus.keys())
+        missing_components = sorted(recipes.components - products.skus.keys())
+    return Validation(products, recipes, len(products.skus), missing_parents, missing_components, graph)
+
+
+def validate_products(path: Path) -> tuple[list[ProductRow], list[str]]:
+    parsed: list[ProductRow] = []
+    result = scan_products(path, on_row=parsed.append)
+    return parsed, result.report()
+
+
+def validate_recipes(path: Path) -> tuple[list[RecipeRow], list[str]]:
+    parsed: list[RecipeRow] = []
+    result = scan_recipes(path, on_row=parsed.append)
+    return parsed, result.report()
+
+
+def _print_issues(scope: str, lines: list[str], total: int) -> None:
+    print("\n".join(lines[:REPORT_ISSUES]))
+    if total > REPORT_ISSUES:
+        print(f"[{scope}] (+{total - REPORT_ISSUES} more issues)")
 
 
 def main() -> int:
     ap = argparse.ArgumentParser(description="Validate Katana split CSVs: Items (products) + BOM (recipes).")
     ap.add_argument("products_csv", type=Path, help="cleaned_products_list.csv (or equivalent)")
     ap.add_argument("recipes_csv", type=Path, help="cleaned_recipes_list.csv (or equivalent)")
+    ap.add_argument("--engine", choices=ENGINES, default="auto",
+                    help="columnar needs numpy + pyarrow; auto uses it when installed, python streams row by row")
+    ap.add_argument("--jobs", type=int, default=1,
+                    help="parse with N worker processes (streaming parser, SKU-sharded cross checks)")
+    ap.add_argument("--max-depth", type=int, default=MAX_BOM_DEPTH,
+                    help=f"BOM levels a parent may have down to its raw materials (default: {MAX_BOM_DEPTH})")
+    ap.add_argument("--bom-csv", type=Path, help="write depth and fan-out per parent SKU to this CSV")
+    ap.add_argument("--explode-csv", type=Path,
+                    help="write the total raw-material quantities of every finished SKU to this CSV")
+    ap.add_argument("--manifest", type=Path,
+                    help="SQLite manifest of the previous run; only rows that changed since are parsed and checked")
+    ap.add_argument("--full", action="store_true",
+                    help="with --manifest: also validate in full and check both give the same result")
+    ap.add_argument("--encoding",
+                    help="read both files with this encoding instead of detecting it (e.g. cp1254, utf-8-sig)")
     args = ap.parse_args()
+    if args.encoding:
+        try:
+            codecs.lookup(args.encoding)
+        except LookupError:
+            ap.error(f"unknown encoding: {args.encoding}")
+    if args.jobs > 1 and args.engine == "columnar":
+        ap.error("--jobs runs the streaming parser in parallel; the columnar engine is multi-threaded already")
+    if args.full and not args.manifest:
+        ap.error("--full checks an incremental run and needs --manifest")
 
-    products, prod_issues = validate_products(args.products_csv)
-    recipes, rec_issues = validate_recipes(args.recipes_csv)
-
-    product_skus = {p.sku for p in products if p.sku}
-
-    missing_parents = sorted({r.parent_sku for r in recipes} - product_skus)
-    missing_components = sorted({r.component_sku for r in recipes} - product_skus)
+    result: Optional[Validation] = None
+    if args.manifest:
+        try:
+            result = validate_incremental(args.products_csv, args.recipes_csv, args.manifest, issue_limit=REPORT_ISSUES,
+                                          encoding=args.encoding)
+        except ManifestUnsupported as e:
+            print(f"[manifest] {e}; validating in full", file=sys.stderr)
+    mismatch = False
+    if result is None or args.full:
+        full = validate_full(args.products_csv, args.recipes_csv, args.engine, args.jobs, issue_limit=REPORT_ISSUES,
+                             encoding=args.encoding)
+        if result is not None:
+            mismatch = result.summary() != full.summary()
+            if mismatch:
+                # The full result is printed; the next run rebuilds the manifest from scratch
+                print(f"[manifest] incremental result differs from a full run; removing {args.manifest}", file=sys.stderr)
+                args.manifest.unlink()
+            else:
+                print("[manifest] incremental result matches a full run", file=sys.stderr)
+        result = full
+    products, recipes, graph = result.products, result.recipes, result.graph
+    missing_parents, missing_components = result.missing_parents, result.missing_components
 
-    print("\n".join(prod_issues[:25]))
-    if len(prod_issues) > 25:
-        print(f"[products] (+{len(prod_issues) - 25} more issues)")
+    _print_issues("products", products.report(), products.issue_count)
 
     print()
-    print("\n".join(rec_issues[:25]))
-    if len(rec_issues) > 25:
-        print(f"[recipes] (+{len(rec_issues) - 25} more issues)")
+    _print_issues("recipes", recipes.report(), recipes.issue_count)
 
     print()
-    print(f"[cross] Unique products: {len(product_skus)}")
-    print(f"[cross] Recipes rows: {len(recipes)}")
+    print(f"[cross] Unique products: {result.unique_products}")
+    print(f"[cross] Recipes rows: {recipes.parsed}")
     print(f"[cross] Parents missing from products: {len(missing_parents)}")
     if missing_parents[:10]:
         print("[cross] Sample missing parents: " + ", ".join(missing_parents[:10]))
@@ -283,11 +1951,47 @@ def main() -> int:
     if missing_components[:10]:
         print("[cross] Sample missing components: " + ", ".join(missing_components[:10]))
 
-    # Non-zero exit if critical issues detected
-    critical = any("column not found" in s for s in prod_issues + rec_issues)
+    bom = result.bom
+    too_deep = bom.too_deep(args.max_depth)
+    print()
+    print(f"[bom] SKUs: {bom.skus}, parents: {bom.parents}, edges: {bom.edges}")
+    print(f"[bom] Cycles: {len(bom.cycles)} ({bom.cyclic_skus} SKUs)")
+    for path in bom.cycles[:REPORT_SAMPLES]:
+        print("[bom] Cycle: " + " -> ".join(path))
+    print(f"[bom] Max depth: {bom.max_depth[0]}" + (f" ({bom.max_depth[1]})" if bom.max_depth[1] else ""))
+    print(f"[bom] Parents deeper than {args.max_depth} levels: {len(too_deep)}")
+    if too_deep:
+        print("[bom] Deepest parents: " + ", ".join(f"{sku} ({depth})" for depth, sku in too_deep[:REPORT_SAMPLES]))
+    print(f"[bom] Max fan-out: {bom.max_fan_out[0]}" + (f" ({bom.max_fan_out[1]})" if bom.max_fan_out[1] else ""))
+
+    if args.bom_csv:
+        with args.bom_csv.open("w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["ParentSku", "Depth", "FanOut"])
+            for sku, (depth, fan_out) in sorted(bom.per_parent.items()):
+                writer.writerow([sku, "" if depth is None else depth, fan_out])
+    if args.explode_csv:
+        exploded = skipped = 0
+        with args.explode_csv.open("w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["FinishedSku", "RawSku", "Qty"])
+            for sku in graph.finished():
+                totals = graph.explode(sku)
+                if totals is None:
+                    skipped += 1
+                    continue
+                exploded += 1
+                writer.writerows([sku, raw, f"{qty:g}"] for raw, qty in sorted(totals.items()))
+        print(f"[bom] Exploded {exploded} finished SKUs to {args.explode_csv}"
+              + (f" ({skipped} skipped: they reach a cycle)" if skipped else ""))
+
+    # Non-zero exit if critical issues detected; a BOM cycle or an over-deep
+    # chain would stall the manufacturing-order sync
+    if mismatch:
+        return 3
+    critical = products.critical or recipes.critical or bool(bom.cycles) or bool(too_deep)
     return 2 if critical else 0
 
 
 if __name__ == "__main__":
     raise SystemExit(main())
-